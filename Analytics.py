@@ -0,0 +1,182 @@
+import csv
+import os
+import re
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from Layout import Layout, column_index, LOAD, REPS, RIR, AVG_VEL
+from Native import sheet_parts, cell_range
+
+
+# Cells holding a number, formulas start with <f> and strings have another type so both are skipped
+# e.g. <c r="C12" s="8"><v>225</v></c>
+VALUE = re.compile(rb'<c r="([A-Z]+)(\d+)"(?: s="\d+")?(?: t="n")?><v>([^<]+)</v></c>')
+MERGE = re.compile(rb'<mergeCell ref="([A-Z0-9:]+)"')
+WEEK = re.compile(r"Week (\d+)")
+
+
+class Analytics:
+  # Training metrics of filled in programs, computed from the logged inputs instead of the sheet formulas.
+  # The sheet XML is read straight out of the file and the input blocks are found with the same
+  # Layout plan the generators use, every metric is then computed for all weeks of a program at once.
+  # Requires NumPy: pip3 install numpy
+
+  FIELDS = (
+      "athlete", "level", "week", "day", "slot", "sets", "volume", "tonnage", "e1rm",
+      "load", "reps", "rir", "rpe", "velocity", "intensity", "session_rpe", "internal_load"
+  )
+
+  @staticmethod
+  def read(filename: str) -> tuple:
+      # Logged Load, Reps, RIR and Avg Vel as arrays of (weeks, days, slots, sets)
+      # and Session RPE as (weeks, days), blanks are NaN
+      # The shape of every week is read from that week, a program extended with another shape
+      # is padded with NaN to the most days, slots and sets of any week
+      with zipfile.ZipFile(filename) as archive:
+          weeks = sorted(
+              (int(match.group(1)), part) for title, _, part in sheet_parts(archive)
+              for match in [WEEK.fullmatch(title)] if match
+          )
+          if not weeks:
+              raise ValueError(f"No Week sheets in {filename}")
+
+          parts = [archive.read(part) for _, part in weeks]
+          plans = [
+              Layout.plan(*Layout.infer([cell_range(ref.decode()) for ref in MERGE.findall(data)]))
+              for data in parts
+          ]
+          frequency = max(plan.frequency for plan in plans)
+          slots = max(plan.slots for plan in plans)
+          sets = max(plan.sets for plan in plans)
+          inputs = np.full((4, len(weeks), frequency, slots, sets), np.nan)
+          session = np.full((len(weeks), frequency), np.nan)
+
+          for week, (data, plan) in enumerate(zip(parts, plans)):
+              # Row of every set (slots, sets) and columns of every day (days, volume headers)
+              rows = np.array([block.volume_input for block in plan.rows])[:, None] + np.arange(plan.sets)
+              columns = np.array([day.number for day in plan.days])
+              grid = np.full((plan.max_row + 1, plan.max_column + 1), np.nan)
+              cells = VALUE.findall(data)
+              if cells:
+                  letters, row, value = (np.array(field) for field in zip(*cells))
+                  letters, col = np.unique(letters, return_inverse=True)
+                  col = np.array([column_index(letter.decode()) for letter in letters])[col]
+                  row = row.astype(int)
+                  inside = (row <= plan.max_row) & (col <= plan.max_column)
+                  grid[row[inside], col[inside]] = value[inside].astype(float)
+
+              for index, item in enumerate((LOAD, REPS, RIR, AVG_VEL)):
+                  inputs[index, week, :plan.frequency, :plan.slots, :plan.sets] = grid[rows[None, :, :], columns[:, item, None, None]]
+              session[week, :plan.frequency] = grid[plan.session_rpe, columns[:, LOAD]]
+
+      shapes = [(plan.frequency, plan.slots) for plan in plans]
+      return (*inputs, session, [number for number, _ in weeks], shapes)
+
+
+  @staticmethod
+  def average(values: object, axis: int = -1) -> object:
+      # Mean of the values other than blank and 0 like AVERAGEIF(range, "<>0"), NaN when there are none
+      counted = ~np.isnan(values) & (values != 0)
+      with np.errstate(invalid='ignore', divide='ignore'):
+          return np.where(counted, values, 0).sum(axis) / counted.sum(axis)
+
+
+  @staticmethod
+  def metrics(load: object, reps: object, rir: object, velocity: object, session: object) -> dict:
+      # Metrics of every slot as (weeks, days, slots) and of every day as (weeks, days)
+      done = load > 0
+      sets = done.sum(-1)
+      volume = np.nansum(reps, -1)
+      # A set with only a Load or only Reps counts that value like PRODUCT in the Tonnage formula,
+      # a slot without any Load has no tonnage
+      products = np.where(np.isnan(load) & np.isnan(reps), 0, np.nan_to_num(load, nan=1) * np.nan_to_num(reps, nan=1))
+      tonnage = np.where((~np.isnan(load)).any(-1), products.sum(-1), 0)
+
+      # Epley W * (1 + r/30) of the heaviest set, the first of equal sets like VLOOKUP
+      heaviest = np.argmax(np.where(done, load, -np.inf), axis=-1)[..., None]
+      top = np.take_along_axis(load, heaviest, -1)[..., 0]
+      e1rm = np.where(sets > 0, top * (1 + np.nan_to_num(np.take_along_axis(reps, heaviest, -1)[..., 0]) / 30), np.nan)
+
+      with np.errstate(invalid='ignore', divide='ignore'):
+          intensity = Analytics.average(load / e1rm[..., None])
+
+      return {
+          "sets": sets,
+          "volume": volume,
+          "tonnage": tonnage,
+          "e1rm": e1rm,
+          "load": Analytics.average(load),
+          "reps": Analytics.average(reps),
+          "rir": Analytics.average(rir),
+          "rpe": Analytics.average(np.abs(rir - 10)),
+          "velocity": Analytics.average(velocity),
+          "intensity": intensity,
+          # Sets of all slots of the day times Session RPE
+          "session_rpe": session,
+          "internal_load": session * sets.sum(-1),
+      }
+
+
+  @staticmethod
+  def analyze(filename: str) -> list:
+      # Report rows of one program per slot, day, week and for the whole program
+      load, reps, rir, velocity, session, weeks, shapes = Analytics.read(filename)
+      metric = Analytics.metrics(load, reps, rir, velocity, session)
+      athlete = os.path.splitext(os.path.basename(filename))[0]
+
+      # Days sum the slots, weeks the days and the program the weeks, E1RM is the best of them
+      sums = ("sets", "volume", "tonnage")
+      daily = {name: metric[name].sum(-1) for name in sums}
+      daily["e1rm"] = np.fmax.reduce(metric["e1rm"], axis=-1)
+      daily["rpe"] = Analytics.average(metric["rpe"])
+      daily["session_rpe"] = metric["session_rpe"]
+      daily["internal_load"] = np.nan_to_num(metric["internal_load"])
+      weekly = {name: daily[name].sum(-1) for name in sums + ("internal_load",)}
+      weekly["e1rm"] = np.fmax.reduce(daily["e1rm"], axis=-1)
+      weekly["rpe"] = Analytics.average(daily["rpe"])
+      weekly["session_rpe"] = Analytics.average(daily["session_rpe"])
+
+      def row(level, values, week='', day='', slot='', index=()):
+          record = {"athlete": athlete, "level": level, "week": week, "day": day, "slot": slot}
+          for name, array in values.items():
+              value = array[index]
+              if isinstance(value, np.integer):
+                  record[name] = int(value)
+              else:
+                  record[name] = '' if np.isnan(value) else round(float(value), 3)
+          return record
+
+      rows = []
+      slot_metrics = {name: value for name, value in metric.items() if name not in ("session_rpe", "internal_load")}
+      for w, (week, (frequency, slots)) in enumerate(zip(weeks, shapes)):
+          for day in range(frequency):
+              for slot in range(slots):
+                  rows.append(row("slot", slot_metrics, week, day + 1, slot + 1, (w, day, slot)))
+              rows.append(row("day", daily, week, day + 1, index=(w, day)))
+          rows.append(row("week", weekly, week, index=(w,)))
+
+      program = {name: weekly[name].sum() for name in sums + ("internal_load",)}
+      program["e1rm"] = np.fmax.reduce(weekly["e1rm"])
+      rows.append(row("program", program))
+      return rows
+
+
+  @staticmethod
+  def report(filenames: list, jobs: int = None, output: str = None) -> int:
+      # Write the report rows of every program as CSV to output or stdout, returns the number of rows
+      # Programs are read across a pool of processes
+      with ProcessPoolExecutor(max_workers=jobs) as pool:
+          results = pool.map(Analytics.analyze, filenames)
+          f = open(output, 'w', newline='') if output else sys.stdout
+          try:
+              writer = csv.DictWriter(f, fieldnames=Analytics.FIELDS, restval='')
+              writer.writeheader()
+              count = 0
+              for rows in results:
+                  writer.writerows(rows)
+                  count += len(rows)
+          finally:
+              if output:
+                  f.close()
+      return count
@@ -0,0 +1,103 @@
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Cache import Cache
+from Library import Library
+from Workout import Workout
+from Utils import Utils
+
+
+class Batch:
+  # Build many programs from a roster across a pool of worker processes.
+  # Each worker pays the interpreter and openpyxl import cost once for all of its programs.
+
+  FIELDS = ("filename", "weeks", "frequency", "slots", "sets")
+
+  @staticmethod
+  def read(roster: str) -> list:
+      # One program per row e.g.
+      # filename,weeks,frequency,slots,sets
+      # alice.xlsx,12,4,3,5
+      with open(roster, newline='') as f:
+          reader = csv.DictReader(f)
+          missing = [field for field in Batch.FIELDS if field not in (reader.fieldnames or [])]
+          if missing:
+              raise ValueError(f"Roster {roster} is missing columns: {', '.join(missing)}")
+          return [row for row in reader if any((value or '').strip() for value in row.values())]
+
+
+  @staticmethod
+  def build(job: dict, defaults: dict, engine: str, dialect: str, template: bool, library: list = None, date: object = None, cache: int = None, lean: bool = False, records: bool = False, calculate: bool = False, formatting: str = 'cell', names: bool = False) -> dict:
+      # Runs in a worker process, returns the outcome instead of raising so every file is reported
+      start = time.perf_counter()
+      filename = (job.get("filename") or '').strip()
+      result = {"filename": filename, "sheets": 0, "error": None, "cached": False}
+
+      try:
+          if not filename:
+              raise ValueError("No filename")
+          shape = {}
+          for field in Batch.FIELDS[1:]:
+              value = (job.get(field) or '').strip()
+              shape[field] = int(value) if value else defaults.get(field)
+
+          # Read from the compiled cache, once per worker
+          library = Library.load(library)
+          store = None
+          if cache:
+              # Programs of the same shape and options are copied from the cache
+              store = Cache(size=cache * 1024 * 1024)
+              key = Cache.key({
+                  **shape, "engine": engine, "dialect": dialect, "template": template, "calculate": calculate,
+                  "formatting": formatting, "names": names, "date": date, "library": library.digest, "lean": lean, "records": records
+              })
+              if store.fetch(key, filename):
+                  result["cached"] = True
+                  result["seconds"] = time.perf_counter() - start
+                  return result
+
+          # Keep the per-sheet progress of the workers out of the report
+          Program = Workout(engine=engine, dialect=dialect, calculate=calculate, formatting=formatting, names=names, library=library, date=date, lean=lean, records=records, log=None)
+          sheets = Program.generate(template=template, **shape)
+          Utils.save(workbook=Program.wb, filename=filename, log=None)
+          if store:
+              store.store(key, filename)
+          result["sheets"] = len(sheets)
+      except Exception as e:
+          result["error"] = f"{type(e).__name__}: {e}"
+
+      result["seconds"] = time.perf_counter() - start
+      return result
+
+
+  @staticmethod
+  def run(roster: str, jobs: int, defaults: dict, engine: str = 'memory', dialect: str = 'sheets', template: bool = False, library: list = None, date: object = None, cache: int = None, lean: bool = False, records: bool = False, calculate: bool = False, formatting: str = 'cell', names: bool = False) -> int:
+      # Build every program of the roster and print a line per file and a summary
+      # Returns the number of programs that failed
+      programs = Batch.read(roster)
+      # Compile the library before the workers start so none of them parses it
+      Library.load(library)
+      start = time.perf_counter()
+      failed = 0
+      sheets = 0
+
+      with ProcessPoolExecutor(max_workers=jobs) as pool:
+          futures = [pool.submit(Batch.build, job, defaults, engine, dialect, template, library, date, cache, lean, records, calculate, formatting, names) for job in programs]
+          for future in as_completed(futures):
+              result = future.result()
+              if result["error"]:
+                  failed += 1
+                  print(f"FAILED {result['filename'] or '<no filename>'}: {result['error']}")
+              elif result["cached"]:
+                  print(f"CACHED {result['filename']} ({result['seconds']:.2f}s)")
+              else:
+                  sheets += result["sheets"]
+                  print(f"OK     {result['filename']} ({result['sheets']} sheets, {result['seconds']:.2f}s)")
+
+      elapsed = time.perf_counter() - start
+      built = len(programs) - failed
+      print(
+          f"Wrote {built} of {len(programs)} programs in {elapsed:.2f}s with {jobs} jobs "
+          f"({built / elapsed if elapsed else 0:.2f} programs/s, {sheets / elapsed if elapsed else 0:.1f} sheets/s)"
+      )
+      return failed
@@ -0,0 +1,91 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+from Utils import Utils
+
+
+class Cache:
+  # Finished programs by a hash of everything that goes into them, the options, the date on the banner,
+  # the content of the library and the code that builds them. A program asked for again is copied out
+  # of the cache instead of being built. The least recently used programs are removed once the
+  # cache is over its size, e.g. ~/.cache/timetotrain/programs/<key>.xlsx
+
+  def __init__(self, size: int = 512 * 1024 * 1024, directory: str = None):
+      self.size = size   # Bytes the programs may take up together
+      self.directory = directory or os.path.join(Utils.cache_dir(), 'programs')
+
+
+  @staticmethod
+  @lru_cache(maxsize=None)
+  def code() -> str:
+      # Hash of the modules of the generator, a change to any of them makes every key new
+      digest = hashlib.sha256()
+      for module in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+          with open(module, 'rb') as f:
+              digest.update(f.read())
+      return digest.hexdigest()
+
+
+  @staticmethod
+  def key(parameters: dict) -> str:
+      # e.g. {"weeks": 8, "frequency": 3, "engine": "native", "date": "2024-01-31", ...}
+      text = json.dumps(parameters, sort_keys=True, default=str)
+      return hashlib.sha256(f"{Cache.code()} {text}".encode()).hexdigest()
+
+
+  def path(self, key: str) -> str:
+      return os.path.join(self.directory, f"{key}.xlsx")
+
+
+  def fetch(self, key: str, filename: str) -> bool:
+      # Copy the program of key to filename, False when it isn't cached
+      cached = self.path(key)
+      try:
+          shutil.copyfile(cached, filename)
+      except FileNotFoundError:
+          return False
+      # The modification time is the last use, access times are often not kept
+      try:
+          os.utime(cached)
+      except OSError:
+          pass
+      return True
+
+
+  def store(self, key: str, filename: str) -> str:
+      # Copy a program built from scratch into the cache and make room for it
+      os.makedirs(self.directory, exist_ok=True)
+      # Written to a temporary file first, batch workers may store the same program at once
+      with tempfile.NamedTemporaryFile('wb', dir=self.directory, suffix='.tmp', delete=False) as f, open(filename, 'rb') as source:
+          shutil.copyfileobj(source, f)
+      os.replace(f.name, self.path(key))
+      self.evict()
+      return self.path(key)
+
+
+  def evict(self) -> list:
+      # Remove the least recently used programs until the rest fit in the size, returns their keys
+      entries = []
+      for cached in glob.glob(os.path.join(self.directory, '*.xlsx')):
+          try:
+              stat = os.stat(cached)
+          except FileNotFoundError:
+              continue
+          entries.append((stat.st_mtime_ns, stat.st_size, cached))
+
+      total = sum(size for _, size, _ in entries)
+      removed = []
+      for _, size, cached in sorted(entries):
+          if total <= self.size:
+              break
+          try:
+              os.remove(cached)
+          except FileNotFoundError:
+              pass
+          total -= size
+          removed.append(os.path.splitext(os.path.basename(cached))[0])
+      return removed
@@ -0,0 +1,838 @@
+import math
+import re
+from collections import namedtuple
+from functools import lru_cache
+from Layout import column_index, column_letter
+
+
+class Error(namedtuple('Error', ('code',))):
+  # Spreadsheet error value e.g. Error('#DIV/0!'), passed along until IFERROR catches it
+  __slots__ = ()
+
+
+DIV0 = Error('#DIV/0!')
+NA = Error('#N/A')
+VALUE = Error('#VALUE!')
+NAME = Error('#NAME?')
+CIRCULAR = Error('#REF!')
+
+TOKEN = re.compile(r"""\s*(?:
+    (?P<string>"(?:[^"]|"")*")
+  | (?P<ref>(?:(?P<quoted>'\#'!)|(?P<sheet>[A-Za-z_][A-Za-z0-9_.]*)!)?
+        \$?(?P<col>[A-Z]{1,3})\$?(?P<row>[0-9]+)(?::\$?(?P<col2>[A-Z]{1,3})\$?(?P<row2>[0-9]+))?)(?![A-Za-z0-9_(])
+  | (?P<number>[0-9]+(?:\.[0-9]*)?(?:[eE][-+]?[0-9]+)?)
+  | (?P<function>[A-Za-z_][A-Za-z0-9_.]*)\s*\(
+  | (?P<boolean>TRUE|FALSE)\b
+  | (?P<op><>|>=|<=|[-+*/^&=<>(),%])
+)""", re.X)
+# Quoted sheet names, taken out of the formula text so every week shares the parse of its LWL formulas
+SHEET = re.compile(r"'((?:[^']|'')+)'!")
+
+# Parts of a worksheet read by Graph e.g. <c r="C18" s="5"><f>SUM(C12:C14)</f><v>30</v></c>
+CELL = re.compile(rb'<c r="([A-Z]+)([0-9]+)"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+KIND = re.compile(rb'\bt="(\w+)"')
+FORMULA = re.compile(rb'<f(\s[^>]*)?>(.*?)</f>', re.S)
+ARRAY = re.compile(rb'\bt="array"[^>]*?\bref="([A-Z0-9:$]+)"')
+VALUE_ELEMENT = re.compile(rb'<v(?:\s[^>]*)?>(.*?)</v>', re.S)
+TEXT = re.compile(rb'<t(?:\s[^>]*)?>(.*?)</t>', re.S)
+SHARED = re.compile(rb'<si>(.*?)</si>', re.S)
+ENTITY = re.compile(r"&(#?\w+);")
+ENTITIES = {"amp": "&", "lt": "<", "gt": ">", "quot": '"', "apos": "'"}
+
+# Binding power of the binary operators, higher binds tighter
+PRECEDENCE = {"=": 1, "<>": 1, "<": 1, ">": 1, "<=": 1, ">=": 1, "&": 2, "+": 3, "-": 3, "*": 4, "/": 4, "^": 5}
+
+
+def tokenize(text: str) -> list:
+  # (kind, match) of every token, references keep their match for the sheet, row and column groups
+  tokens = []
+  position = 0
+  text = text.rstrip()
+  while position < len(text):
+      match = TOKEN.match(text, position)
+      if not match:
+          raise ValueError(f"Cannot read formula at {text[position:]!r}")
+      position = match.end()
+      kind = "ref" if match.group("ref") else match.lastgroup
+      tokens.append((kind, match.group(kind) if kind != "ref" else match))
+  tokens.append((None, None))
+  return tokens
+
+
+class Parser:
+  # Parser of the formula subset we generate, builds nested tuples
+  # e.g. ('call', 'IFERROR', (('range', None, 12, 3, 21, 3), ('str', '...')))
+  # Quoted sheet names are replaced by '#' and referenced by their position in the formula
+
+  def __init__(self, text: str):
+      self.tokens = tokenize(text)
+      self.position = 0
+      self.sheets = 0
+
+
+  def take(self) -> tuple:
+      token = self.tokens[self.position]
+      self.position += 1
+      return token
+
+
+  def at(self, op: str) -> bool:
+      kind, value = self.tokens[self.position]
+      return kind == "op" and value == op
+
+
+  def expect(self, op: str) -> None:
+      if not self.at(op):
+          raise ValueError(f"Expected {op}")
+      self.position += 1
+
+
+  def parse(self) -> tuple:
+      node = self.expression(0)
+      if self.tokens[self.position][0] is not None:
+          raise ValueError("Unexpected text after formula")
+      return node
+
+
+  def expression(self, power: int) -> tuple:
+      # Operators of equal binding power are evaluated left to right
+      node = self.unary()
+      while True:
+          kind, op = self.tokens[self.position]
+          if kind != "op" or PRECEDENCE.get(op, 0) <= power:
+              return node
+          self.position += 1
+          node = ("op", op, node, self.expression(PRECEDENCE[op]))
+
+
+  def unary(self) -> tuple:
+      if self.at("-") or self.at("+"):
+          _, op = self.take()
+          node = self.unary()
+          return ("neg", node) if op == "-" else node
+      node = self.primary()
+      while self.at("%"):
+          self.position += 1
+          node = ("op", "/", node, ("num", 100.0))
+      return node
+
+
+  def primary(self) -> tuple:
+      kind, value = self.take()
+      if kind == "number":
+          return ("num", float(value))
+      if kind == "string":
+          return ("str", value[1:-1].replace('""', '"'))
+      if kind == "boolean":
+          return ("bool", value == "TRUE")
+      if kind == "ref":
+          if value.group("quoted"):
+              sheet = self.sheets
+              self.sheets += 1
+          else:
+              sheet = value.group("sheet")
+          row, col = int(value.group("row")), column_index(value.group("col"))
+          if value.group("col2"):
+              return ("range", sheet, row, col, int(value.group("row2")), column_index(value.group("col2")))
+          return ("ref", sheet, row, col)
+      if kind == "function":
+          args = []
+          if not self.at(")"):
+              while True:
+                  # Empty arguments e.g. the trailing one of SUM(a, b, )
+                  args.append(("empty",) if self.at(",") or self.at(")") else self.expression(0))
+                  if not self.at(","):
+                      break
+                  self.position += 1
+                  if self.at(")"):
+                      break
+          self.expect(")")
+          return ("call", value.upper(), tuple(args))
+      if kind == "op" and value == "(":
+          node = self.expression(0)
+          self.expect(")")
+          return node
+      raise ValueError("Unexpected end of formula")
+
+
+def compile_node(node: tuple) -> object:
+  # Turn a syntax tree into nested closures taking the evaluator and the sheet names of the formula
+  kind = node[0]
+  if kind in ("num", "str", "bool"):
+      constant = node[1]
+      return lambda evaluator, sheets: constant
+  if kind == "empty":
+      return lambda evaluator, sheets: None
+  if kind == "ref":
+      _, sheet, row, col = node
+      if sheet is None:
+          return lambda evaluator, sheets: evaluator.value(row, col)
+      if isinstance(sheet, int):
+          return lambda evaluator, sheets: evaluator.value(row, col, sheets[sheet])
+      return lambda evaluator, sheets: evaluator.value(row, col, sheet)
+  if kind == "range":
+      _, sheet, min_row, min_col, max_row, max_col = node
+      if isinstance(sheet, int):
+          return lambda evaluator, sheets: evaluator.range(sheets[sheet], min_row, min_col, max_row, max_col)
+      return lambda evaluator, sheets: evaluator.range(sheet, min_row, min_col, max_row, max_col)
+  if kind == "neg":
+      operand = compile_node(node[1])
+
+      def negate(evaluator, sheets):
+          value = number(scalar(operand(evaluator, sheets)))
+          return value if isinstance(value, Error) else -value
+      return negate
+  if kind == "op":
+      op, left, right = node[1], compile_node(node[2]), compile_node(node[3])
+      return lambda evaluator, sheets: operator(op, scalar(left(evaluator, sheets)), scalar(right(evaluator, sheets)))
+
+  name = node[1]
+  # A cell given to SUM, MAX and the like is read as a range of one, so text in it is skipped as in a range
+  args = [
+      compile_node(("range", *arg[1:], *arg[2:]) if arg[0] == "ref" and name in AGGREGATES else arg)
+      for arg in node[2]
+  ]
+  # IF and IFERROR only evaluate the branch they need
+  if name == "IF":
+      condition, then = args[0], args[1]
+      otherwise = args[2] if len(args) > 2 else (lambda evaluator, sheets: False)
+
+      def if_(evaluator, sheets):
+          test = scalar(condition(evaluator, sheets))
+          if isinstance(test, Error):
+              return test
+          if isinstance(test, str):
+              return VALUE
+          return scalar((then if test else otherwise)(evaluator, sheets))
+      return if_
+  if name == "IFERROR":
+      tried, fallback = args
+
+      def iferror(evaluator, sheets):
+          value = scalar(tried(evaluator, sheets))
+          return scalar(fallback(evaluator, sheets)) if isinstance(value, Error) else value
+      return iferror
+
+  function = FUNCTIONS.get(name)
+  if function is None:
+      return lambda evaluator, sheets: NAME
+  return lambda evaluator, sheets: function([arg(evaluator, sheets) for arg in args])
+
+
+@lru_cache(maxsize=65536)
+def compile_template(template: str) -> object:
+  return compile_node(Parser(template).parse())
+
+
+@lru_cache(maxsize=65536)
+def compile_formula(formula: str) -> tuple:
+  # Compiled formula and the sheet names it refers to, the same text repeats in every week
+  # e.g. "=IF(ISBLANK('Week 1'!C12), ...)" shares its compiled form with 'Week 2'!C12
+  text = formula[1:] if formula.startswith("=") else formula
+  sheets = tuple(name.replace("''", "'") for name in SHEET.findall(text))
+  return compile_template(SHEET.sub("'#'!", text)), sheets
+
+
+@lru_cache(maxsize=65536)
+def expand_array(formula: str, ref: str) -> tuple:
+  # ((row, col), formula) of every cell of an array formula over a column block, where ranges as tall
+  # as the block read the cell of the same row and anything else stays as it is
+  # e.g. "=IFERROR(C12:C21/C27, \"...\")" over H12:H21 gives "=IFERROR(C13/C27, \"...\")" for H13
+  min_row, min_col, max_row, max_col = cell_range(ref)
+  text = formula[1:] if formula.startswith("=") else formula
+  names = SHEET.findall(text)
+  template = SHEET.sub("'#'!", text).rstrip()
+
+  # Start and end of each range to replace, and its column and first row
+  spans = []
+  position = 0
+  while position < len(template):
+      match = TOKEN.match(template, position)
+      if not match:
+          raise ValueError(f"Cannot read formula at {template[position:]!r}")
+      position = match.end()
+      if match.group("ref") and match.group("col2") and match.group("col") == match.group("col2") \
+              and int(match.group("row2")) - int(match.group("row")) == max_row - min_row:
+          start = match.start("col") - (1 if template[match.start("col") - 1] == "$" else 0)
+          spans.append((start, match.end("ref"), match.group("col"), int(match.group("row"))))
+
+  cells = []
+  for offset in range(max_row - min_row + 1):
+      parts = []
+      last = 0
+      for start, end, col, row in spans:
+          parts.append(template[last:start])
+          parts.append(f"{col}{row + offset}")
+          last = end
+      parts.append(template[last:])
+      # Sheet names go back in the order they were taken out
+      left = iter(names)
+      text = re.sub("'#'!", lambda _: f"'{next(left)}'!", "".join(parts))
+      for col in range(min_col, max_col + 1):
+          cells.append(((min_row + offset, col), "=" + text))
+  return tuple(cells)
+
+
+def cell_range(ref: str) -> tuple:
+  # (min_row, min_col, max_row, max_col) of e.g. H12:H21 or H12
+  first, _, last = ref.replace("$", "").partition(":")
+  first = TOKEN.match(first)
+  last = TOKEN.match(last) if last else first
+  return (
+      int(first.group("row")), column_index(first.group("col")),
+      int(last.group("row")), column_index(last.group("col"))
+  )
+
+
+@lru_cache(maxsize=65536)
+def cells_read(formula: str) -> tuple:
+  # (sheet, row, col) of every cell a formula reads, the sheet is None for its own
+  # The same text repeats in every week, the ranges of each are expanded once
+  _, sheets = compile_formula(formula)
+  text = formula[1:] if formula.startswith("=") else formula
+  found = []
+  for sheet, min_row, min_col, max_row, max_col in references(SHEET.sub("'#'!", text)):
+      sheet = sheets[sheet] if isinstance(sheet, int) else sheet
+      found.extend((sheet, row, col) for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1))
+  return tuple(found)
+
+
+@lru_cache(maxsize=65536)
+def references(template: str) -> tuple:
+  # (sheet, min_row, min_col, max_row, max_col) of every reference of a formula, a single cell is a
+  # range of one. The sheet is None for the formula's own, the position of a quoted name or a name
+  def walk(node):
+      if node[0] == "ref":
+          yield (node[1], node[2], node[3], node[2], node[3])
+      elif node[0] == "range":
+          yield node[1:]
+      elif node[0] in ("op", "neg", "call"):
+          for child in (node[2] if node[0] == "call" else node[1:]):
+              if isinstance(child, tuple):
+                  yield from walk(child)
+  return tuple(walk(Parser(template).parse()))
+
+
+def number(value: object) -> object:
+  # Coerce a single value for arithmetic, blanks are 0 and text that is no number is #VALUE!
+  if value is None or value == "":
+      return 0.0
+  if isinstance(value, bool):
+      return float(value)
+  if isinstance(value, (int, float)):
+      return value
+  if isinstance(value, Error):
+      return value
+  try:
+      return float(value)
+  except ValueError:
+      return VALUE
+
+
+def numbers(args: list) -> object:
+  # Numbers of function arguments like SUM and MAX see them, text and blanks in ranges are skipped
+  # Returns a list or the first error
+  found = []
+  for arg in args:
+      if isinstance(arg, Range):
+          for value in arg.values():
+              if isinstance(value, Error):
+                  return value
+              if isinstance(value, (int, float)) and not isinstance(value, bool):
+                  found.append(value)
+      elif arg is not None:
+          value = number(arg)
+          if isinstance(value, Error):
+              return value
+          found.append(value)
+  return found
+
+
+@lru_cache(maxsize=256)
+def matches(criteria: object) -> object:
+  # Test of COUNTIF and AVERAGEIF criteria such as ">0" and "<>0"
+  match = re.fullmatch(r"\s*(<>|>=|<=|=|<|>)?\s*(.*)", str(criteria))
+  op, operand = match.group(1) or "=", match.group(2)
+  try:
+      operand = float(operand)
+  except ValueError:
+      pass
+  compare = {
+      "=": lambda a, b: a == b, "<>": lambda a, b: a != b, "<": lambda a, b: a < b,
+      ">": lambda a, b: a > b, "<=": lambda a, b: a <= b, ">=": lambda a, b: a >= b
+  }[op]
+
+  def test(value):
+      if isinstance(operand, float):
+          if isinstance(value, (int, float)) and not isinstance(value, bool):
+              return compare(value, operand)
+          # Only <> holds for blanks and text against a number
+          return op == "<>" and value not in (None, "")
+      if value is None:
+          value = ""
+      return isinstance(value, str) and compare(value.lower(), operand.lower())
+  return test
+
+
+def round_half_up(value: float, digits: int) -> float:
+  # Spreadsheets round halves away from zero
+  scale = 10 ** digits
+  return math.copysign(math.floor(abs(value) * scale + 0.5) / scale, value)
+
+
+class Range:
+  # Values of a rectangular range as rows
+  __slots__ = ('rows', '_values')
+
+  def __init__(self, rows: list):
+      self.rows = rows
+      self._values = None
+
+
+  def values(self) -> list:
+      if self._values is None:
+          self._values = [value for row in self.rows for value in row]
+      return self._values
+
+
+def scalar(value: object) -> object:
+  # A range where one value is expected is its only cell, otherwise #VALUE!
+  if isinstance(value, Range):
+      return value.rows[0][0] if len(value.rows) == 1 and len(value.rows[0]) == 1 else VALUE
+  return value
+
+
+def operator(op: str, left: object, right: object) -> object:
+  if isinstance(left, Error):
+      return left
+  if isinstance(right, Error):
+      return right
+  if op == "&":
+      return f"{'' if left is None else left}{'' if right is None else right}"
+  if op in ("=", "<>", "<", ">", "<=", ">="):
+      left = 0.0 if left is None and isinstance(right, (int, float)) else left
+      right = 0.0 if right is None and isinstance(left, (int, float)) else right
+      left = "" if left is None else left
+      right = "" if right is None else right
+      if isinstance(left, str) != isinstance(right, str):
+          # Text sorts after numbers
+          left, right = (1, 0) if isinstance(left, str) else (0, 1)
+      elif isinstance(left, str):
+          left, right = left.lower(), right.lower()
+      return {
+          "=": left == right, "<>": left != right, "<": left < right,
+          ">": left > right, "<=": left <= right, ">=": left >= right
+      }[op]
+  left, right = number(left), number(right)
+  if isinstance(left, Error):
+      return left
+  if isinstance(right, Error):
+      return right
+  if op == "+":
+      return left + right
+  if op == "-":
+      return left - right
+  if op == "*":
+      return left * right
+  if op == "/":
+      return DIV0 if right == 0 else left / right
+  return left ** right
+
+
+class Evaluator:
+  # Calculates the formulas of one sheet, cells are evaluated on demand and kept so every
+  # formula is calculated once, after the cells it depends on.
+  # cells maps (row, col) to a value or formula text, other(sheet, row, col) returns the
+  # value of a cell of another sheet e.g. the previous week.
+
+  def __init__(self, cells: dict, other: object = None):
+      self.cells = cells
+      self.other = other
+      self.results = {}
+      self.ranges = {}
+
+
+  def value(self, row: int, col: int, sheet: str = None) -> object:
+      if sheet is not None:
+          return self.other(sheet, row, col) if self.other else None
+      key = (row, col)
+      results = self.results
+      if key in results:
+          return results[key]
+      content = self.cells.get(key)
+      if isinstance(content, str) and content.startswith("="):
+          # Stands in for the result while it is calculated, a formula reaching it is circular
+          results[key] = CIRCULAR
+          try:
+              function, sheets = compile_formula(content)
+              result = scalar(function(self, sheets))
+          except ValueError:
+              result = NAME
+      else:
+          result = None if content == "" else content
+      results[key] = result
+      return result
+
+
+  def range(self, sheet: str, min_row: int, min_col: int, max_row: int, max_col: int) -> Range:
+      # The maxes, averages and sums of a block read the same columns, each is read once
+      key = (sheet, min_row, min_col, max_row, max_col)
+      found = self.ranges.get(key)
+      if found is None:
+          value = self.value
+          found = self.ranges[key] = Range([
+              [value(row, col, sheet) for col in range(min_col, max_col + 1)]
+              for row in range(min_row, max_row + 1)
+          ])
+      return found
+
+
+  def values(self) -> dict:
+      # Value of every formula of the sheet
+      return {
+          key: self.value(*key) for key, content in self.cells.items()
+          if isinstance(content, str) and content.startswith("=")
+      }
+
+
+class Graph:
+  # Calculates every formula of a workbook file at once. The file is read once into the cells of all
+  # of its sheets, the cells each formula refers to make a graph and the formulas are calculated in
+  # topological order, so every one of them reads results that are already there. Ranges read by
+  # several formulas e.g. the Load column of the maxes, averages and sums of a slot are read once.
+  # e.g. Graph.read('workout.xlsx').calculate()[('Week 2', 20, 3)]
+
+  def __init__(self, sheets: dict, cached: dict = None):
+      # sheets maps the title of every sheet to its cells like Evaluator, cached the values stored
+      # with the formulas of the file by (sheet, row, col)
+      self.sheets = sheets
+      self.cached = cached or {}
+      self.results = {}  # Value of every formula calculated so far by (sheet, row, col)
+      self.ranges = {}
+      self.sheet = None  # Sheet of the formula being calculated, what references without a sheet point to
+
+
+  @staticmethod
+  def read(filename: str) -> object:
+      # Cells of every sheet of an xlsx file, formulas as text starting with =
+      import zipfile
+      from Native import sheet_parts
+      with zipfile.ZipFile(filename) as archive:
+          shared = []
+          if "xl/sharedStrings.xml" in archive.namelist():
+              shared = [
+                  unescape(b"".join(TEXT.findall(item)).decode())
+                  for item in SHARED.findall(archive.read("xl/sharedStrings.xml"))
+              ]
+          sheets = {}
+          cached = {}
+          for title, _, part in sheet_parts(archive):
+              cells = sheets[title] = {}
+              arrays = []
+              for letters, row, attributes, content in CELL.findall(archive.read(part)):
+                  if not content:
+                      # Styled and nothing else
+                      continue
+                  key = (int(row), column_index(letters.decode()))
+                  kind = KIND.search(attributes)
+                  kind = kind.group(1) if kind else b"n"
+                  value = VALUE_ELEMENT.search(content)
+                  value = value.group(1).decode() if value else None
+                  if kind == b"inlineStr":
+                      value = unescape(b"".join(TEXT.findall(content)).decode())
+                  elif value is None:
+                      pass
+                  elif kind == b"s":
+                      value = shared[int(value)]
+                  elif kind in (b"str", b"e"):
+                      value = Error(unescape(value)) if kind == b"e" else unescape(value)
+                  elif kind == b"b":
+                      value = value == "1"
+                  else:
+                      value = float(value)
+                  formula = FORMULA.search(content)
+                  if formula:
+                      cells[key] = "=" + unescape(formula.group(2).decode())
+                      if value is not None:
+                          cached[(title, *key)] = value
+                      array = ARRAY.search(formula.group(1) or b"")
+                      if array:
+                          arrays.append((cells[key], array.group(1).decode()))
+                  else:
+                      cells[key] = value
+              # Every cell of an array formula is calculated as its own formula, what is stored in the
+              # cells it spills into is what was calculated for them
+              for formula, ref in arrays:
+                  for number, (key, text) in enumerate(expand_array(formula, ref)):
+                      if number and cells.get(key) is not None:
+                          cached[(title, *key)] = cells[key]
+                      cells[key] = text
+      return Graph(sheets, cached)
+
+
+  def formulas(self) -> dict:
+      # Text of every formula by (sheet, row, col)
+      return {
+          (title, *key): content for title, cells in self.sheets.items() for key, content in cells.items()
+          if isinstance(content, str) and content.startswith("=")
+      }
+
+
+  def order(self) -> tuple:
+      # Formulas in an order where each comes after the formulas it reads and the formulas of a cycle
+      # Cells that hold values need no calculation and are left out of the graph
+      formulas = self.formulas()
+      waiting = {}
+      readers = {}
+      for key, formula in formulas.items():
+          sheet = key[0]
+          try:
+              found = {
+                  cell for cell in (
+                      (sheet, row, col) if target is None else (target, row, col)
+                      for target, row, col in cells_read(formula)
+                  ) if cell in formulas
+              }
+          except ValueError:
+              found = ()
+          waiting[key] = len(found)
+          for dependency in found:
+              readers.setdefault(dependency, []).append(key)
+
+      ready = [key for key, count in waiting.items() if not count]
+      order = []
+      while ready:
+          key = ready.pop()
+          order.append(key)
+          for reader in readers.get(key, ()):
+              waiting[reader] -= 1
+              if not waiting[reader]:
+                  ready.append(reader)
+      return order, [key for key, count in waiting.items() if count]
+
+
+  def value(self, row: int, col: int, sheet: str = None) -> object:
+      key = (self.sheet if sheet is None else sheet, row, col)
+      results = self.results
+      if key in results:
+          return results[key]
+      cells = self.sheets.get(key[0])
+      content = cells.get((row, col)) if cells else None
+      if isinstance(content, str) and content.startswith("="):
+          # Only a formula of a cycle is read before it is calculated
+          return CIRCULAR
+      return None if content == "" else content
+
+
+  def range(self, sheet: str, min_row: int, min_col: int, max_row: int, max_col: int) -> Range:
+      sheet = self.sheet if sheet is None else sheet
+      key = (sheet, min_row, min_col, max_row, max_col)
+      found = self.ranges.get(key)
+      if found is None:
+          value = self.value
+          found = self.ranges[key] = Range([
+              [value(row, col, sheet) for col in range(min_col, max_col + 1)]
+              for row in range(min_row, max_row + 1)
+          ])
+      return found
+
+
+  def calculate(self) -> dict:
+      # Value of every formula by (sheet, row, col)
+      order, cycle = self.order()
+      for key in cycle:
+          self.results[key] = CIRCULAR
+      for key in order:
+          self.sheet = key[0]
+          try:
+              function, sheets = compile_formula(self.sheets[key[0]][key[1:]])
+              self.results[key] = scalar(function(self, sheets))
+          except ValueError:
+              self.results[key] = NAME
+      self.sheet = None
+      return self.results
+
+
+  def differences(self) -> list:
+      # (sheet, row, col, formula, calculated, cached) of every formula whose stored value differs
+      results = self.results or self.calculate()
+      found = []
+      for key, stored in self.cached.items():
+          value = results.get(key)
+          same = value == stored or (
+              isinstance(value, float) and isinstance(stored, float) and math.isclose(value, stored, rel_tol=1e-9, abs_tol=1e-9)
+          ) or (value is None and stored == "")
+          if not same:
+              found.append((*key, self.sheets[key[0]][key[1:]], value, stored))
+      return found
+
+
+  @staticmethod
+  def report(filenames: list, output: str = None) -> int:
+      # Write the value of every formula of the files as CSV to output or stdout, the time taken and the
+      # formulas whose stored value differs go to stderr. Returns the number of differences.
+      import csv
+      import sys
+      import time
+      f = open(output, 'w', newline='') if output else sys.stdout
+      count = 0
+      try:
+          writer = csv.writer(f)
+          writer.writerow(("file", "sheet", "cell", "formula", "value"))
+          for filename in filenames:
+              start = time.perf_counter()
+              graph = Graph.read(filename)
+              results = graph.calculate()
+              seconds = time.perf_counter() - start
+              # In the order of the sheets and their cells
+              for (sheet, row, col), formula in graph.formulas().items():
+                  value = results[(sheet, row, col)]
+                  writer.writerow((
+                      filename, sheet, f"{column_letter(col)}{row}", formula,
+                      value.code if isinstance(value, Error) else '' if value is None else value
+                  ))
+              differences = graph.differences()
+              print(f"Calculated {len(results)} formulas of {filename} in {seconds:.3f}s", file=sys.stderr)
+              for sheet, row, col, formula, value, stored in differences:
+                  print(f"  '{sheet}'!{column_letter(col)}{row} {formula} is {value!r}, stored {stored!r}", file=sys.stderr)
+              count += len(differences)
+      finally:
+          if output:
+              f.close()
+      return count
+
+
+@lru_cache(maxsize=65536)
+def unescape(text: str) -> str:
+  # Text of an XML element or attribute, formulas repeat in every week
+  if "&" not in text:
+      return text
+  return ENTITY.sub(lambda match: ENTITIES.get(match.group(1)) or chr(
+      int(match.group(1)[2:], 16) if match.group(1)[1:2] in ("x", "X") else int(match.group(1)[1:])
+  ), text)
+
+
+def _isblank(args):
+  value = scalar(args[0])
+  return value is None or value == ""
+
+
+def _aggregate(reduce, empty=0.0):
+  def function(args):
+      found = numbers(args)
+      if isinstance(found, Error):
+          return found
+      return reduce(found) if found else empty
+  return function
+
+
+def _product(values):
+  result = 1.0
+  for value in values:
+      result *= value
+  return result
+
+
+def _single(function):
+  def wrapper(args):
+      values = [number(scalar(arg)) for arg in args]
+      for value in values:
+          if isinstance(value, Error):
+              return value
+      return function(*values)
+  return wrapper
+
+
+def _round(value, digits=0):
+  return round_half_up(value, int(digits))
+
+
+def _divide(dividend, divisor):
+  return DIV0 if divisor == 0 else dividend / divisor
+
+
+def _averageif(args):
+  cells, test = args[0], matches(scalar(args[1]))
+  values = args[2].values() if len(args) > 2 else cells.values()
+  found = [
+      value for criterion, value in zip(cells.values(), values)
+      if test(criterion) and isinstance(value, (int, float)) and not isinstance(value, bool)
+  ]
+  return sum(found) / len(found) if found else DIV0
+
+
+def _sumif(args):
+  cells, test = args[0], matches(scalar(args[1]))
+  values = args[2].values() if len(args) > 2 else cells.values()
+  return float(sum(
+      value for criterion, value in zip(cells.values(), values)
+      if test(criterion) and isinstance(value, (int, float)) and not isinstance(value, bool)
+  ))
+
+
+def _countif(args):
+  test = matches(scalar(args[1]))
+  return float(sum(1 for value in args[0].values() if test(value)))
+
+
+def _count(args):
+  count = 0
+  for arg in args:
+      if isinstance(arg, Range):
+          count += sum(1 for value in arg.values() if isinstance(value, (int, float)) and not isinstance(value, bool))
+      elif arg is not None and isinstance(number(arg), (int, float)):
+          count += 1
+  return float(count)
+
+
+def _vlookup(args):
+  lookup, table, col = scalar(args[0]), args[1], number(scalar(args[2]))
+  if isinstance(lookup, Error):
+      return lookup
+  if isinstance(col, Error) or not isinstance(table, Range):
+      return VALUE
+  for row in table.rows:
+      key = row[0]
+      if isinstance(lookup, str) and isinstance(key, str) and key.lower() == lookup.lower():
+          return row[int(col) - 1]
+      if isinstance(lookup, (int, float)) and isinstance(key, (int, float)) and not isinstance(key, bool) and key == lookup:
+          return row[int(col) - 1]
+  return NA
+
+
+def _sumproduct(args):
+  columns = [arg.values() if isinstance(arg, Range) else [arg] for arg in args]
+  if len({len(column) for column in columns}) > 1:
+      return VALUE
+  total = 0.0
+  for values in zip(*columns):
+      product = 1.0
+      for value in values:
+          if isinstance(value, Error):
+              return value
+          product *= value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0.0
+      total += product
+  return total
+
+
+# Functions that skip the text and blanks of the cells they are given, not only of ranges
+AGGREGATES = frozenset(("SUM", "MAX", "MIN", "PRODUCT", "COUNT"))
+
+# Functions of the generated formulas, each takes its evaluated arguments
+FUNCTIONS = {
+    "ISBLANK": _isblank,
+    "SUM": _aggregate(sum),
+    "MAX": _aggregate(max),
+    "MIN": _aggregate(min),
+    "PRODUCT": _aggregate(_product),
+    "AVERAGEIF": _averageif,
+    "COUNTIF": _countif,
+    "SUMIF": _sumif,
+    "COUNT": _count,
+    "VLOOKUP": _vlookup,
+    "SUMPRODUCT": _sumproduct,
+    "ROUND": _single(_round),
+    "ABS": _single(abs),
+    "MINUS": _single(lambda a, b: a - b),
+    "DIVIDE": _single(_divide),
+}
@@ -0,0 +1,213 @@
+from functools import lru_cache
+
+
+# Enough entries for every block of several program shapes at once
+CACHE_SIZE = 4096
+
+
+class Formula:
+  # Formulas of a week sheet, built once per block and shape then reused for every week.
+  # Each function returns the formulas of a whole column or row of a block so the
+  # generators only index into the result for each cell.
+  # This is the Google Sheets dialect, other applications subclass it, see Formula.dialect().
+
+  @staticmethod
+  def dialect(name: str) -> type:
+      # Get the formula class of an application e.g. Formula.dialect('excel').tonnage(...)
+      if name not in DIALECTS:
+          raise ValueError(f"Unknown formula dialect {name}, choose from {', '.join(DIALECTS)}")
+      return DIALECTS[name]
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def rir_to_rpe(rir: str, first_row: int, sets: int) -> tuple:
+      # e.g. =IF(ISBLANK(E12),"...", IFERROR(ABS(MINUS(E12, 10)), "N/A"))
+      return tuple(
+          f"=IF(ISBLANK({rir}{row}), \"...\", IFERROR(ABS(MINUS({rir}{row}, 10)), \"N/A\"))"
+          for row in range(first_row, first_row + sets)
+      )
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def intensity(load: str, first_row: int, sets: int, e1rm_row: int) -> tuple:
+      # e.g. =IFERROR(C12/C27, "...")
+      return tuple(
+          f"=IFERROR({load}{row}/{load}{e1rm_row}, \"...\")"
+          for row in range(first_row, first_row + sets)
+      )
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def lwl(load: str, first_row: int, sets: int) -> tuple:
+      # Templates of Last Week's Load, fill in the previous week with .format(last_week)
+      # e.g. =IF(ISBLANK('Week 1'!C12), "...", 'Week 1'!C12)
+      return tuple(
+          f"=IF(ISBLANK('Week {{0}}'!{load}{row}), \"...\", 'Week {{0}}'!{load}{row})"
+          for row in range(first_row, first_row + sets)
+      )
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def maxes(letters: tuple, first_row: int, last_row: int) -> tuple:
+      # e.g. =IFERROR(MAX(C12:C16), "...") for every column
+      return tuple(
+          f"=IFERROR(MAX({letter}{first_row}:{letter}{last_row}), \"...\")"
+          for letter in letters
+      )
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def averages(letters: tuple, first_row: int, last_row: int, precision: tuple) -> tuple:
+      # Rounded to the number of digits in precision, None keeps the full value
+      # e.g. =IFERROR(ROUND(AVERAGEIF(C12:C21, "<>0"), 0), "...")
+      formulas = []
+      for letter, digits in zip(letters, precision):
+          average = f"AVERAGEIF({letter}{first_row}:{letter}{last_row}, \"<>0\")"
+          if digits is not None:
+              average = f"ROUND({average}, {digits})"
+          formulas.append(f"=IFERROR({average}, \"...\")")
+      return tuple(formulas)
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def sums(letters: tuple, first_row: int, last_row: int) -> tuple:
+      # e.g. =IFERROR(IF(SUM(C12:C21)>0, SUM(C12:C21), "..."), "N/A")
+      return tuple(
+          f"=IFERROR(IF(SUM({letter}{first_row}:{letter}{last_row})>0, SUM({letter}{first_row}:{letter}{last_row}), \"...\"), \"N/A\")"
+          for letter in letters
+      )
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def tonnage(load: str, reps: str, first_row: int, sets: int) -> str:
+      # =IF(COUNT(C12:C21)>0, SUM(PRODUCT(C12:D12), PRODUCT(C13:D13), ...), "...")
+      last_row = first_row + sets - 1
+      products = "".join(f"PRODUCT({load}{row}:{reps}{row}), " for row in range(first_row, last_row + 1))
+      return f"=IF(COUNT({load}{first_row}:{load}{last_row})>0, SUM({products}), \"...\")"
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def e1rm(load: str, reps: str, first_row: int, sets: int) -> str:
+      # Epley equation W * (1 + r/30)
+      # =IFERROR(PRODUCT(MAX(C12:C21), SUM(1, DIVIDE(VLOOKUP(MAX(C12:C21), C12:D21, 2,FALSE), 30))), "...")
+      last_row = first_row + sets - 1
+      loads = f"{load}{first_row}:{load}{last_row}"
+      return (
+          f"=IFERROR(PRODUCT(MAX({loads}), "
+          f"SUM(1, DIVIDE(VLOOKUP(MAX({loads}), {load}{first_row}:{reps}{last_row}, 2, FALSE), 30))), \"...\")"
+      )
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def best(cell: str, week_cell: str) -> tuple:
+      # Best of a cell so far, the first week's and a template of the later weeks' that fold in the best
+      # of the week before, fill it in with .format(last_week). Each week reads one cell of the week before.
+      # e.g. =IF(MAX(C27, 'Week 1'!C29)>0, MAX(C27, 'Week 1'!C29), "...")
+      first = f"MAX({cell})"
+      later = f"MAX({cell}, 'Week {{0}}'!{week_cell})"
+      return f"=IF({first}>0, {first}, \"...\")", f"=IF({later}>0, {later}, \"...\")"
+
+
+  # Lean formulas, one array formula over the sets of a block in place of one formula per set.
+  # They use operators only so every application reads them the same way.
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def lean_rir_to_rpe(rir: str, first_row: int, sets: int) -> str:
+      # e.g. =IF(ISBLANK(E12:E21), "...", IFERROR(ABS(E12:E21-10), "N/A"))
+      rirs = f"{rir}{first_row}:{rir}{first_row + sets - 1}"
+      return f"=IF(ISBLANK({rirs}), \"...\", IFERROR(ABS({rirs}-10), \"N/A\"))"
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def lean_intensity(load: str, first_row: int, sets: int, e1rm_row: int) -> str:
+      # e.g. =IFERROR(C12:C21/C27, "...")
+      return f"=IFERROR({load}{first_row}:{load}{first_row + sets - 1}/{load}{e1rm_row}, \"...\")"
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def lean_lwl(load: str, first_row: int, sets: int) -> str:
+      # Template of Last Week's Load, fill in the previous week with .format(last_week)
+      # e.g. =IF(ISBLANK('Week 1'!C12:C21), "...", 'Week 1'!C12:C21)
+      loads = f"'Week {{0}}'!{load}{first_row}:{load}{first_row + sets - 1}"
+      return f"=IF(ISBLANK({loads}), \"...\", {loads})"
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def lean_tonnage(load: str, reps: str, first_row: int, sets: int) -> str:
+      # The SUMIFs add the sets with only a Load or only Reps, which PRODUCT counts in tonnage
+      # e.g. =IF(COUNT(C12:C21)>0, SUM(SUMPRODUCT(C12:C21, D12:D21), SUMIF(D12:D21, "", C12:C21), SUMIF(C12:C21, "", D12:D21)), "...")
+      last_row = first_row + sets - 1
+      loads, reps = f"{load}{first_row}:{load}{last_row}", f"{reps}{first_row}:{reps}{last_row}"
+      return f"=IF(COUNT({loads})>0, SUM(SUMPRODUCT({loads}, {reps}), SUMIF({reps}, \"\", {loads}), SUMIF({loads}, \"\", {reps})), \"...\")"
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def internal_load(session_cell: str, set_range: tuple) -> str:
+      # =IF(ISBLANK(C52), "...", PRODUCT(C52, SUM(COUNTIF(C12:C21, ">0"), COUNTIF(C35:C44, ">0"))))
+      counts = ", ".join(f"COUNTIF({first}:{last}, \">0\")" for first, last in set_range)
+      return f"=IF(ISBLANK({session_cell}), \"...\", PRODUCT({session_cell}, SUM({counts})))"
+
+
+class Excel(Formula):
+  # Excel has no MINUS or DIVIDE, use plain operators and SUMPRODUCT instead of function chains.
+  # LibreOffice Calc reads the formulas of an xlsx file in the same grammar.
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def rir_to_rpe(rir: str, first_row: int, sets: int) -> tuple:
+      # e.g. =IF(ISBLANK(E12), "...", IFERROR(ABS(E12-10), "N/A"))
+      return tuple(
+          f"=IF(ISBLANK({rir}{row}), \"...\", IFERROR(ABS({rir}{row}-10), \"N/A\"))"
+          for row in range(first_row, first_row + sets)
+      )
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def tonnage(load: str, reps: str, first_row: int, sets: int) -> str:
+      # A set with only its Load or only its Reps counts that one, as PRODUCT does in Formula.tonnage
+      # e.g. =IF(COUNT(C12:C21)>0, SUMPRODUCT(C12:C21, D12:D21)+SUMIF(D12:D21, "", C12:C21)+SUMIF(C12:C21, "", D12:D21), "...")
+      last_row = first_row + sets - 1
+      loads, reps = f"{load}{first_row}:{load}{last_row}", f"{reps}{first_row}:{reps}{last_row}"
+      return f"=IF(COUNT({loads})>0, SUMPRODUCT({loads}, {reps})+SUMIF({reps}, \"\", {loads})+SUMIF({loads}, \"\", {reps}), \"...\")"
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def e1rm(load: str, reps: str, first_row: int, sets: int) -> str:
+      # Epley equation W * (1 + r/30)
+      # e.g. =IFERROR(MAX(C12:C21)*(1+VLOOKUP(MAX(C12:C21), C12:D21, 2, FALSE)/30), "...")
+      last_row = first_row + sets - 1
+      loads = f"{load}{first_row}:{load}{last_row}"
+      return f"=IFERROR(MAX({loads})*(1+VLOOKUP(MAX({loads}), {load}{first_row}:{reps}{last_row}, 2, FALSE)/30), \"...\")"
+
+
+  @staticmethod
+  @lru_cache(maxsize=CACHE_SIZE)
+  def internal_load(session_cell: str, set_range: tuple) -> str:
+      # e.g. =IF(ISBLANK(C52), "...", C52*(COUNTIF(C12:C21, ">0")+COUNTIF(C35:C44, ">0")))
+      counts = "+".join(f"COUNTIF({first}:{last}, \">0\")" for first, last in set_range) or "0"
+      return f"=IF(ISBLANK({session_cell}), \"...\", {session_cell}*({counts}))"
+
+
+# Formula dialect of each supported spreadsheet application
+DIALECTS = {
+    'sheets': Formula,
+    'excel':  Excel,
+    'calc':   Excel,
+}
+
@@ -0,0 +1,193 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+
+# TODO: Calculate these numbers in dynamically
+COLUMN_LENGTH = 7 # The length of each day/slot, determines overall alignment
+BEGIN_COLUMN = 2 #  We start in the 2nd column i.e. B for each day/slot
+BEGIN_FREQ_ROW = 4 # We start at row 4 for each day/slot
+BEGIN_SLOT_ROW = 6 # The first row in a week where the exercise slot begins e.g. [ Exercise 1 ]
+NEXT_COLUMN = COLUMN_LENGTH + 2 # Where the next column begins for each day/slot
+# TODO: Make these user defineable
+VOLUME_HEADERS = ("Sets", "Load", "Reps", "RIR", "RPE", "Avg Vel", "Int %", "LWL")
+VOLUME_LENGTH = len(VOLUME_HEADERS)
+# Index of each volume header in the number and letter tuples of a Columns record
+SETS, LOAD, REPS, RIR, RPE, AVG_VEL, INT, LWL = range(VOLUME_LENGTH)
+# Rows of an exercise slot block in order, each block is followed by a blank row
+SLOT_BLOCK = (
+    "slot", "exercise", "programming", "target", "notes", "volume_header",
+    "volume_input", "maxes", "averages", "sums", "volume", "tonnage", "e1rm"
+)
+# Rows of the best Load and E1RM of the program so far that follow the E1RM row of a block with records
+RECORD_BLOCK = ("best_load", "best_e1rm")
+
+
+@lru_cache(maxsize=None)
+def column_letter(col: int) -> str:
+  # Same as openpyxl's get_column_letter without importing openpyxl e.g. 1 -> A, 27 -> AA
+  letters = ""
+  while col > 0:
+      col, remainder = divmod(col - 1, 26)
+      letters = chr(65 + remainder) + letters
+  return letters
+
+
+@lru_cache(maxsize=None)
+def column_index(letters: str) -> int:
+  # e.g. A -> 1, AA -> 27
+  col = 0
+  for char in letters:
+      col = col * 26 + ord(char) - 64
+  return col
+
+
+class Columns(namedtuple('Columns', ('day', 'number', 'letter'))):
+  # Column numbers and letters of the volume headers for one day
+  # e.g. Columns(day=2, number=(11, 12, ..), letter=('K', 'L', ..)), use LOAD, REPS, etc. as index
+  __slots__ = ()
+
+
+class Rows(namedtuple('Rows', SLOT_BLOCK + RECORD_BLOCK, defaults=(None,) * len(RECORD_BLOCK))):
+  # Row numbers of every part of one exercise slot block, the same for every day
+  # The record rows are None unless the program has them
+  __slots__ = ()
+
+  @property
+  def last(self) -> int:
+      # Last row of the block, right above the blank row after it
+      return self.best_e1rm or self.e1rm
+
+  @property
+  def last_input(self) -> int:
+      # Last set row, right above the maxes
+      return self.maxes - 1
+
+
+class Layout(namedtuple('Layout', (
+    'frequency', 'slots', 'sets', 'next_slot', 'days', 'rows',
+    'daily_rpe', 'session_rpe', 'internal_load', 'max_row', 'max_column', 'widths', 'gaps', 'records'
+))):
+  # Address of every block in a week sheet, computed once per (frequency, slots, sets) shape
+  # and shared by every week that has it. Generators read from it instead of tracking offsets.
+  __slots__ = ()
+
+  @staticmethod
+  @lru_cache(maxsize=None)
+  def columns(day: int) -> Columns:
+      begin = BEGIN_COLUMN + (day - 1) * NEXT_COLUMN
+      number = tuple(range(begin, begin + VOLUME_LENGTH))
+      return Columns(day=day, number=number, letter=tuple(column_letter(n) for n in number))
+
+
+  @staticmethod
+  @lru_cache(maxsize=None)
+  def plan(frequency: int, slots: int, sets: int, records: bool = False) -> 'Layout':
+      # Used to get the next exercise slot section via its row number
+      # records adds the rows of the best Load and E1RM so far to every slot block
+      next_slot = len(SLOT_BLOCK) + (len(RECORD_BLOCK) if records else 0) + sets
+
+      rows = []
+      for slot in range(slots):
+          begin = BEGIN_SLOT_ROW + slot * next_slot
+          rows.append(Rows(
+              slot          = begin,
+              exercise      = begin + 1,
+              programming   = begin + 2,
+              target        = begin + 3,
+              notes         = begin + 4,
+              volume_header = begin + 5,
+              volume_input  = begin + 6,
+              maxes         = begin + 6 + sets,
+              averages      = begin + 6 + sets + 1,
+              sums          = begin + 6 + sets + 2,
+              volume        = begin + 6 + sets + 3,
+              tonnage       = begin + 6 + sets + 4,
+              e1rm          = begin + 6 + sets + 5,
+              best_load     = begin + 6 + sets + 6 if records else None,
+              best_e1rm     = begin + 6 + sets + 7 if records else None
+          ))
+
+      # Daily summary rows follow the last slot block of the week
+      last_row = rows[-1].last if rows else BEGIN_FREQ_ROW
+      days = tuple(Layout.columns(day) for day in range(1, frequency + 1))
+
+      # Every column width of the sheet, set together by Style.set_widths:
+      # the banner column, then a wide Day and label column and narrow inputs per day
+      widths = [('A', 10)]
+      for day in days:
+          widths.append((day.letter[SETS], 20))
+          widths.extend((letter, 8) for letter in day.letter[LOAD:])
+
+      max_row = last_row + 3
+      max_column = days[-1].number[SETS] + COLUMN_LENGTH if days else BEGIN_COLUMN
+
+      # Empty ranges (min_row, min_col, max_row, max_col) between the blocks that get the background
+      # The blank rows above and below the day headers and between slot blocks span the sheet
+      gaps = [(BEGIN_FREQ_ROW - 1, 1, BEGIN_FREQ_ROW - 1, max_column)]
+      gaps.append((BEGIN_SLOT_ROW - 1, 1, BEGIN_SLOT_ROW - 1, max_column))
+      gaps.extend((block.last + 1, 1, block.last + 1, max_column) for block in rows[:-1])
+      # The first column and the column between two days run from the day headers down
+      gaps.append((BEGIN_FREQ_ROW, 1, max_row, 1))
+      gaps.extend((BEGIN_FREQ_ROW, day.number[LWL] + 1, max_row, day.number[LWL] + 1) for day in days[:-1])
+
+      return Layout(
+          frequency=frequency, slots=slots, sets=sets, next_slot=next_slot,
+          days=days, rows=tuple(rows),
+          daily_rpe=last_row + 1, session_rpe=last_row + 2, internal_load=last_row + 3,
+          max_row=max_row, max_column=max_column, widths=tuple(widths), gaps=tuple(gaps), records=records
+      )
+
+
+  @staticmethod
+  @lru_cache(maxsize=None)
+  def blocks(plan: 'Layout') -> tuple:
+      # Name and range (min_row, min_col, max_row, max_col) of every block of a week, the week
+      # prefix is added by the caller e.g. ('D2_S1_Load', (12, 12, 21, 12)) becomes W3_D2_S1_Load
+      labels = tuple(re.sub(r"\W", "", header) for header in VOLUME_HEADERS)
+      blocks = []
+      for day in plan.days:
+          load, last = day.number[LOAD], day.number[LWL]
+          for slot, rows in enumerate(plan.rows, 1):
+              prefix = f"D{day.day}_S{slot}"
+              for item in range(LOAD, VOLUME_LENGTH):
+                  col = day.number[item]
+                  blocks.append((f"{prefix}_{labels[item]}", (rows.volume_input, col, rows.last_input, col)))
+              for label, row in (("Maxes", rows.maxes), ("Averages", rows.averages), ("Sums", rows.sums)):
+                  blocks.append((f"{prefix}_{label}", (row, load, row, last)))
+              for label, row in (("Volume", rows.volume), ("Tonnage", rows.tonnage), ("E1RM", rows.e1rm),
+                                 ("BestLoad", rows.best_load), ("BestE1RM", rows.best_e1rm)):
+                  if row:
+                      blocks.append((f"{prefix}_{label}", (row, load, row, load)))
+          for label, row in (("AvgRPE", plan.daily_rpe), ("SessionRPE", plan.session_rpe), ("InternalLoad", plan.internal_load)):
+              blocks.append((f"D{day.day}_{label}", (row, load, row, load)))
+      return tuple(blocks)
+
+
+  @staticmethod
+  def infer(merges: list) -> tuple:
+      # Shape (frequency, slots, sets, records) of a week sheet we generated, from its merged ranges
+      # (min_row, min_col, max_row, max_col). Each day header is merged on the day row, the slot
+      # and exercise headers of day 1 are merged from its first column and the divides after them.
+      frequency = sum(1 for min_row, _, _, _ in merges if min_row == BEGIN_FREQ_ROW)
+      headers = sorted(min_row for min_row, min_col, _, _ in merges if min_col == BEGIN_COLUMN and min_row >= BEGIN_SLOT_ROW)
+      slots = len(headers) // 2
+      if not frequency or not slots:
+          raise ValueError("Not a week sheet of Time to Train, could not find its days and exercise slots")
+
+      # The first divide after the notes of the first slot is the Volume row, begin + 9 + sets
+      begin = headers[0]
+      volume = min(
+          min_row for min_row, min_col, _, _ in merges
+          if min_col == BEGIN_COLUMN + 1 and min_row > begin + SLOT_BLOCK.index("notes")
+      )
+      sets = volume - begin - 9
+
+      # Volume, Tonnage and E1RM are followed by the record rows, and the daily rows after a single slot
+      divides = {min_row for min_row, min_col, _, _ in merges if min_col == BEGIN_COLUMN + 1}
+      following = 0
+      while volume + following in divides:
+          following += 1
+      daily = 3 if slots == 1 else 0
+      records = following - daily == len(("volume", "tonnage", "e1rm") + RECORD_BLOCK)
+      return frequency, slots, sets, records
@@ -0,0 +1,159 @@
+import csv
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import namedtuple
+from Utils import Utils
+
+
+# What goes into the Exercise header and the Program, Target and Notes rows of a slot
+Prescription = namedtuple('Prescription', ('exercise', 'program', 'target', 'notes'))
+
+FIELDS = ("week", "day", "slot") + Prescription._fields
+CACHE_VERSION = 1 # Bump when the compiled form changes so older caches are parsed again
+
+
+def overlay(base: object, entry: object) -> object:
+  # The fields of entry that are filled in over those of base
+  if not base:
+      return entry
+  return base._replace(**{name: value for name, value in entry._asdict().items() if value})
+
+
+class Library:
+  # Exercise prescriptions of template files, looked up by week, day and slot.
+  # A blank week, day or slot in a file matches every one, so a line with only a slot prescribes
+  # that slot of every day. The most specific line wins field by field, later files over earlier ones.
+  # Files are compiled once into a cache next to the user's other caches and parsed again only when
+  # their modification time and content both change, e.g.
+  # week,day,slot,exercise,program,target,notes
+  # ,1,1,Back Squat,5x5,RPE 8,Belt on the top sets
+
+  def __init__(self, entries: dict = None, digest: str = ''):
+      # entries maps (week, day, slot), None for blank, to the Prescription of that line
+      # digest is a hash of the content of the files, part of the key of cached programs
+      self.entries = entries or {}
+      self.digest = digest
+      self._lookups = {}
+
+
+  def __bool__(self) -> bool:
+      return bool(self.entries)
+
+
+  def lookup(self, week: int, day: int, slot: int) -> object:
+      # Prescription of a slot with every field of the most specific lines, None when nothing matches
+      key = (week, day, slot)
+      if key not in self._lookups:
+          fields = {}
+          # From most to least specific, the day is left out before the week and the slot last
+          for match in ((week, day, slot), (week, None, slot), (None, day, slot), (None, None, slot),
+                        (week, day, None), (week, None, None), (None, day, None), (None, None, None)):
+              entry = self.entries.get(match)
+              if entry:
+                  for name, value in entry._asdict().items():
+                      if value and name not in fields:
+                          fields[name] = value
+          self._lookups[key] = Prescription(**{name: fields.get(name, '') for name in Prescription._fields}) if fields else None
+      return self._lookups[key]
+
+
+  @staticmethod
+  def load(filenames: list, cache: str = None) -> object:
+      # Library of every file in order, compiled through the cache
+      entries = {}
+      digests = []
+      for filename in filenames or []:
+          memo = Library.compiled(filename, cache=cache)
+          digests.append(memo["hash"])
+          for key, entry in memo["entries"].items():
+              entries[key] = overlay(entries.get(key), entry)
+      return Library(entries, digest=hashlib.sha256(' '.join(digests).encode()).hexdigest() if digests else '')
+
+
+  @staticmethod
+  def compiled(filename: str, cache: str = None) -> dict:
+      # Compiled entries and content hash of one file, from memory, the cache on disk or parsed in that order
+      # The time and size of the file are checked first, the content hash only when they changed
+      path = os.path.abspath(filename)
+      stat = os.stat(path)
+      memo = _compiled.get(path)
+      if memo and memo["stamp"] == (stat.st_mtime_ns, stat.st_size):
+          return memo
+
+      cache = cache or Utils.cache_dir()
+      cached = os.path.join(cache, hashlib.sha1(path.encode()).hexdigest() + '.pickle')
+      try:
+          with open(cached, 'rb') as f:
+              memo = pickle.load(f)
+          if memo.get("version") != CACHE_VERSION or memo.get("path") != path:
+              memo = None
+      except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+          memo = None
+
+      if memo and memo["stamp"] == (stat.st_mtime_ns, stat.st_size):
+          _compiled[path] = memo
+          return memo
+
+      with open(path, 'rb') as f:
+          content = f.read()
+      digest = hashlib.sha256(content).hexdigest()
+      if not memo or memo["hash"] != digest:
+          # Touched and changed, or never seen
+          memo = {"version": CACHE_VERSION, "path": path, "hash": digest, "entries": Library.parse(path, content)}
+      memo["stamp"] = (stat.st_mtime_ns, stat.st_size)
+
+      try:
+          # Written to a temporary file first, batch workers may load the same library at once
+          os.makedirs(cache, exist_ok=True)
+          with tempfile.NamedTemporaryFile('wb', dir=cache, delete=False) as f:
+              pickle.dump(memo, f, protocol=pickle.HIGHEST_PROTOCOL)
+          os.replace(f.name, cached)
+      except OSError:
+          # A read-only cache only costs parsing the file again next time
+          pass
+
+      _compiled[path] = memo
+      return memo
+
+
+  @staticmethod
+  def parse(filename: str, content: bytes) -> dict:
+      # Entries of a CSV or YAML file, YAML holds a list of mappings with the same fields as the CSV columns
+      # YAML files require PyYAML: pip3 install pyyaml
+      text = content.decode('utf-8-sig')
+      if filename.lower().endswith(('.yaml', '.yml')):
+          import yaml
+          rows = yaml.safe_load(text) or []
+          if isinstance(rows, dict):
+              rows = rows.get("prescriptions") or []
+          if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+              raise ValueError(f"Library {filename} should be a list of prescriptions")
+      else:
+          reader = csv.DictReader(text.splitlines())
+          unknown = [field for field in reader.fieldnames or [] if field not in FIELDS]
+          if unknown:
+              raise ValueError(f"Library {filename} has unknown columns: {', '.join(unknown)}")
+          rows = [row for row in reader if any((value or '').strip() for value in row.values())]
+
+      entries = {}
+      for number, row in enumerate(rows, 1):
+          unknown = [field for field in row if field not in FIELDS]
+          if unknown:
+              raise ValueError(f"Library {filename} prescription {number} has unknown fields: {', '.join(map(str, unknown))}")
+          key = []
+          for field in FIELDS[:3]:
+              value = str(row.get(field) if row.get(field) is not None else '').strip()
+              if value and not (value.isdigit() and int(value) > 0):
+                  raise ValueError(f"Library {filename} prescription {number}: {field} should be a number from 1, not {value}")
+              key.append(int(value) if value else None)
+          entry = Prescription(**{
+              name: str(row.get(name) if row.get(name) is not None else '').strip() for name in Prescription._fields
+          })
+          entries[tuple(key)] = overlay(entries.get(tuple(key)), entry)
+      return entries
+
+
+# Compiled files of this process by absolute path
+_compiled = {}
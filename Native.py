@@ -0,0 +1,727 @@
+import datetime
+import re
+import shutil
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from functools import lru_cache
+from Evaluator import Evaluator, Error, expand_array
+from Layout import column_letter, column_index
+from Style import Style
+
+
+# Namespaces and content types of the SpreadsheetML parts we write
+MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+RELATIONSHIPS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PACKAGE = "http://schemas.openxmlformats.org/package/2006/relationships"
+XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+SHEET_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+# Number formats our generators use, by their built-in id
+NUMBER_FORMATS = {'General': 0, '0%': 9}
+
+# A sheet rendered apart from the workbook e.g. in a worker process, picklable so it can be sent back
+# xml is the worksheet part, links its hyperlinks as (ref, url) and profile the Profile.stats of its build
+SheetPart = namedtuple('SheetPart', ('title', 'xml', 'links', 'profile'))
+
+
+class ArrayFormula(namedtuple('ArrayFormula', ('ref', 'text'))):
+  # Formula of a block of cells kept in its top-left cell, the counterpart of openpyxl's ArrayFormula
+  # e.g. ArrayFormula('H12:H21', '=IFERROR(C12:C21/C27, "...")')
+  __slots__ = ()
+
+
+def escape(text: str) -> str:
+  return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def cell_range(ref: str) -> tuple:
+  # e.g. B4:I4 -> (4, 2, 4, 9) as (min_row, min_col, max_row, max_col)
+  start, _, end = ref.partition(":")
+  start_col, start_row = re.match(r"([A-Z]+)(\d+)", start).groups()
+  end_col, end_row = re.match(r"([A-Z]+)(\d+)", end or start).groups()
+  return (int(start_row), column_index(start_col), int(end_row), column_index(end_col))
+
+
+def cached_value(value: object) -> str:
+  # Type attribute and <v> of the cached result of a formula
+  # e.g. ' t="str"', '<v>...</v>' or '', '<v>225</v>'
+  if isinstance(value, Error):
+      return ' t="e"', f'<v>{escape(value.code)}</v>'
+  if isinstance(value, bool):
+      return ' t="b"', f'<v>{int(value)}</v>'
+  if isinstance(value, (int, float)):
+      return '', f'<v>{int(value) if float(value).is_integer() else repr(value)}</v>'
+  return ' t="str"', f'<v>{escape(value or "")}</v>'
+
+
+def sheet_parts(archive: object) -> list:
+  # (title, sheetId, part name) of every sheet of an open xlsx zip, in workbook order
+  workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+  rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+  targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+
+  parts = []
+  for sheet in workbook.iter(f"{{{MAIN}}}sheet"):
+      target = targets[sheet.get(f"{{{RELATIONSHIPS}}}id")]
+      part = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+      parts.append((sheet.get("name"), int(sheet.get("sheetId")), part))
+  return parts
+
+
+class NativeCell:
+  # The parts of an openpyxl Cell the generators set, kept as plain attributes
+  __slots__ = ('value', 'style', 'number_format', 'hyperlink')
+
+  def __init__(self):
+      self.value = None
+      self.style = None
+      self.number_format = 'General'
+      self.hyperlink = None
+
+
+  @property
+  def has_style(self) -> bool:
+      return self.style is not None or self.number_format != 'General'
+
+
+  @property
+  def data_type(self) -> str:
+      if isinstance(self.value, ArrayFormula):
+          return 'f'
+      if isinstance(self.value, str) and self.value.startswith('='):
+          return 'f'
+      return 's' if isinstance(self.value, str) else 'n'
+
+
+class Dimension:
+  __slots__ = ('width', 'height', 'style')
+
+  def __init__(self):
+      self.width = None
+      self.height = None
+      self.style = None   # Named style of a whole column
+
+
+class Dimensions(dict):
+  # column_dimensions['B'].width = 20 and row_dimensions[8].height = 40 without openpyxl
+  def __missing__(self, key: object) -> Dimension:
+      dimension = self[key] = Dimension()
+      return dimension
+
+
+class NativeSheet:
+  # Buffer for a single week sheet used by the native engine, the counterpart of Stream.
+  # It offers the same worksheet API to the generators but holds NativeCells, and flush
+  # serializes the week into the workbook's zip as sheet XML.
+
+  def __init__(self, workbook: object, title: str):
+      self.parent = workbook
+      self.title = title
+      self.column_dimensions = Dimensions()
+      self.row_dimensions = Dimensions()
+      self.merged = []
+      self.conditional_formatting = []   # (sqref, named style) filled by a rule that always holds
+      self._cells = {}
+      self._max_row = 1
+      self._max_col = 1
+
+
+  @property
+  def max_row(self) -> int:
+      return self._max_row
+
+
+  @property
+  def max_column(self) -> int:
+      return self._max_col
+
+
+  def _track(self, row: int, col: int) -> None:
+      if row > self._max_row:
+          self._max_row = row
+      if col > self._max_col:
+          self._max_col = col
+
+
+  def cell(self, row: int, column: int, value: object = None) -> NativeCell:
+      currentCell = self._cells.get((row, column))
+      if currentCell is None:
+          currentCell = NativeCell()
+          self._cells[(row, column)] = currentCell
+          self._track(row, column)
+      if value is not None:
+          currentCell.value = value
+      return currentCell
+
+
+  def merge_cells(self, start_row: int, start_column: int, end_row: int, end_column: int) -> None:
+      # Cells hidden by the merge are never written, only the range is recorded
+      self.merged.append((start_row, start_column, end_row, end_column))
+      self._track(end_row, end_column)
+
+
+  def flush(self, release: bool = True) -> str:
+      # Write the buffered week into the workbook as the next sheet part
+      # Keep the cells with release=False to write the buffer again as another sheet
+      name = self.parent.add_sheet(self)
+      if release:
+          self._cells = {}
+          self.merged = []
+          self.conditional_formatting = []
+      return name
+
+
+class NativeWorkbook:
+  # Minimal xlsx package writer for the native engine.
+  # Sheets are compressed into a temporary zip as soon as they are flushed, strings go into
+  # one shared strings table and every cell style is an index into a stylesheet fixed by
+  # Style.Settings, so nothing of a week is held once it has been written.
+  # Given the xlsx file of an earlier program as base, the new sheets are added after its sheets.
+  # With calculate the formulas are evaluated as each sheet is written and stored with their
+  # results, so the file shows them without being calculated first.
+
+  def __init__(self, base: str = None, calculate: bool = False, strings: dict = None, date: object = None):
+      self.sheetnames = []
+      self.strings = {} if strings is None else strings
+      self._frozen = strings is not None   # Strings of another workbook, any others are written inline
+      self.styles = NativeWorkbook.stylesheet()[1]
+      self._sheets = []   # (title, part number) of the sheets written by us
+      self._number = 0    # Number of the last worksheet part in the package
+      self._sheet_id = 0  # Last sheetId and relationship id of the workbook
+      self._rel_id = 0
+      self._base = None
+      self.calculate = calculate
+      self._values = {}   # Values of the last written sheet by title, the LWL formulas read from it
+      self.defined_names = []   # (name, reference) e.g. ('W1_D1_S1_Load', "'Week 1'!$C$12:$C$21")
+      self.date = date    # Date of the package and its parts, the same file for the same date when given
+      self._file = tempfile.TemporaryFile()
+      self._zip = zipfile.ZipFile(self._file, 'w', zipfile.ZIP_DEFLATED)
+      if base:
+          self._open(base)
+
+
+  def _open(self, base: str) -> None:
+      # Read the sheet list and styles of an existing file, its sheets are never parsed
+      self._base = zipfile.ZipFile(base)
+      self._parts = {}
+      for title, sheet_id, part in sheet_parts(self._base):
+          self._parts[title] = part
+          self.sheetnames.append(title)
+          self._sheet_id = max(self._sheet_id, sheet_id)
+
+      rels = ET.fromstring(self._base.read("xl/_rels/workbook.xml.rels"))
+      self._rel_id = max((int(rel.get("Id")[3:]) for rel in rels if rel.get("Id")[3:].isdigit()), default=0)
+      self._number = max(
+          (int(match.group(1)) for match in map(re.compile(r"xl/worksheets/sheet(\d+)\.xml$").match, self._base.namelist()) if match),
+          default=0
+      )
+      self._stylesheet, self.styles = NativeWorkbook.merge_styles(self._base.read("xl/styles.xml").decode())
+      # Strings are written inline, the shared strings of the file stay as they are
+      self.strings = None
+
+
+  def merges(self, title: str) -> list:
+      # Merged ranges (min_row, min_col, max_row, max_col) of a sheet of the base file
+      ranges = []
+      with self._base.open(self._parts[title]) as part:
+          for _, element in ET.iterparse(part):
+              if element.tag == f"{{{MAIN}}}mergeCell":
+                  ranges.append(cell_range(element.get("ref")))
+              element.clear()
+      return ranges
+
+
+  def values(self, title: str) -> dict:
+      # Values of the cells of a sheet of the base file by (row, col), formulas by their cached value
+      shared = self._shared_strings()
+      values = {}
+      with self._base.open(self._parts[title]) as part:
+          for _, element in ET.iterparse(part):
+              if element.tag != f"{{{MAIN}}}c":
+                  continue
+              kind = element.get("t", "n")
+              v = element.find(f"{{{MAIN}}}v")
+              text = v.text if v is not None else None
+              if kind == "inlineStr":
+                  value = "".join(t.text or "" for t in element.iter(f"{{{MAIN}}}t"))
+              elif text is None:
+                  value = None
+              elif kind == "s":
+                  value = shared[int(text)]
+              elif kind in ("str", "e"):
+                  value = Error(text) if kind == "e" else text
+              elif kind == "b":
+                  value = text == "1"
+              else:
+                  value = float(text)
+              row, col = cell_range(element.get("r"))[:2]
+              values[(row, col)] = value
+              element.clear()
+      return values
+
+
+  def _shared_strings(self) -> list:
+      # Shared strings table of the base file
+      if "xl/sharedStrings.xml" not in self._base.namelist():
+          return []
+      root = ET.fromstring(self._base.read("xl/sharedStrings.xml"))
+      return ["".join(t.text or "" for t in si.iter(f"{{{MAIN}}}t")) for si in root.iter(f"{{{MAIN}}}si")]
+
+
+  def value(self, title: str, row: int, col: int) -> object:
+      # Value of a cell of another sheet for the evaluator, our last sheet or one of the base file
+      if title not in self._values:
+          if self._base is None or title not in self._parts:
+              return None
+          self._values = {title: self.values(title)}
+      return self._values[title].get((row, col))
+
+
+  def evaluate(self, sheet: NativeSheet) -> dict:
+      # Results of the formulas of a sheet, the values of all of its cells are kept for the next sheet
+      cells = {key: currentCell.value for key, currentCell in sheet._cells.items()}
+      for key, value in list(cells.items()):
+          if isinstance(value, ArrayFormula):
+              # Every cell of the block is calculated as a formula of its own
+              cells.update(expand_array(value.text, value.ref))
+      evaluator = Evaluator(cells, self.value)
+      results = evaluator.values()
+      self._values = {sheet.title: {**cells, **results}}
+      return results
+
+
+  @staticmethod
+  @lru_cache(maxsize=None)
+  def styles(fonts: int = 1, fills: int = 2, style_xfs: int = 1, cell_xfs: int = 1, named: tuple = (), dxfs: int = 0) -> tuple:
+      # Our fonts, fills and xfs, numbered after the ones a stylesheet already has
+      # named holds the styles it already has with their cellStyleXfs id e.g. (('Train Day', 3), ..)
+      # Returns the elements to add to each list and the cellXfs index of each (named style, number format),
+      # every named style gets a plain and a percent xf e.g. ('Train Formula', '0%'),
+      # and the dxfs index of the background fill of conditional formatting as (named style, 'dxf')
+      parts = {"fonts": [], "fills": [], "cellStyleXfs": [], "cellXfs": [], "cellStyles": [], "dxfs": []}
+      alignment = '<alignment horizontal="center" vertical="center" wrapText="1"/>'
+
+      def font(xml):
+          if xml not in parts["fonts"]:
+              parts["fonts"].append(xml)
+          return fonts + parts["fonts"].index(xml)
+
+      def fill(color):
+          xml = f'<fill><patternFill patternType="solid"><fgColor rgb="{color}"/></patternFill></fill>'
+          if xml not in parts["fills"]:
+              parts["fills"].append(xml)
+          return fills + parts["fills"].index(xml)
+
+      def xf(font, fill, aligned, number_format=0, xf_id=None):
+          attributes = f'numFmtId="{number_format}" fontId="{font}" fillId="{fill}" borderId="0"'
+          if xf_id is not None:
+              attributes += f' xfId="{xf_id}"'
+          if number_format:
+              attributes += ' applyNumberFormat="1"'
+          if aligned:
+              return f'<xf {attributes} applyAlignment="1">{alignment}</xf>'
+          return f'<xf {attributes}/>'
+
+      # Named style: (fontId, fillId, alignment), 0 is the stylesheet's default font and empty fill
+      looks = {}
+      for name, (fgColor, bgColor, size, bold) in Style.Settings.STYLES.items():
+          weight = '<b val="1"/>' if bold else ''
+          looks[name] = (font(f'<font>{weight}<sz val="{size}"/><color rgb="{fgColor}"/><name val="Helvetica"/></font>'), fill(bgColor), True)
+      looks[Style.Settings.INPUT] = (0, 0, True)
+      looks[Style.Settings.BACKGROUND] = (0, fill(Style.Settings.LIGHTBLACK), False)
+
+      index = {(None, 'General'): 0, (None, '0%'): cell_xfs}
+      parts["cellXfs"].append(xf(0, 0, False, NUMBER_FORMATS['0%'], xf_id=0))
+      existing = dict(named)
+      for name, (font_id, fill_id, aligned) in looks.items():
+          xf_id = existing.get(name)
+          if xf_id is None:
+              xf_id = style_xfs + len(parts["cellStyleXfs"])
+              parts["cellStyleXfs"].append(xf(font_id, fill_id, aligned))
+              parts["cellStyles"].append(f'<cellStyle name="{escape(name)}" xfId="{xf_id}"/>')
+          for number_format, number_format_id in NUMBER_FORMATS.items():
+              index[(name, number_format)] = cell_xfs + len(parts["cellXfs"])
+              parts["cellXfs"].append(xf(font_id, fill_id, aligned, number_format_id, xf_id=xf_id))
+
+      color = Style.Settings.LIGHTBLACK
+      index[(Style.Settings.BACKGROUND, 'dxf')] = dxfs
+      parts["dxfs"].append(f'<dxf><fill><patternFill patternType="solid"><fgColor rgb="{color}"/><bgColor rgb="{color}"/></patternFill></fill></dxf>')
+
+      return parts, index
+
+
+  @staticmethod
+  def merge_styles(xml: str) -> tuple:
+      # Add our styles to the styles.xml of another file, returns the new styles.xml and the cellXfs index
+      root = ET.fromstring(xml)
+
+      def count(tag):
+          element = root.find(f"{{{MAIN}}}{tag}")
+          return len(element) if element is not None else 0
+
+      named = tuple((style.get("name"), int(style.get("xfId"))) for style in root.iter(f"{{{MAIN}}}cellStyle"))
+      parts, index = NativeWorkbook.styles(count("fonts"), count("fills"), count("cellStyleXfs"), count("cellXfs"), named, count("dxfs"))
+
+      for tag, elements in parts.items():
+          if not elements:
+              continue
+          total = count(tag) + len(elements)
+          match = re.search(rf"<{tag}(\s[^>]*?)?(/?)>", xml)
+          if match is None:
+              # Lists a stylesheet may leave out go around cellXfs, dxfs after the cellStyles
+              if tag == "cellStyleXfs":
+                  at = xml.index("<cellXfs")
+              elif tag == "dxfs" and "</cellStyles>" in xml:
+                  at = xml.index("</cellStyles>") + len("</cellStyles>")
+              else:
+                  at = xml.index("</cellXfs>") + len("</cellXfs>")
+              xml = f'{xml[:at]}<{tag} count="{total}">{"".join(elements)}</{tag}>{xml[at:]}'
+          elif match.group(2):
+              xml = f'{xml[:match.start()]}<{tag} count="{total}">{"".join(elements)}</{tag}>{xml[match.end():]}'
+          else:
+              attributes = re.sub(r'\s*count="\d+"', "", match.group(1) or "")
+              xml = f'{xml[:match.start()]}<{tag} count="{total}"{attributes}>{xml[match.end():]}'
+              at = xml.index(f"</{tag}>")
+              xml = f'{xml[:at]}{"".join(elements)}{xml[at:]}'
+
+      return xml, index
+
+
+  @staticmethod
+  @lru_cache(maxsize=None)
+  def stylesheet() -> tuple:
+      # styles.xml of a new workbook and the cellXfs index of each (named style, number format), built once
+      parts, index = NativeWorkbook.styles()
+      fonts = ['<font><sz val="11"/><color theme="1"/><name val="Calibri"/><family val="2"/><scheme val="minor"/></font>'] + parts["fonts"]
+      fills = ['<fill><patternFill/></fill>', '<fill><patternFill patternType="gray125"/></fill>'] + parts["fills"]
+      style_xfs = ['<xf numFmtId="0" fontId="0" fillId="0" borderId="0"/>'] + parts["cellStyleXfs"]
+      cell_xfs = ['<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'] + parts["cellXfs"]
+      cell_styles = ['<cellStyle name="Normal" xfId="0" builtinId="0"/>'] + parts["cellStyles"]
+      dxfs = parts["dxfs"]
+
+      xml = (
+          f'{XML}<styleSheet xmlns="{MAIN}">'
+          f'<fonts count="{len(fonts)}">{"".join(fonts)}</fonts>'
+          f'<fills count="{len(fills)}">{"".join(fills)}</fills>'
+          '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+          f'<cellStyleXfs count="{len(style_xfs)}">{"".join(style_xfs)}</cellStyleXfs>'
+          f'<cellXfs count="{len(cell_xfs)}">{"".join(cell_xfs)}</cellXfs>'
+          f'<cellStyles count="{len(cell_styles)}">{"".join(cell_styles)}</cellStyles>'
+          f'<dxfs count="{len(dxfs)}">{"".join(dxfs)}</dxfs>'
+          '</styleSheet>'
+      )
+      return xml, index
+
+
+  def define(self, name: str, reference: str) -> None:
+      # Add a workbook level defined name, written to workbook.xml on save
+      self.defined_names.append((name, reference))
+
+
+  def _defined_names(self) -> str:
+      return "".join(
+          f'<definedName name="{name}">{escape(reference)}</definedName>' for name, reference in self.defined_names
+      )
+
+
+  def string(self, text: str) -> int:
+      # Index of a text in the shared strings table, week titles and labels repeat across sheets
+      index = self.strings.get(text)
+      if index is None and not self._frozen:
+          index = self.strings[text] = len(self.strings)
+      return index
+
+
+  def _add_entry(self, title: str) -> tuple:
+      # Number and part name of the next sheet
+      self._number += 1
+      self.sheetnames.append(title)
+      self._sheets.append((title, self._number))
+      return self._number, f"xl/worksheets/sheet{self._number}.xml"
+
+
+  def add_sheet(self, sheet: NativeSheet) -> str:
+      # Serialize a sheet buffer and compress it into the package
+      number, name = self._add_entry(sheet.title)
+      with self._zip.open(self._entry(name), 'w') as part:
+          links = self.render(sheet, part.write)
+      self._add_links(number, links)
+      return name
+
+
+  def add_part(self, part: SheetPart) -> str:
+      # Add a sheet rendered by render_part, sheets are ordered as they are added
+      number, name = self._add_entry(part.title)
+      self._zip.writestr(self._entry(name), part.xml)
+      self._add_links(number, part.links)
+      return name
+
+
+  def render_part(self, sheet: NativeSheet) -> SheetPart:
+      # The whole worksheet XML of a sheet buffer, for the workbook its strings come from
+      chunks = []
+      links = self.render(sheet, chunks.append)
+      return SheetPart(sheet.title, b"".join(chunks), links, None)
+
+
+  def render(self, sheet: NativeSheet, write: object) -> list:
+      # Write the worksheet XML of a sheet buffer in chunks of bytes, returns its hyperlinks as (ref, url)
+      styles = self.styles
+      inline = self.strings is None
+      results = self.evaluate(sheet) if self.calculate else {}
+      links = []
+
+      last = f"{column_letter(sheet.max_column)}{sheet.max_row}"
+      head = [f'{XML}<worksheet xmlns="{MAIN}" xmlns:r="{RELATIONSHIPS}"><dimension ref="A1:{last}"/>']
+      head.append('<sheetViews><sheetView workbookViewId="0"/></sheetViews><sheetFormatPr defaultRowHeight="15"/>')
+      columns = sorted(
+          (column_index(letter), dimension) for letter, dimension in sheet.column_dimensions.items()
+          if dimension.width or dimension.style
+      )
+      if columns:
+          head.append("<cols>")
+          for col, dimension in columns:
+              width = f' width="{dimension.width}" customWidth="1"' if dimension.width else ''
+              style = f' style="{styles[(dimension.style, "General")]}"' if dimension.style else ''
+              head.append(f'<col min="{col}" max="{col}"{width}{style}/>')
+          head.append("</cols>")
+      head.append("<sheetData>")
+      write("".join(head).encode())
+
+      heights = sheet.row_dimensions
+      current = None
+      row_xml = []
+      for (row, col), currentCell in sorted(sheet._cells.items()):
+          value = currentCell.value
+          style = currentCell.style
+          number_format = currentCell.number_format
+          if value is None and style is None and number_format == 'General' and (row, col) not in results:
+              continue
+          if row != current:
+              if current is not None:
+                  row_xml.append("</row>")
+                  write("".join(row_xml).encode())
+                  row_xml = []
+              current = row
+              height = heights[row].height if row in heights else None
+              row_xml.append(f'<row r="{row}" ht="{height}" customHeight="1">' if height else f'<row r="{row}">')
+
+          ref = f"{column_letter(col)}{row}"
+          s = styles[(style, number_format)]
+          attributes = f'r="{ref}" s="{s}"' if s else f'r="{ref}"'
+          if currentCell.hyperlink:
+              links.append((ref, currentCell.hyperlink))
+          if isinstance(value, ArrayFormula):
+              kind, cached = cached_value(results[(row, col)]) if (row, col) in results else ('', '')
+              row_xml.append(f'<c {attributes}{kind}><f t="array" ref="{value.ref}">{escape(value.text[1:])}</f>{cached}</c>')
+          elif value in (None, "") and (row, col) in results:
+              # Cell an array formula spills into
+              kind, cached = cached_value(results[(row, col)])
+              row_xml.append(f'<c {attributes}{kind}>{cached}</c>')
+          elif value is None or value == "":
+              row_xml.append(f'<c {attributes}/>')
+          elif isinstance(value, str):
+              if value.startswith('='):
+                  if (row, col) in results:
+                      kind, cached = cached_value(results[(row, col)])
+                      row_xml.append(f'<c {attributes}{kind}><f>{escape(value[1:])}</f>{cached}</c>')
+                  else:
+                      row_xml.append(f'<c {attributes}><f>{escape(value[1:])}</f></c>')
+              else:
+                  index = None if inline else self.string(value)
+                  if index is None:
+                      space = ' xml:space="preserve"' if value != value.strip() else ''
+                      row_xml.append(f'<c {attributes} t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>')
+                  else:
+                      row_xml.append(f'<c {attributes} t="s"><v>{index}</v></c>')
+          elif isinstance(value, bool):
+              row_xml.append(f'<c {attributes} t="b"><v>{int(value)}</v></c>')
+          else:
+              row_xml.append(f'<c {attributes}><v>{value}</v></c>')
+      if current is not None:
+          row_xml.append("</row>")
+      row_xml.append("</sheetData>")
+
+      if sheet.merged:
+          row_xml.append(f'<mergeCells count="{len(sheet.merged)}">')
+          row_xml.extend(
+              f'<mergeCell ref="{column_letter(start_column)}{start_row}:{column_letter(end_column)}{end_row}"/>'
+              for start_row, start_column, end_row, end_column in sheet.merged
+          )
+          row_xml.append("</mergeCells>")
+      for priority, (sqref, name) in enumerate(sheet.conditional_formatting, 1):
+          row_xml.append(
+              f'<conditionalFormatting sqref="{sqref}"><cfRule type="expression" dxfId="{styles[(name, "dxf")]}" priority="{priority}">'
+              '<formula>TRUE</formula></cfRule></conditionalFormatting>'
+          )
+      if links:
+          row_xml.append("<hyperlinks>")
+          row_xml.extend(f'<hyperlink ref="{ref}" r:id="rId{number}"/>' for number, (ref, _) in enumerate(links, 1))
+          row_xml.append("</hyperlinks>")
+      row_xml.append('<pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/></worksheet>')
+      write("".join(row_xml).encode())
+
+      return links
+
+
+  def _add_links(self, number: int, links: list) -> None:
+      # Relationships of the hyperlinks of a sheet
+      if links:
+          self._zip.writestr(
+              self._entry(f"xl/worksheets/_rels/sheet{number}.xml.rels"),
+              f'{XML}<Relationships xmlns="{PACKAGE}">' + "".join(
+                  f'<Relationship Id="rId{number}" Type="{RELATIONSHIPS}/hyperlink" Target="{escape(url)}" TargetMode="External"/>'
+                  for number, (_, url) in enumerate(links, 1)
+              ) + '</Relationships>'
+          )
+
+
+  def _entry(self, name: str) -> object:
+      # Zip entry of a part, stamped with the date of the workbook instead of the time it is written
+      if not self.date:
+          return name
+      entry = zipfile.ZipInfo(name, date_time=(self.date.year, self.date.month, self.date.day, 0, 0, 0))
+      entry.compress_type = zipfile.ZIP_DEFLATED
+      return entry
+
+
+  def save(self, filename: object) -> object:
+      # Add the workbook parts that list the sheets and strings, then copy the package to filename
+      # or a file object e.g. io.BytesIO
+      if self._base is None:
+          self._write_parts()
+      else:
+          self._write_extension()
+
+      self._zip.close()
+      self._file.seek(0)
+      if hasattr(filename, 'write'):
+          shutil.copyfileobj(self._file, filename)
+      else:
+          with open(filename, 'wb') as f:
+              shutil.copyfileobj(self._file, f)
+      self._file.close()
+      return filename
+
+
+  def _write_extension(self) -> None:
+      # Copy the base file and add our sheets and styles to its workbook parts
+      base = self._base
+      package = self._zip
+      replaced = ("[Content_Types].xml", "xl/workbook.xml", "xl/_rels/workbook.xml.rels", "xl/styles.xml")
+
+      for info in base.infolist():
+          if info.filename not in replaced:
+              with base.open(info) as source, package.open(self._entry(info.filename), 'w') as target:
+                  shutil.copyfileobj(source, target)
+
+      def insert(xml, before, text):
+          at = xml.rindex(before)
+          return xml[:at] + text + xml[at:]
+
+      types = base.read("[Content_Types].xml").decode()
+      types = insert(types, "</Types>", "".join(
+          f'<Override PartName="/xl/worksheets/sheet{number}.xml" ContentType="{SHEET_TYPE}"/>' for _, number in self._sheets
+      ))
+
+      rels = base.read("xl/_rels/workbook.xml.rels").decode()
+      rels = insert(rels, "</Relationships>", "".join(
+          f'<Relationship Id="rId{self._rel_id + offset}" Type="{RELATIONSHIPS}/worksheet" Target="/xl/worksheets/sheet{number}.xml"/>'
+          for offset, (_, number) in enumerate(self._sheets, 1)
+      ))
+
+      workbook = base.read("xl/workbook.xml").decode()
+      prefix = re.search(rf'xmlns:(\w+)="{RELATIONSHIPS}"', workbook)
+      if prefix is None:
+          workbook = workbook.replace("<workbook ", f'<workbook xmlns:r="{RELATIONSHIPS}" ', 1)
+      prefix = prefix.group(1) if prefix else "r"
+      workbook = insert(workbook, "</sheets>", "".join(
+          f'<sheet name="{escape(title)}" sheetId="{self._sheet_id + offset}" {prefix}:id="rId{self._rel_id + offset}"/>'
+          for offset, (title, _) in enumerate(self._sheets, 1)
+      ))
+      if self.defined_names:
+          if "</definedNames>" in workbook:
+              workbook = insert(workbook, "</definedNames>", self._defined_names())
+          else:
+              workbook = re.sub(r"<definedNames\s*/>", "", workbook)
+              at = workbook.index("</sheets>") + len("</sheets>")
+              workbook = f"{workbook[:at]}<definedNames>{self._defined_names()}</definedNames>{workbook[at:]}"
+      if not self.calculate and "fullCalcOnLoad" not in workbook and "<calcPr" in workbook:
+          # The new formulas have no cached values
+          workbook = workbook.replace("<calcPr", '<calcPr fullCalcOnLoad="1"', 1)
+
+      package.writestr(self._entry("[Content_Types].xml"), types)
+      package.writestr(self._entry("xl/_rels/workbook.xml.rels"), rels)
+      package.writestr(self._entry("xl/workbook.xml"), workbook)
+      package.writestr(self._entry("xl/styles.xml"), self._stylesheet)
+      base.close()
+
+
+  def _write_parts(self) -> None:
+      # Workbook parts of a new file
+      sheets = [number for _, number in self._sheets]
+      package = self._zip
+
+      package.writestr(self._entry("[Content_Types].xml"), (
+          f'{XML}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+          '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+          '<Default Extension="xml" ContentType="application/xml"/>'
+          '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+          '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+          '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+          '<Override PartName="/docProps/core.xml" ContentType="application/vnd.openxmlformats-package.core-properties+xml"/>'
+          '<Override PartName="/docProps/app.xml" ContentType="application/vnd.openxmlformats-officedocument.extended-properties+xml"/>'
+          + "".join(f'<Override PartName="/xl/worksheets/sheet{number}.xml" ContentType="{SHEET_TYPE}"/>' for number in sheets)
+          + '</Types>'
+      ))
+      package.writestr(self._entry("_rels/.rels"), (
+          f'{XML}<Relationships xmlns="{PACKAGE}">'
+          f'<Relationship Id="rId1" Type="{RELATIONSHIPS}/officeDocument" Target="xl/workbook.xml"/>'
+          f'<Relationship Id="rId2" Type="{PACKAGE}/metadata/core-properties" Target="docProps/core.xml"/>'
+          f'<Relationship Id="rId3" Type="{RELATIONSHIPS}/extended-properties" Target="docProps/app.xml"/>'
+          '</Relationships>'
+      ))
+      now = (
+          self.date.strftime("%Y-%m-%dT00:00:00Z") if self.date
+          else datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+      )
+      package.writestr(self._entry("docProps/core.xml"), (
+          f'{XML}<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+          'xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dcterms="http://purl.org/dc/terms/" '
+          'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"><dc:creator>Time to Train</dc:creator>'
+          f'<dcterms:created xsi:type="dcterms:W3CDTF">{now}</dcterms:created>'
+          f'<dcterms:modified xsi:type="dcterms:W3CDTF">{now}</dcterms:modified></cp:coreProperties>'
+      ))
+      package.writestr(self._entry("docProps/app.xml"), (
+          f'{XML}<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties">'
+          '<Application>Time to Train</Application></Properties>'
+      ))
+
+      package.writestr(self._entry("xl/workbook.xml"), (
+          f'{XML}<workbook xmlns="{MAIN}" xmlns:r="{RELATIONSHIPS}"><bookViews><workbookView activeTab="0"/></bookViews><sheets>'
+          + "".join(
+              f'<sheet name="{escape(title)}" sheetId="{number}" r:id="rId{number}"/>'
+              for title, number in self._sheets
+          )
+          # Without cached values have the application calculate every formula on open
+          + '</sheets>'
+          + (f'<definedNames>{self._defined_names()}</definedNames>' if self.defined_names else '')
+          + '<calcPr calcId="124519"' + ('' if self.calculate else ' fullCalcOnLoad="1"') + '/></workbook>'
+      ))
+      count = len(sheets)
+      package.writestr(self._entry("xl/_rels/workbook.xml.rels"), (
+          f'{XML}<Relationships xmlns="{PACKAGE}">'
+          + "".join(f'<Relationship Id="rId{number}" Type="{RELATIONSHIPS}/worksheet" Target="worksheets/sheet{number}.xml"/>' for number in sheets)
+          + f'<Relationship Id="rId{count + 1}" Type="{RELATIONSHIPS}/styles" Target="styles.xml"/>'
+          + f'<Relationship Id="rId{count + 2}" Type="{RELATIONSHIPS}/sharedStrings" Target="sharedStrings.xml"/>'
+          + '</Relationships>'
+      ))
+      package.writestr(self._entry("xl/styles.xml"), NativeWorkbook.stylesheet()[0])
+
+      with package.open(self._entry("xl/sharedStrings.xml"), 'w') as part:
+          part.write(f'{XML}<sst xmlns="{MAIN}" count="{len(self.strings)}" uniqueCount="{len(self.strings)}">'.encode())
+          for text in self.strings:
+              space = ' xml:space="preserve"' if text != text.strip() else ''
+              part.write(f'<si><t{space}>{escape(text)}</t></si>'.encode())
+          part.write(b'</sst>')
@@ -0,0 +1,114 @@
+import json
+import time
+from contextlib import contextmanager
+
+
+class Profile:
+  # Timings and counters of a single build, collected by Workout when enabled.
+  # Phases and weeks accumulate, the stream and template engines enter the same phase once per week.
+  # A disabled profile costs one flag check per phase and week, it never walks the cells.
+
+  COUNTERS = ("cells", "merges", "styles", "formulas")
+
+  def __init__(self, enabled: bool = True):
+      self.enabled = enabled
+      self.phases = {}
+      self.weeks = {}
+      self.counters = dict.fromkeys(Profile.COUNTERS, 0)
+
+
+  @contextmanager
+  def phase(self, name: str) -> object:
+      # Time a phase of the build e.g. with profile.phase('slots'): ...
+      if not self.enabled:
+          yield
+          return
+      start = time.perf_counter()
+      try:
+          yield
+      finally:
+          self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+
+  @contextmanager
+  def week(self, title: str) -> object:
+      # Time the work done on one week sheet
+      if not self.enabled:
+          yield
+          return
+      start = time.perf_counter()
+      try:
+          yield
+      finally:
+          self.weeks[title] = self.weeks.get(title, 0.0) + time.perf_counter() - start
+
+
+  def count(self, sheet: object) -> None:
+      # Add the cells, merges, styled cells and formulas of a finished sheet
+      # Works on worksheets and Stream buffers, call it before a buffer is flushed
+      if not self.enabled:
+          return
+      merges = getattr(sheet, 'merged', None)
+      if merges is None:
+          merges = sheet.merged_cells.ranges
+      self.counters["merges"] += len(merges)
+
+      for currentCell in sheet._cells.values():
+          styled = currentCell.has_style
+          if currentCell.value is None and not styled:
+              # Not written to the file
+              continue
+          self.counters["cells"] += 1
+          if styled:
+              self.counters["styles"] += 1
+          if currentCell.data_type == 'f':
+              self.counters["formulas"] += 1
+
+
+  def merge(self, stats: dict) -> None:
+      # Add the stats() of a build done elsewhere e.g. a week built in a worker process
+      if not self.enabled or not stats:
+          return
+      for section in ("phases", "weeks", "counters"):
+          totals = getattr(self, section)
+          for name, value in stats[section].items():
+              totals[name] = totals.get(name, 0) + value
+
+
+  def total(self) -> float:
+      return sum(self.phases.values())
+
+
+  def stats(self) -> dict:
+      return {
+          "total": self.total(),
+          "phases": dict(self.phases),
+          "weeks": dict(self.weeks),
+          "counters": dict(self.counters),
+      }
+
+
+  def report(self) -> str:
+      # Human readable breakdown, slowest phases first
+      total = self.total() or 1.0
+      lines = ["Phase                  Seconds      %"]
+      for name, seconds in sorted(self.phases.items(), key=lambda item: item[1], reverse=True):
+          lines.append(f"{name:<20} {seconds:>9.3f} {seconds / total * 100:>6.1f}")
+      lines.append(f"{'total':<20} {self.total():>9.3f}")
+
+      if self.weeks:
+          times = list(self.weeks.values())
+          slowest = max(self.weeks, key=self.weeks.get)
+          lines.append(
+              f"Weeks: {len(times)}, mean {sum(times) / len(times):.3f}s, "
+              f"slowest {slowest} {self.weeks[slowest]:.3f}s"
+          )
+
+      lines.append(", ".join(f"{self.counters[name]} {name}" for name in Profile.COUNTERS))
+      return "\n".join(lines)
+
+
+  def dump(self, filename: str) -> str:
+      with open(filename, "w") as f:
+          json.dump(self.stats(), f, indent=2)
+      return filename
@@ -0,0 +1,361 @@
+import asyncio
+import collections
+import datetime
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+
+
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+MAX_BODY = 64 * 1024   # Bytes of the JSON parameters of a request
+MAX_HEADERS = 16 * 1024
+CHUNK = 256 * 1024     # Bytes written to the client before waiting for it to take them
+WINDOW = 1000          # Latest requests the latency percentiles are taken over
+
+# Parameters of a program and their checks, the rest are options of the build
+SHAPE = {"weeks": 520, "frequency": 7, "slots": 20, "sets": 50}
+CHOICES = {"engine": ('memory', 'stream', 'native'), "dialect": ('sheets', 'excel', 'calc'), "formatting": ('cell', 'range')}
+FLAGS = ("template", "calculate", "names", "lean", "records")
+
+
+class HTTPError(Exception):
+  def __init__(self, status: int, message: str, headers: dict = None):
+      super().__init__(message)
+      self.status = status
+      self.headers = headers or {}
+
+
+class Service:
+  # Builds programs for local clients over HTTP, e.g. a coaching portal, in a pool of worker processes.
+  # POST /programs with the options as JSON returns the xlsx file straight from memory, GET /metrics
+  # the counters and latencies of the requests so far and GET /health a liveness check.
+  # At most workers programs are built at once and queue more wait for a worker, any request
+  # beyond that is turned away with 503 so a busy service answers at once instead of piling up.
+  #
+  # Prescriptions come only from the library files the service was started with, a request names them.
+  #
+  # $ curl -s -d '{"weeks": 12, "engine": "native"}' localhost:8080/programs -o alice.xlsx
+
+  def __init__(self, workers: int = None, queue: int = None, libraries: list = None):
+      self.workers = workers or os.cpu_count() or 1
+      # Library files a request may name, by file name
+      self.libraries = {}
+      for filename in libraries or []:
+          name = os.path.basename(filename)
+          if name in self.libraries:
+              raise ValueError(f"Two libraries named {name}")
+          self.libraries[name] = os.path.abspath(filename)
+      self.queue = self.workers * 4 if queue is None else queue
+      self.slots = asyncio.Semaphore(self.workers + self.queue)
+      self.pool = None
+      self.renewing = asyncio.Lock()
+      self.server = None
+      self.started = time.time()
+      self.active = 0    # Requests being built or waiting for a worker
+      self.connections = set() # Tasks of the open connections, closed with the service
+      self.counters = collections.Counter()
+      # Seconds of the latest requests, (waiting for a worker, building, total)
+      self.latencies = collections.deque(maxlen=WINDOW)
+
+
+  async def start(self, host: str = '127.0.0.1', port: int = 8080) -> tuple:
+      # Listen on host and port, 0 picks a free port, returns the address listened on
+      # The libraries are read and the workers started before the first socket is opened
+      from Library import Library
+      Library.load(list(self.libraries.values()))
+      self.pool = await self.new_pool()
+      self.server = await asyncio.start_server(self.connection, host, port, limit=MAX_HEADERS)
+      return self.server.sockets[0].getsockname()[:2]
+
+
+  async def new_pool(self) -> object:
+      # Pool of worker processes that are already running
+      # Workers are started by a fork server rather than forked from the service, a forked worker
+      # would hold on to the sockets of the service and a client would not see its connection close
+      methods = multiprocessing.get_all_start_methods()
+      context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+      pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=Service.warm)
+      loop = asyncio.get_running_loop()
+      await asyncio.gather(*(loop.run_in_executor(pool, Service.warm) for _ in range(self.workers)))
+      return pool
+
+
+  async def renew(self, pool: object) -> None:
+      # Replace a pool broken by a worker that died, once however many requests it failed
+      async with self.renewing:
+          if self.pool is pool:
+              pool.shutdown(wait=False, cancel_futures=True)
+              self.pool = await self.new_pool()
+
+
+  async def close(self) -> None:
+      if self.server:
+          self.server.close()
+          # Idle connections would otherwise keep waiting for their next request
+          for task in self.connections:
+              task.cancel()
+          await asyncio.gather(*self.connections, return_exceptions=True)
+          await self.server.wait_closed()
+      if self.pool:
+          self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+  async def serve(self, host: str = '127.0.0.1', port: int = 8080) -> None:
+      # Run until cancelled e.g. with Ctrl-C
+      host, port = await self.start(host, port)
+      print(f"Serving programs on http://{host}:{port} with {self.workers} workers and a queue of {self.queue}")
+      try:
+          await self.server.serve_forever()
+      finally:
+          await self.close()
+
+
+  async def connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+      # Requests of one connection in turn, kept open unless the client asks to close it
+      task = asyncio.current_task()
+      self.connections.add(task)
+      try:
+          while True:
+              try:
+                  method, path, headers, body = await self.read(reader)
+              except HTTPError as e:
+                  await self.respond(writer, e.status, self.error(e), headers=e.headers, close=True)
+                  return
+              if method is None:
+                  return
+
+              close = headers.get("connection", "").lower() == "close"
+              try:
+                  status, content, extra = await self.route(method, path, body)
+              except HTTPError as e:
+                  status, content, extra = e.status, self.error(e), e.headers
+              await self.respond(writer, status, content, headers=extra, close=close)
+              if close:
+                  return
+      except (ConnectionError, asyncio.IncompleteReadError):
+          pass
+      except asyncio.CancelledError:
+          # The service is closing, the connection ends here
+          pass
+      finally:
+          self.connections.discard(task)
+          writer.close()
+
+
+  async def read(self, reader: asyncio.StreamReader) -> tuple:
+      # Method, path, headers by lower case name and body of the next request, None at the end of the connection
+      try:
+          head = await reader.readuntil(b"\r\n\r\n")
+      except asyncio.IncompleteReadError as e:
+          if e.partial.strip():
+              raise HTTPError(HTTPStatus.BAD_REQUEST, "Incomplete request")
+          return None, None, {}, b''
+      except asyncio.LimitOverrunError:
+          raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Headers too large")
+
+      lines = head.decode('latin-1').split("\r\n")
+      try:
+          method, path, _ = lines[0].split(" ", 2)
+      except ValueError:
+          raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+      headers = {}
+      for line in lines[1:]:
+          if ":" in line:
+              name, value = line.split(":", 1)
+              headers[name.strip().lower()] = value.strip()
+
+      length = headers.get("content-length", "0")
+      if not length.isdigit():
+          raise HTTPError(HTTPStatus.BAD_REQUEST, "Bad Content-Length")
+      if int(length) > MAX_BODY:
+          raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Body over {MAX_BODY} bytes")
+      body = await reader.readexactly(int(length)) if int(length) else b''
+      return method, path.split("?", 1)[0], headers, body
+
+
+  async def route(self, method: str, path: str, body: bytes) -> tuple:
+      # Status, content and headers of a response
+      if path == "/programs":
+          if method != "POST":
+              raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST", {"Allow": "POST"})
+          return await self.program(body)
+      if path in ("/metrics", "/health"):
+          if method != "GET":
+              raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET", {"Allow": "GET"})
+          content = self.metrics() if path == "/metrics" else {"status": "ok"}
+          return HTTPStatus.OK, content, {}
+      raise HTTPError(HTTPStatus.NOT_FOUND, f"No such path {path}")
+
+
+  async def program(self, body: bytes) -> tuple:
+      # Build a program in the pool, or turn the request away when the queue is full
+      start = time.perf_counter()
+      self.counters["requests"] += 1
+      parameters = self.parameters(body)
+
+      if self.slots.locked():
+          self.counters["rejected"] += 1
+          raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many programs queued, retry later", {"Retry-After": "1"})
+
+      async with self.slots:
+          self.active += 1
+          queued = time.perf_counter()
+          pool = self.pool
+          # The pool has as many processes as workers, the rest wait in its queue
+          try:
+              data, seconds = await asyncio.get_running_loop().run_in_executor(pool, Service.build, parameters)
+          except BrokenProcessPool:
+              self.counters["failed"] += 1
+              await self.renew(pool)
+              raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "A worker stopped, retry later", {"Retry-After": "1"})
+          except ValueError as e:
+              self.counters["failed"] += 1
+              raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+          except Exception as e:
+              self.counters["failed"] += 1
+              raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(e).__name__}: {e}")
+          finally:
+              self.active -= 1
+
+      total = time.perf_counter() - start
+      wait = max(0.0, time.perf_counter() - queued - seconds)
+      self.latencies.append((wait, seconds, total))
+      self.counters["built"] += 1
+      self.counters["bytes"] += len(data)
+      return HTTPStatus.OK, data, {
+          "Content-Type": XLSX,
+          "Content-Disposition": 'attachment; filename="workout.xlsx"',
+          "Server-Timing": f"queue;dur={wait * 1000:.1f}, build;dur={seconds * 1000:.1f}, total;dur={total * 1000:.1f}",
+      }
+
+
+  def parameters(self, body: bytes) -> dict:
+      # Options of a program from the JSON of a request, with the defaults of the command line
+      try:
+          given = json.loads(body or b'{}')
+      except ValueError as e:
+          raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid JSON: {e}")
+      if not isinstance(given, dict):
+          raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected a JSON object of options")
+      unknown = sorted(set(given) - set(SHAPE) - set(CHOICES) - set(FLAGS) - {"date", "library"})
+      if unknown:
+          raise HTTPError(HTTPStatus.BAD_REQUEST, f"Unknown options: {', '.join(unknown)}")
+
+      parameters = {"engine": 'native', "dialect": 'sheets', "formatting": 'cell'}
+      for name, limit in SHAPE.items():
+          value = given.get(name)
+          if value is not None and (not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= limit):
+              raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} should be a number from 1 to {limit}")
+          parameters[name] = value
+      for name, choices in CHOICES.items():
+          value = given.get(name, parameters[name])
+          if value not in choices:
+              raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} should be one of {', '.join(choices)}")
+          parameters[name] = value
+      for name in FLAGS:
+          parameters[name] = bool(given.get(name, False))
+
+      try:
+          parameters["date"] = datetime.date.fromisoformat(given["date"]) if given.get("date") else None
+      except (TypeError, ValueError):
+          raise HTTPError(HTTPStatus.BAD_REQUEST, "date should be YYYY-MM-DD")
+      library = given.get("library") or []
+      if isinstance(library, str):
+          library = [library]
+      if not isinstance(library, list) or not all(isinstance(name, str) for name in library):
+          raise HTTPError(HTTPStatus.BAD_REQUEST, "library should list names of libraries of the service")
+      unknown = [name for name in library if name not in self.libraries]
+      if unknown:
+          raise HTTPError(HTTPStatus.BAD_REQUEST, f"Unknown libraries: {', '.join(unknown)}")
+      parameters["library"] = [self.libraries[name] for name in library]
+      return parameters
+
+
+  def metrics(self) -> dict:
+      # Counters of the service and percentiles of the latest latencies in milliseconds
+      latencies = {}
+      for index, name in enumerate(("queue", "build", "total")):
+          values = sorted(latency[index] for latency in self.latencies)
+          if values:
+              latencies[name] = {
+                  f"p{percent}": round(values[min(len(values) - 1, int(len(values) * percent / 100))] * 1000, 1)
+                  for percent in (50, 90, 99)
+              }
+              latencies[name]["max"] = round(values[-1] * 1000, 1)
+              latencies[name]["mean"] = round(sum(values) / len(values) * 1000, 1)
+
+      return {
+          "uptime": round(time.time() - self.started, 1),
+          "workers": self.workers,
+          "queue": self.queue,
+          "building": min(self.active, self.workers),
+          "waiting": max(0, self.active - self.workers),
+          "requests": self.counters["requests"],
+          "built": self.counters["built"],
+          "failed": self.counters["failed"],
+          "rejected": self.counters["rejected"],
+          "bytes": self.counters["bytes"],
+          "latency_ms": latencies,
+      }
+
+
+  @staticmethod
+  def error(e: HTTPError) -> dict:
+      return {"error": str(e), "status": int(e.status)}
+
+
+  async def respond(self, writer: asyncio.StreamWriter, status: int, content: object, headers: dict = None, close: bool = False) -> None:
+      # Send a response, dicts as JSON, the body in chunks so a slow client holds back only its own request
+      if isinstance(content, dict):
+          content = json.dumps(content).encode()
+          headers = {"Content-Type": "application/json", **(headers or {})}
+      status = HTTPStatus(status)
+      lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Length: {len(content)}"]
+      lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+      if close:
+          lines.append("Connection: close")
+      writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+
+      view = memoryview(content)
+      for offset in range(0, len(view), CHUNK):
+          writer.write(view[offset:offset + CHUNK])
+          await writer.drain()
+      await writer.drain()
+
+
+  @staticmethod
+  def build(parameters: dict) -> tuple:
+      # Runs in a worker process, returns the xlsx bytes of a program and the seconds it took
+      # Imports are paid once per worker, the progress of the build is kept off the service's output
+      from Library import Library
+      from Utils import Utils
+      from Workout import Workout
+
+      start = time.perf_counter()
+      try:
+          library = Library.load(parameters["library"])
+      except (OSError, ValueError, ImportError):
+          # A library changed since the service started, what is wrong with it stays in the service's files
+          raise RuntimeError("A library of the service can no longer be read")
+      Program = Workout(
+          engine=parameters["engine"], dialect=parameters["dialect"], formatting=parameters["formatting"],
+          calculate=parameters["calculate"], names=parameters["names"], date=parameters["date"],
+          library=library, lean=parameters["lean"], records=parameters["records"], log=None
+      )
+      Program.generate(
+          weeks=parameters["weeks"], frequency=parameters["frequency"], slots=parameters["slots"],
+          sets=parameters["sets"], template=parameters["template"]
+      )
+      data = Utils.to_bytes(Program.wb)
+      return data, time.perf_counter() - start
+
+
+  @staticmethod
+  def warm() -> None:
+      # Initializer of the workers, the first request of each doesn't wait for the imports
+      import Workout  # noqa: F401
+      import openpyxl  # noqa: F401
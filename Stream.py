@@ -0,0 +1,106 @@
+from copy import copy
+from openpyxl.cell import Cell
+from openpyxl.formatting.formatting import ConditionalFormattingList
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.worksheet.dimensions import DimensionHolder, ColumnDimension, RowDimension
+
+
+class Stream:
+  # Buffer for a single week sheet used by the stream engine.
+  # It offers the parts of the openpyxl Worksheet API used by Workout, Style
+  # and Utils so the same generators can write into it, then hands the rows
+  # to a write-only worksheet and drops them so only one week is held in memory.
+
+  def __init__(self, workbook: object, title: str):
+      self.parent = workbook
+      self.title = title
+      self.column_dimensions = DimensionHolder(worksheet=self, default_factory=self._add_column)
+      self.row_dimensions = DimensionHolder(worksheet=self, default_factory=self._add_row)
+      self.merged = []
+      self.conditional_formatting = ConditionalFormattingList()
+      self._cells = {}
+      self._max_row = 1
+      self._max_col = 1
+
+
+  def _add_column(self) -> object:
+      return ColumnDimension(self)
+
+
+  def _add_row(self) -> object:
+      return RowDimension(self)
+
+
+  @property
+  def max_row(self) -> int:
+      return self._max_row
+
+
+  @property
+  def max_column(self) -> int:
+      return self._max_col
+
+
+  def _track(self, row: int, col: int) -> None:
+      if row > self._max_row:
+          self._max_row = row
+      if col > self._max_col:
+          self._max_col = col
+
+
+  def cell(self, row: int, column: int, value: object = None) -> object:
+      currentCell = self._cells.get((row, column))
+      if currentCell is None:
+          currentCell = Cell(self, row=row, column=column)
+          self._cells[(row, column)] = currentCell
+          self._track(row, column)
+      if value is not None:
+          currentCell.value = value
+      return currentCell
+
+
+  def merge_cells(self, start_row: int, start_column: int, end_row: int, end_column: int) -> None:
+      # Mirror openpyxl: everything but the top-left cell becomes an empty merged cell
+      self.merged.append((start_row, start_column, end_row, end_column))
+      for row in range(start_row, end_row + 1):
+          for col in range(start_column, end_column + 1):
+              if (row, col) == (start_row, start_column):
+                  continue
+              self._cells[(row, col)] = Cell(self, row=row, column=col)
+      self._track(end_row, end_column)
+
+
+  def flush(self, release: bool = True) -> object:
+      # Write the buffered week to the write-only workbook row by row
+      # Keep the cells with release=False to write the buffer again as another sheet
+      sheet = self.parent.create_sheet(title=self.title)
+
+      # Dimensions and merges must be known before the first row is appended
+      for letter, dimension in self.column_dimensions.items():
+          sheet.column_dimensions[letter].width = dimension.width
+          if dimension.has_style:
+              sheet.column_dimensions[letter]._style = copy(dimension._style)
+      for row, dimension in self.row_dimensions.items():
+          sheet.row_dimensions[row].height = dimension.height
+      for start_row, start_column, end_row, end_column in self.merged:
+          sheet.merged_cells.add(
+              CellRange(min_row=start_row, min_col=start_column, max_row=end_row, max_col=end_column)
+          )
+
+      sheet.conditional_formatting = self.conditional_formatting
+
+      cells = self._cells
+      for row in range(1, self._max_row + 1):
+          values = [cells.get((row, col)) for col in range(1, self._max_col + 1)]
+          for currentCell in values:
+              if currentCell is not None:
+                  # Hyperlinks are collected on the worksheet that writes the cell
+                  currentCell.parent = sheet
+          sheet.append(values)
+
+      if release:
+          # Release the week, the rows now live in the worksheet's temporary file
+          self._cells = {}
+          self.merged = []
+          self.conditional_formatting = ConditionalFormattingList()
+      return sheet
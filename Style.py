@@ -1,7 +1,4 @@
-from openpyxl.styles import colors
-from openpyxl.styles import Alignment, Border, Color, Font, PatternFill, Protection, Side
-from openpyxl.utils import get_column_letter, column_index_from_string
-import Workout
+from Layout import column_letter
 import datetime
 
 
@@ -14,10 +11,100 @@ class Style:
     DARKGREY='00505050'
     DARKRED='00600000'
     
-    ALIGNMENT = Alignment(
+    # Keyword arguments of openpyxl's Alignment, kept plain so importing Style doesn't load openpyxl
+    ALIGNMENT = dict(
         wrap_text=True, horizontal="center", vertical="center"
     )
 
+    # Every look used in a sheet, registered once per workbook as a named style
+    # Name: (font color, background color, font size, bold)
+    STYLES = {
+        'Train Banner':   (WHITE, DARKRED,    28, True),
+        'Train Date':     (WHITE, LIGHTBLACK, 12, False),
+        'Train Day':      (WHITE, LIGHTBLACK, 42, True),
+        'Train Slot':     (WHITE, DARKGREY,   32, False),
+        'Train Exercise': (WHITE, DARKRED,    18, False),
+        'Train Heading':  (WHITE, DARKRED,    12, True),
+        'Train Formula':  (WHITE, DARKRED,    12, False),
+        'Train Label':    (WHITE, DARKGREY,   12, False),
+    }
+    # Centered cell with the workbook's default font and no fill, used for inputs
+    INPUT = 'Train Input'
+    # Fill of the empty cells around and between our blocks
+    BACKGROUND = 'Train Background'
+
+  @staticmethod
+  def register(workbook: object) -> list:
+              # Add our named styles to the workbook, cells then refer to them by name
+              # e.g. currentCell.style = 'Train Day'
+              from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+              from openpyxl.styles.fonts import DEFAULT_FONT
+              names = workbook.named_styles
+              alignment = Alignment(**Style.Settings.ALIGNMENT)
+
+              for name, (fgColor, bgColor, size, bold) in Style.Settings.STYLES.items():
+                  if name in names:
+                      continue
+                  workbook.add_named_style(NamedStyle(
+                      name=name,
+                      font=Font(name='Helvetica', size=size, bold=bold, color=fgColor),
+                      fill=PatternFill(fill_type='solid', fgColor=bgColor),
+                      alignment=alignment
+                  ))
+
+              if Style.Settings.INPUT not in names:
+                  workbook.add_named_style(NamedStyle(
+                      name=Style.Settings.INPUT, font=DEFAULT_FONT, alignment=alignment
+                  ))
+
+              if Style.Settings.BACKGROUND not in names:
+                  workbook.add_named_style(NamedStyle(
+                      name=Style.Settings.BACKGROUND, font=DEFAULT_FONT,
+                      fill=PatternFill(fill_type='solid', fgColor=Style.Settings.LIGHTBLACK)
+                  ))
+
+              return workbook.named_styles
+
+
+  @staticmethod
+  def set_widths(currentSheet: object, widths: tuple) -> None:
+              # Set every column width of a sheet in one pass e.g. (('A', 10), ('B', 20), ..)
+              for letter, width in widths:
+                  currentSheet.column_dimensions[letter].width = width
+
+  @staticmethod
+  def set_column_style(currentSheet: object, letter: str, name: str) -> None:
+              # Default style of a whole column, shown by every cell of it that is left out
+              # e.g. the input columns of a day get 'Train Input' so blank inputs need no cell
+              dimension = currentSheet.column_dimensions[letter]
+              if not hasattr(dimension, 'alignment'):
+                  # Native sheets refer to the style by name
+                  dimension.style = name
+                  return
+              named = currentSheet.parent._named_styles[name]
+              dimension.font = named.font
+              dimension.fill = named.fill
+              dimension.alignment = named.alignment
+
+  @staticmethod
+  def set_background(currentSheet: object, ranges: tuple) -> None:
+              # Fill ranges of (min_row, min_col, max_row, max_col) with the background color
+              # through a single conditional formatting rule instead of a style on each cell
+              sqref = " ".join(
+                  f"{column_letter(min_col)}{min_row}:{column_letter(max_col)}{max_row}"
+                  for min_row, min_col, max_row, max_col in ranges
+              )
+              if isinstance(currentSheet.conditional_formatting, list):
+                  # Native sheets refer to the style by name
+                  currentSheet.conditional_formatting.append((sqref, Style.Settings.BACKGROUND))
+                  return
+              from openpyxl.formatting.rule import FormulaRule
+              from openpyxl.styles import PatternFill
+              color = Style.Settings.LIGHTBLACK
+              currentSheet.conditional_formatting.add(
+                  sqref, FormulaRule(formula=['TRUE'], fill=PatternFill(fill_type='solid', fgColor=color, bgColor=color))
+              )
+
   @staticmethod
   def generate_header(row: int, col: int, length: int, currentSheet: object, heading: str = 'Header', value: str = 'Item') -> object:
               # Add horizontal header
@@ -35,27 +122,7 @@ class Style:
 
 
   @staticmethod
-  def generate_block(row: int, col: int, currentSheet: object, value: str = 'Item') -> object:
-              # Add a single cell header
-              # [ Block ]
-
-              currentCell = currentSheet.cell(
-                  row=row, column=col, value=f"{value}"
-              )
-
-              Style.set_style(
-                  currentSheet, currentCell, col,
-                  fgColor=colors.WHITE, bgColor=Style.Settings.DARKRED,
-                  size=18, width=20, font='Helvetica', bold=True
-              )
-
-              currentCell.alignment = Style.Settings.ALIGNMENT
-
-              return currentCell
-
-
-  @staticmethod
-  def generate_sheet_banner(currentSheet: object, value: str = 'Item') -> None:
+  def generate_sheet_banner(currentSheet: object, value: str = 'Item', date: object = None) -> None:
               # Get last column of spreadsheet for full banner
               max_col = currentSheet.max_column
 
@@ -68,15 +135,10 @@ class Style:
               currentCell = currentSheet.cell(
                   row=1, column=1, value=f"{value}"
               )
-              Style.set_style(
-                  currentSheet, currentCell, 1,
-                  fgColor=colors.WHITE, bgColor=Style.Settings.DARKRED,
-                  size=28, width=10, font='Helvetica', bold=True
-              )
-              currentCell.alignment = Style.Settings.ALIGNMENT
+              currentCell.style = 'Train Banner'
 
-              # Print date banner on second row
-              date = datetime.datetime.now().strftime("%m/%d/%Y")
+              # Print date banner on second row, today unless given
+              date = (date or datetime.date.today()).strftime("%m/%d/%Y")
               currentSheet.merge_cells(
                   start_row=2, end_row=2,
                   # Calculate total columns in sheet
@@ -86,13 +148,7 @@ class Style:
                   row=2, column=1, value=f"Generated by Time to Train on {date}"
               )
               currentCell.hyperlink = "https://github.com/jonschipp/timetotrain"
-              currentCell.style = "Hyperlink"
-              Style.set_style(
-                  currentSheet, currentCell, 1,
-                  fgColor=colors.WHITE, bgColor=Style.Settings.LIGHTBLACK,
-                  size=12, width=10, font='Helvetica', bold=False
-              )
-              currentCell.alignment = Style.Settings.ALIGNMENT
+              currentCell.style = 'Train Date'
 
 
   @staticmethod
@@ -101,12 +157,12 @@ class Style:
               # [         ][         ]
               # [ Program ][ <input> ]
               # [         ][         ]
-              color = Style.Settings.DARKGREY
-              bold = False
+              label = 'Train Label'
+              value = Style.Settings.INPUT
 
               if style == 'formula':
-                  color = Style.Settings.DARKRED
-                  bold = True
+                  label = 'Train Heading'
+                  value = 'Train Formula'
 
               currentCell = currentSheet.cell(
                   row=row, column=col, value=f"{heading}"
@@ -116,40 +172,12 @@ class Style:
                   start_row=row, end_row=row, start_column=col+1, end_column=col+length
               )
 
-              Style.set_style(
-                  currentSheet, currentCell, col,
-                  fgColor=colors.WHITE, bgColor=color,
-                  size=12, width=20, font='Helvetica', bold=bold
-              )
+              currentCell.style = label
 
               currentCell = currentSheet.cell(
                   row=row, column=col+1
               )
 
-              if style == 'formula':
-                  Style.set_style(
-                      currentSheet, currentCell, col,
-                      fgColor=colors.WHITE, bgColor=color,
-                      size=12, width=20, font='Helvetica', bold=False
-                  )
-
-              currentCell.alignment = Style.Settings.ALIGNMENT
+              currentCell.style = value
 
               return currentCell
-
-
-  @staticmethod
-  def set_style(sheet: object, cell: object, col: int, fgColor: str, bgColor: str, size: int, width: int, font: str, bold: bool = False) -> object:
-        # Set style
-        font = Font(
-            name=font, size=size, bold=bold, color=fgColor
-        )
-        fill = PatternFill(
-            fill_type='solid', fgColor=bgColor,
-        )
-
-        sheet.column_dimensions[get_column_letter(col)].width = width
-        cell.font = font
-        cell.fill = fill
-        cell.alignment = Style.Settings.ALIGNMENT
-        return cell
@@ -1,5 +1,6 @@
+import io
+import os
 from Style import Style
-from openpyxl.styles import PatternFill
 
 
 class Utils:
@@ -8,28 +9,78 @@ class Utils:
   @staticmethod
   def set_formula(currentCell: object, formula: str) -> None:
         currentCell.value = formula
-        currentCell.alignment = Style.Settings.ALIGNMENT
+        if not currentCell.has_style:
+            currentCell.style = Style.Settings.INPUT
 
 
   @staticmethod
-  def clear(workbook: object) -> None:
-     # Make remaining of our cells white and borderless
-     color = PatternFill(fill_type='solid', fgColor=Style.Settings.LIGHTBLACK)
+  def set_array_formula(currentCell: object, ref: str, formula: str) -> None:
+        # One formula over the block ref kept in its top-left cell e.g. ref H12:H21
+        # openpyxl cells take openpyxl's ArrayFormula, the native engine its own
+        if hasattr(currentCell, 'coordinate'):
+            from openpyxl.worksheet.formula import ArrayFormula
+        else:
+            from Native import ArrayFormula
+        Utils.set_formula(currentCell=currentCell, formula=ArrayFormula(ref, formula))
+
+
+  @staticmethod
+  def clear(workbook: object, plan: object, formatting: str = 'cell') -> None:
      for sheet in workbook.worksheets:
-         for row in sheet:
-             for currentCell in row:
-                 if currentCell.alignment.horizontal == 'center':
-                     # Skip the cells we created
-                     continue
-                 currentCell.fill = color
+         Utils.clear_sheet(sheet=sheet, plan=plan, formatting=formatting)
+
+
+  @staticmethod
+  def clear_sheet(sheet: object, plan: object, formatting: str = 'cell') -> None:
+     # Fill the gaps between our blocks with the background color
+     # Only the gaps known from the layout plan are visited, cells hidden by a merge
+     # already show the fill of their top-left cell and are left alone
+     if formatting == 'range':
+         # One rule over all gaps, no cell of them is written
+         Style.set_background(currentSheet=sheet, ranges=plan.gaps)
+         return
+
+     for min_row, min_col, max_row, max_col in plan.gaps:
+         for row in range(min_row, max_row + 1):
+             for col in range(min_col, max_col + 1):
+                 sheet.cell(row=row, column=col).style = Style.Settings.BACKGROUND
+
+
+  @staticmethod
+  def define_names(workbook: object, names: list) -> None:
+      # Add defined names of (name, reference) e.g. ('W1_D1_S1_Load', "'Week 1'!$C$12:$C$21")
+      define = getattr(workbook, 'define', None)
+      if define is None:
+          from openpyxl.workbook.defined_name import DefinedName
+          def define(name, reference):
+              workbook.defined_names[name] = DefinedName(name, attr_text=reference)
+      for name, reference in names:
+          define(name, reference)
+
+
+  @staticmethod
+  def cache_dir() -> str:
+      # e.g. ~/.cache/timetotrain, TIMETOTRAIN_CACHE overrides it
+      return os.environ.get('TIMETOTRAIN_CACHE') or os.path.join(
+          os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'timetotrain'
+      )
 
 
   @staticmethod
-  def save(workbook: object, filename: str) -> str:
+  def save(workbook: object, filename: str, log: object = print) -> str:
       if not filename:
           # Set default
           filename = 'workout.xlsx'
 
       workbook.save(filename)
-      print(f"Writing program to {filename}")
+      if log:
+          log(f"Writing program to {filename}")
       return filename
+
+
+  @staticmethod
+  def to_bytes(workbook: object) -> bytes:
+      # The xlsx file of a workbook from a buffer in memory, openpyxl and the native writer both take file objects
+      buffer = io.BytesIO()
+      workbook.save(buffer)
+      return buffer.getvalue()
@@ -1,10 +1,6 @@
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter, column_index_from_string
-from openpyxl.formula.translate import Translator
 import Style
-import Workout
 
 
 class Welcome:
-
-
+  # Placeholder for the welcome sheet, nothing is generated yet
+  pass
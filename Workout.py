@@ -1,38 +1,114 @@
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter, column_index_from_string
+import datetime
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from Layout import Layout, column_letter, COLUMN_LENGTH, BEGIN_FREQ_ROW
+from Library import Library
+from Layout import VOLUME_HEADERS, VOLUME_LENGTH, SETS, LOAD, REPS, RPE, AVG_VEL, INT, LWL
+from Formula import Formula
+from Native import NativeSheet, NativeWorkbook
+from Profile import Profile
 from Style import Style
 from Utils import Utils
 
 
-# TODO: Calculate these numbers in dynamically
-COLUMN_LENGTH = 7 # The length of each day/slot, determines overall alignment
-BEGIN_COLUMN = 2 #  We start in the 2nd column i.e. B for each day/slot
-BEGIN_FREQ_ROW = 4 # We start at row 4 for each day/slot
-BEGIN_SLOT_ROW = 6 # The first row in a week where the exercise slot begins e.g. [ Exercise 1 ]
-NEXT_COLUMN = COLUMN_LENGTH + 2 # Where the next column begins for each day/slot
-# TODO: Make these user defineable
-# These are updated for each day via update_volume_headers() and reset back to this after each week via reset_volume_headers()
-VOLUME_HEADERS = {
-    "Sets":    { "ColumnNumber": BEGIN_COLUMN,     "ColumnLetter": get_column_letter(BEGIN_COLUMN)    },
-    "Load":    { "ColumnNumber": BEGIN_COLUMN + 1, "ColumnLetter": get_column_letter(BEGIN_COLUMN + 1)},
-    "Reps":    { "ColumnNumber": BEGIN_COLUMN + 2, "ColumnLetter": get_column_letter(BEGIN_COLUMN + 2)},
-    "RIR":     { "ColumnNumber": BEGIN_COLUMN + 3, "ColumnLetter": get_column_letter(BEGIN_COLUMN + 3)},
-    "RPE":     { "ColumnNumber": BEGIN_COLUMN + 4, "ColumnLetter": get_column_letter(BEGIN_COLUMN + 4)},
-    "Avg Vel": { "ColumnNumber": BEGIN_COLUMN + 5, "ColumnLetter": get_column_letter(BEGIN_COLUMN + 5)},
-    "Int %":   { "ColumnNumber": BEGIN_COLUMN + 6, "ColumnLetter": get_column_letter(BEGIN_COLUMN + 6)},
-    "LWL":     { "ColumnNumber": BEGIN_COLUMN + 7, "ColumnLetter": get_column_letter(BEGIN_COLUMN + 7)}
-}
-VOLUME_LENGTH = len(VOLUME_HEADERS)
-
+# Digits the averages of Load through LWL are rounded to, Avg Vel is not rounded
+AVERAGE_PRECISION = tuple(None if item == AVG_VEL else 3 if item == INT else 0 for item in range(LOAD, VOLUME_LENGTH))
 
 class Workout:
-
-  def __init__(self, weeks=8, frequency=3, slots=3, sets=10):
-      self.wb = Workbook()
+  # A training program and the workbook it is built into, the API behind the command line.
+  # Everything a build changes belongs to the instance, the module level tables and caches it reads
+  # are never changed, so programs can be built at the same time from a thread pool with one
+  # instance per build. An instance can be built again after a failed build, generate starts
+  # from a new workbook. Pass log=None to keep the progress of a build off the output, e.g.
+  # Program = Workout(engine='native', log=None)
+  # Program.generate(weeks=12, frequency=4, slots=3, sets=5)
+  # data = Utils.to_bytes(Program.wb)
+
+  def __init__(self, weeks=8, frequency=3, slots=3, sets=10, engine='memory', dialect='sheets', profile=None, calculate=False, formatting='cell', names=False, library=None, date=None, lean=False, records=False, log=print):
+      self.engine = engine   # memory builds every sheet in place, stream and native write one week at a time
+      self.dialect = dialect
+      self.formula = Formula.dialect(dialect) # Formulas in the form of the target application
+      self.profile = profile or Profile(enabled=False) # Phase and week timings, counters of the build
+      self.calculate = calculate # Store the results of the formulas with them, native only
+      self.formatting = formatting # cell styles every cell, range leaves blank cells to column styles and rules
+      self.names = names     # Define a name for every block, see define_names
+      self.index = {}        # Address of every defined name
+      self.library = library or Library() # Prescriptions of the Exercise, Program, Target and Notes rows
+      self.date = date or datetime.date.today() # Date on the banner of every week, the same date builds the same file
+      self.lean = lean       # One array formula per block of sets instead of one formula per set
+      self.records = records # Rows of the best Load and E1RM so far under every slot
+      self.log = log         # Called with every progress message, None for none
+      if calculate and engine != 'native':
+          raise ValueError("Calculated values are only written by the native engine")
+      self.wb = self.workbook()
+      self.built = False     # Whether the workbook has been built into, a new build starts from a new one
       self.weeks = weeks     # How many weeks for the progrqm
       self.frequency = frequency # How many days per week
       self.slots = slots     # How many slots per day
       self.sets = sets     # How many sets per slot
+      self.plan = None     # Layout of the generated weeks, set once slots are generated
+
+
+  def workbook(self) -> object:
+      # Empty workbook of the engine
+      if self.engine == 'native':
+          # Writes the xlsx parts itself with a fixed stylesheet
+          return NativeWorkbook(calculate=self.calculate, date=self.date)
+      # openpyxl is only loaded by the engines that build on it
+      from openpyxl import Workbook
+      workbook = Workbook(write_only=(self.engine == 'stream'))
+      workbook.properties.created = datetime.datetime.combine(self.date, datetime.time())
+      Style.register(workbook)
+      return workbook
+
+
+  def progress(self, message: str) -> None:
+      if self.log:
+          self.log(message)
+
+
+  def generate(self, weeks: int, frequency: int, slots: int, sets: int, template: bool = False, jobs: int = None) -> list:
+      # Build the whole program with the chosen engine, ready to be saved
+      # With jobs the weeks are built across that many processes, native engine only
+      if jobs and self.engine != 'native':
+          raise ValueError("Weeks are only built in parallel by the native engine")
+
+      if self.built:
+          # Built before, or a build failed part way
+          self.wb = self.workbook()
+          self.index = {}
+      self.built = True
+
+      if template:
+          sheets = self.generate_template(weeks=weeks, frequency=frequency, slots=slots, sets=sets)
+      elif jobs:
+          sheets = self.generate_parallel(weeks=weeks, frequency=frequency, slots=slots, sets=sets, jobs=jobs)
+      elif self.engine in ('stream', 'native'):
+          sheets = self.generate_stream(weeks=weeks, frequency=frequency, slots=slots, sets=sets)
+      else:
+          sheets = self.generate_memory(weeks=weeks, frequency=frequency, slots=slots, sets=sets)
+
+      self.define_names(sheets)
+      return sheets
+
+
+  def generate_memory(self, weeks: int, frequency: int, slots: int, sets: int) -> list:
+      # Build every week sheet in place in an openpyxl workbook
+      with self.profile.phase('weeks'):
+          self.generate_weeks(weeks=weeks)
+      with self.profile.phase('frequency'):
+          self.generate_frequency(frequency=frequency)
+      with self.profile.phase('slots'):
+          self.generate_slots(slots=slots, sets=sets, frequency=frequency)
+      with self.profile.phase('clear'):
+          Utils.clear(workbook=self.wb, plan=self.plan, formatting=self.formatting)
+
+      for currentSheet in self.wb.worksheets:
+          self.profile.count(currentSheet)
+
+      return self.wb.sheetnames
 
 
   def generate_weeks(self, weeks: int) -> list:
@@ -44,7 +120,7 @@ class Workout:
       for week in range(1, weeks + 1):
          # Create a new sheet for each week
          sheet=f"Week {week}"
-         print(f"Writing sheet {sheet}")
+         self.progress(f"Writing sheet {sheet}")
          currentSheet = self.wb.create_sheet(title=sheet)
 
       # Remove default sheet
@@ -53,6 +129,321 @@ class Workout:
       return self.wb.sheetnames
 
 
+  def buffer(self, title: str) -> object:
+      # Sheet buffer of one week for the engines that write a week at a time
+      if self.engine == 'native':
+          return NativeSheet(self.wb, title=title)
+      from Stream import Stream
+      return Stream(self.wb, title=title)
+
+
+  def generate_stream(self, weeks: int, frequency: int, slots: int, sets: int, first: int = 1) -> list:
+      # Build each week in a buffer and flush it into the write-only or native workbook
+      # first is the number of the first week, later than 1 when extending a program
+      if not weeks:
+          # Set default
+          weeks = self.weeks
+
+      if not frequency:
+          # Set default
+          frequency = self.frequency
+
+      if not slots:
+          # Set default
+          slots = self.slots
+
+      if not sets:
+          # Set default
+          sets = self.sets
+
+      self.plan = Layout.plan(frequency=frequency, slots=slots, sets=sets, records=self.records)
+
+      for week in range(first, first + weeks):
+          sheet=f"Week {week}"
+          self.progress(f"Writing sheet {sheet}")
+          with self.profile.week(sheet):
+              currentSheet = self.buffer(sheet)
+              with self.profile.phase('frequency'):
+                  self.generate_days(currentSheet, frequency=frequency)
+              with self.profile.phase('slots'):
+                  self.generate_sheet_slots(currentSheet, slots=slots, sets=sets, frequency=frequency)
+              with self.profile.phase('clear'):
+                  Utils.clear_sheet(sheet=currentSheet, plan=self.plan, formatting=self.formatting)
+              self.profile.count(currentSheet)
+              with self.profile.phase('flush'):
+                  currentSheet.flush()
+
+      return self.wb.sheetnames
+
+
+  def generate_parallel(self, weeks: int, frequency: int, slots: int, sets: int, jobs: int) -> list:
+      # Build Week 1 here and every later week in a pool of worker processes
+      # Workers render their week to a SheetPart with the shared strings of Week 1, the title is
+      # the only string a later week adds and is written inline. Parts are added in week order.
+      weeks = weeks or self.weeks
+      frequency = frequency or self.frequency
+      slots = slots or self.slots
+      sets = sets or self.sets
+
+      self.generate_stream(weeks=1, frequency=frequency, slots=slots, sets=sets)
+      if weeks < 2:
+          return self.wb.sheetnames
+
+      build = partial(
+          Workout.render_week, frequency=frequency, slots=slots, sets=sets, dialect=self.dialect,
+          formatting=self.formatting, calculate=self.calculate, strings=dict(self.wb.strings), profile=self.profile.enabled,
+          library=self.library, date=self.date, lean=self.lean, records=self.records
+      )
+      with ProcessPoolExecutor(max_workers=jobs) as pool:
+          # Keep every worker busy while the parts are added as they come in
+          for part in pool.map(build, range(2, weeks + 1), chunksize=max(1, (weeks - 1) // (jobs * 4))):
+              self.progress(f"Writing sheet {part.title}")
+              with self.profile.phase('merge'):
+                  self.wb.add_part(part)
+              self.profile.merge(part.profile)
+
+      return self.wb.sheetnames
+
+
+  @staticmethod
+  def render_week(week: int, frequency: int, slots: int, sets: int, dialect: str, formatting: str, calculate: bool, strings: dict, profile: bool, library: object = None, date: object = None, lean: bool = False, records: bool = False) -> object:
+      # Runs in a worker process, builds a week and renders it for the workbook strings come from
+      # The LWL values of a new program are blank, so the week is calculated without the one before
+      Program = Workout(engine='native', dialect=dialect, formatting=formatting, profile=Profile(enabled=profile), library=library, date=date, lean=lean, records=records, log=None)
+      workbook = NativeWorkbook(calculate=calculate, strings=strings)
+      plan = Layout.plan(frequency=frequency, slots=slots, sets=sets, records=records)
+      sheet = f"Week {week}"
+
+      with Program.profile.week(sheet):
+          currentSheet = NativeSheet(workbook, title=sheet)
+          with Program.profile.phase('frequency'):
+              Program.generate_days(currentSheet, frequency=frequency)
+          with Program.profile.phase('slots'):
+              Program.generate_sheet_slots(currentSheet, slots=slots, sets=sets, frequency=frequency)
+          with Program.profile.phase('clear'):
+              Utils.clear_sheet(sheet=currentSheet, plan=plan, formatting=formatting)
+          Program.profile.count(currentSheet)
+          with Program.profile.phase('render'):
+              part = workbook.render_part(currentSheet)
+
+      return part._replace(profile=Program.profile.stats() if profile else None)
+
+
+  def generate_template(self, weeks: int, frequency: int, slots: int, sets: int) -> list:
+      # Build Week 1 once and stamp out the remaining weeks from it
+      # Only the banner and the LWL references to the previous week differ between weeks
+      if not weeks:
+          # Set default
+          weeks = self.weeks
+
+      if not frequency:
+          # Set default
+          frequency = self.frequency
+
+      if not slots:
+          # Set default
+          slots = self.slots
+
+      if not sets:
+          # Set default
+          sets = self.sets
+
+      self.plan = Layout.plan(frequency=frequency, slots=slots, sets=sets, records=self.records)
+      stream = self.engine in ('stream', 'native')
+      template = None
+
+      for week in range(1, weeks + 1):
+          sheet=f"Week {week}"
+          self.progress(f"Writing sheet {sheet}")
+
+          with self.profile.week(sheet):
+              if template is None:
+                  if stream:
+                      currentSheet = self.buffer(sheet)
+                  else:
+                      currentSheet = self.wb.create_sheet(title=sheet)
+                  with self.profile.phase('frequency'):
+                      self.generate_days(currentSheet, frequency=frequency)
+                  with self.profile.phase('slots'):
+                      self.generate_sheet_slots(currentSheet, slots=slots, sets=sets, frequency=frequency)
+                  with self.profile.phase('clear'):
+                      Utils.clear_sheet(sheet=currentSheet, plan=self.plan, formatting=self.formatting)
+                  template = currentSheet
+              else:
+                  if stream:
+                      # The buffer was already written out, reuse it for the next week
+                      currentSheet = template
+                      currentSheet.title = sheet
+                  else:
+                      with self.profile.phase('copy'):
+                          currentSheet = self.wb.copy_worksheet(template)
+                      currentSheet.title = sheet
+                      if self.formatting == 'range':
+                          # Conditional formatting is not copied with the sheet
+                          Utils.clear_sheet(sheet=currentSheet, plan=self.plan, formatting=self.formatting)
+                  with self.profile.phase('stamp'):
+                      self.stamp_week(currentSheet, plan=self.plan)
+
+              if stream:
+                  self.profile.count(currentSheet)
+                  with self.profile.phase('flush'):
+                      currentSheet.flush(release=False)
+
+      if not stream:
+          # Remove default sheet
+          del self.wb['Sheet']
+          for currentSheet in self.wb.worksheets:
+              self.profile.count(currentSheet)
+
+      return self.wb.sheetnames
+
+
+  def extend(self, filename: str, weeks: int, frequency: int = None, slots: int = None, sets: int = None) -> list:
+      # Add weeks to a program written before, e.g. Week 9 to 12 after Week 8
+      # The sheets of the file are copied over as they are with the data logged in them, only the
+      # new weeks are built, so the cost follows the new weeks. The LWL formulas of the first
+      # new week read from the last week of the file. Its shape is read from that week unless given.
+      self.engine = 'native'
+      self.wb = NativeWorkbook(base=filename, calculate=self.calculate, date=self.date)
+      self.index = {}
+      self.built = True
+
+      numbers = [int(title.split(' ')[1]) for title in self.wb.sheetnames if re.fullmatch(r"Week \d+", title)]
+      if not numbers:
+          raise ValueError(f"No Week sheets to extend in {filename}")
+      last_week = max(numbers)
+
+      shape = Layout.infer(self.wb.merges(f"Week {last_week}"))
+      frequency = frequency or shape[0]
+      slots = slots or shape[1]
+      sets = sets or shape[2]
+      # The best so far of the new weeks reads that of the week before, so only a file with records gets them
+      self.records = shape[3]
+
+      # Every sheet of the file, not only its weeks, comes before the new ones
+      base = len(self.wb.sheetnames)
+      sheets = self.generate_stream(weeks=weeks, frequency=frequency, slots=slots, sets=sets, first=last_week + 1)
+      self.define_names(sheets[base:])
+      return sheets
+
+
+  def define_names(self, titles: list) -> dict:
+      # Name every block of the given week sheets when names are on e.g. W3_D2_S1_Load for
+      # 'Week 3'!$C$12:$C$21, and keep them in the index of the program
+      if not self.names:
+          return self.index
+
+      names = []
+      for title in titles:
+          match = re.fullmatch(r"Week (\d+)", title)
+          if not match:
+              continue
+          for suffix, (min_row, min_col, max_row, max_col) in Layout.blocks(self.plan):
+              name = f"W{match.group(1)}_{suffix}"
+              ref = f"{column_letter(min_col)}{min_row}"
+              if (max_row, max_col) != (min_row, min_col):
+                  ref += f":{column_letter(max_col)}{max_row}"
+              self.index[name] = {
+                  "sheet": title, "ref": ref,
+                  "min_row": min_row, "min_col": min_col, "max_row": max_row, "max_col": max_col
+              }
+              names.append((name, f"'{title}'!" + re.sub(r"([A-Z]+)(\d+)", r"$\1$\2", ref)))
+
+      with self.profile.phase('names'):
+          Utils.define_names(self.wb, names)
+      return self.index
+
+
+  def write_index(self, filename: str) -> str:
+      # Machine readable index of the defined names as JSON, keyed by name
+      with open(filename, 'w') as f:
+          json.dump({"weeks": self.wb.sheetnames, "names": self.index}, f, indent=1)
+      self.progress(f"Writing index to {filename}")
+      return filename
+
+
+  def estimate(self, weeks: int, frequency: int, slots: int, sets: int) -> dict:
+      # Counts and output size of a program without building all of it
+      # Programs of one and two weeks are built with the engine and options of the instance,
+      # every later week adds as much as the second, e.g. its cached values with calculate
+      weeks = weeks or self.weeks
+      frequency = frequency or self.frequency
+      slots = slots or self.slots
+      sets = sets or self.sets
+
+      plan = Layout.plan(frequency=frequency, slots=slots, sets=sets, records=self.records)
+      profile, log = self.profile, self.log
+      builds = []
+      try:
+          self.log = None
+          for built in range(1, min(weeks, 2) + 1):
+              self.profile = Profile()
+              self.generate(weeks=built, frequency=frequency, slots=slots, sets=sets)
+              builds.append({**self.profile.counters, "bytes": len(Utils.to_bytes(self.wb))})
+      finally:
+          self.profile, self.log = profile, log
+
+      first, last = builds[0], builds[-1]
+      later = weeks - len(builds)
+      estimate = {"weeks": weeks, "sheets": weeks, "plan": plan, "engine": self.engine}
+      estimate.update((name, value + (value - first[name]) * later) for name, value in last.items())
+      return estimate
+
+
+  def stamp_week(self, currentSheet: object, plan: object) -> object:
+      # Turn a copy of the template week into the week named by its title
+      currentSheet.cell(row=1, column=1).value = currentSheet.title
+      last_week = int(currentSheet.title.split(' ')[1])-1
+
+      for day in plan.days:
+          col = day.number[LWL]
+          for rows in plan.rows:
+              if self.lean:
+                  Utils.set_array_formula(
+                      currentCell=currentSheet.cell(row=rows.volume_input, column=col),
+                      ref=self.block(col, rows.volume_input, plan.sets),
+                      formula=self.formula.lean_lwl(day.letter[LOAD], rows.volume_input, plan.sets).format(last_week)
+                  )
+                  continue
+              lwl = self.formula.lwl(day.letter[LOAD], rows.volume_input, plan.sets)
+              for row, formula in enumerate(lwl, rows.volume_input):
+                  # The cell is new when blank inputs are left to the column style
+                  Utils.set_formula(currentCell=currentSheet.cell(row=row, column=col), formula=formula.format(last_week))
+
+      if plan.records:
+          # The best so far folds in that of the week before
+          for day in plan.days:
+              for rows in plan.rows:
+                  for row, _, formula in self.generate_record_formulas(rows, last_week, columns=day):
+                      currentSheet.cell(row=row, column=day.number[LOAD]).value = formula
+
+      if self.library:
+          # Prescriptions can differ from week to week
+          self.prescribe(currentSheet, plan=plan)
+
+      return currentSheet
+
+
+  def prescribe(self, currentSheet: object, plan: object) -> object:
+      # Fill the Exercise header and the Program, Target and Notes rows of every slot from the library
+      # Slots without a prescription are left as generated
+      match = re.fullmatch(r"Week (\d+)", currentSheet.title)
+      week = int(match.group(1)) if match else None
+
+      for day in plan.days:
+          slot_col = day.number[SETS]
+          for slot, rows in enumerate(plan.rows, 1):
+              prescription = self.library.lookup(week, day.day, slot)
+              currentSheet.cell(row=rows.exercise, column=slot_col).value = (
+                  prescription.exercise if prescription and prescription.exercise else 'Exercise '
+              )
+              for row, text in ((rows.programming, 'program'), (rows.target, 'target'), (rows.notes, 'notes')):
+                  value = getattr(prescription, text) if prescription else ''
+                  currentSheet.cell(row=row, column=slot_col + 1).value = value or None
+
+      return currentSheet
+
+
   def generate_frequency(self, frequency: int) -> int:
       if not frequency:
           # Set default
@@ -61,28 +452,30 @@ class Workout:
       for sheet in self.wb.sheetnames:
           # Get sheet
           # Generate tables for days in sheet
-          begin_row = BEGIN_FREQ_ROW
-          begin_col = BEGIN_COLUMN
           currentSheet = self.wb[sheet]
+          with self.profile.week(sheet):
+              self.generate_days(currentSheet, frequency=frequency)
 
-          for day in range(1, frequency + 1):
-              # Add day header e.g .[ Day 1 ] [ Day 2 ] [ Day 3 ]
+      return frequency
 
-              currentCell = Style.generate_header(
-                  begin_row, begin_col, COLUMN_LENGTH, currentSheet, heading='Day', value=day
-              )
 
-              Style.set_style(
-                  currentSheet, currentCell, begin_col,
-                  fgColor=Style.Settings.WHITE, bgColor=Style.Settings.LIGHTBLACK,
-                  size=42, width=20, font='Helvetica', bold=True
-              )
+  def generate_days(self, currentSheet: object, frequency: int) -> object:
+      # Add the day headers and banner of a single week sheet
+      begin_row = BEGIN_FREQ_ROW
 
-              begin_col += NEXT_COLUMN
+      for day in range(1, frequency + 1):
+          # Add day header e.g .[ Day 1 ] [ Day 2 ] [ Day 3 ]
+          begin_col = Layout.columns(day).number[SETS]
 
-          Style.generate_sheet_banner(currentSheet=currentSheet, value=f"{sheet}")
+          currentCell = Style.generate_header(
+              begin_row, begin_col, COLUMN_LENGTH, currentSheet, heading='Day', value=day
+          )
 
-      return frequency
+          currentCell.style = 'Train Day'
+
+      Style.generate_sheet_banner(currentSheet=currentSheet, value=f"{currentSheet.title}", date=self.date)
+
+      return currentSheet
 
 
   def generate_slots(self, slots: int, sets: int, frequency: int) -> int:
@@ -99,169 +492,142 @@ class Workout:
           # Set default
           sets = self.sets
 
+      # Layout of the generated weeks, also used to clear them
+      self.plan = Layout.plan(frequency=frequency, slots=slots, sets=sets, records=self.records)
+
       for sheet in self.wb.sheetnames:
           # Get sheet
           # Generate tables for days in sheet
           currentSheet = self.wb[sheet]
+          with self.profile.week(sheet):
+              self.generate_sheet_slots(currentSheet, slots=slots, sets=sets, frequency=frequency)
 
-          # Get beginning column, we adjust as needed in the slot loop
-          slot_col = BEGIN_COLUMN
-
-          # These are used to track if for last rows in day
-          daily_rpe_row = None
-          session_rpe_row = None
-          internal_load_row = None
-
-          for day in range(1, frequency + 1):
-
-              # TODO: Determining placement can be done better than this
-              slot_rows = {
-                  "slot"          : BEGIN_SLOT_ROW,
-                  "exercise"      : BEGIN_SLOT_ROW + 1,
-                  "programming"   : BEGIN_SLOT_ROW + 2,
-                  "target"        : BEGIN_SLOT_ROW + 3,
-                  "notes"         : BEGIN_SLOT_ROW + 4,
-                  "volume_header" : BEGIN_SLOT_ROW + 5,
-                  "volume_input"  : BEGIN_SLOT_ROW + 6,
-                  "maxes"         : BEGIN_SLOT_ROW + 6 + sets,
-                  "averages"      : BEGIN_SLOT_ROW + 6 + sets + 1,
-                  "sums"          : BEGIN_SLOT_ROW + 6 + sets + 2,
-                  "volume"        : BEGIN_SLOT_ROW + 6 + sets + 3,
-                  "tonnage"       : BEGIN_SLOT_ROW + 6 + sets + 4,
-                  "e1rm"          : BEGIN_SLOT_ROW + 6 + sets + 5
-              }
-              # Used to get the next exercise slot section via its row number
-              next_slot=len(slot_rows)+sets
-              # Keep track of set range [("C12", "C21"), ..] for Internal Load formula
-              set_range=[]
-
-              for slot in range(1, slots + 1):
-
-                  # Add exercise slot header
-                  # [    Day 1   ]
-                  # [ Exercise 1 ]
-                  # [ Exercise 2 ]
-                  # [ Exercise 3 ]
-                  currentCell = Style.generate_header(
-                      slot_rows['slot'], slot_col, COLUMN_LENGTH, currentSheet, heading='Exercise', value=slot
-                  )
-                  Style.set_style(
-                      currentSheet, currentCell, slot_col,
-                      fgColor=Style.Settings.WHITE, bgColor=Style.Settings.DARKGREY,
-                      size=32, width=20, font='Helvetica'
-                  )
-                  slot_rows['slot'] += next_slot
-
-                  # Add exercise header
-                  # [    Day 1   ]
-                  # [ Exercise 1 ]
-                  # [  Exercise  ]
-                  # [ Exercise 2 ]
-                  # [  Exercise  ]
-                  currentCell = Style.generate_header(
-                      slot_rows['exercise'], slot_col, COLUMN_LENGTH, currentSheet, heading='Exercise', value=''
-                  )
-                  Style.set_style(
-                      currentSheet, currentCell, slot_col,
-                      fgColor=Style.Settings.WHITE, bgColor=Style.Settings.DARKRED,
-                      size=18, width=20, font='Helvetica', bold=False
-                  )
-                  slot_rows['exercise'] += next_slot
-
-                  # [       Program      ]
-                  # [        Notes       ]
-                  # [        Target       ]
-                  Style.generate_divide(slot_rows['programming'], slot_col, COLUMN_LENGTH, currentSheet, heading='Program')
-                  Style.generate_divide(slot_rows['target'], slot_col, COLUMN_LENGTH, currentSheet, heading='Target')
-                  Style.generate_divide(slot_rows['notes'], slot_col, COLUMN_LENGTH, currentSheet, heading='Notes')
-                  # TODO: Row height can be set in a better place
-                  currentSheet.row_dimensions[slot_rows['programming']].height = 40
-                  currentSheet.row_dimensions[slot_rows['target']].height = 40
-                  currentSheet.row_dimensions[slot_rows['notes']].height = 40
-                  slot_rows['programming'] += next_slot
-                  slot_rows['target'] += next_slot
-                  slot_rows['notes'] += next_slot
-
-                  # Add set header inputs
-                  # [ Sets ] [ Load ] [ Reps ] [ RIR ] [ RPE ] [ Avg Vel ] [ Intensity ]
-                  self.generate_volume_header(slot_rows['volume_header'], slot_col, currentSheet)
-                  slot_rows['volume_header'] += next_slot
-
-                  # Add set inputs
-                  # [ Set 1 ] [ <input> ]
-                  # [ Set 2 ] [ <input> ]
-                  self.generate_volume_input(slot_rows['volume_input'], slot_col, currentSheet, sets=sets, e1rm_row=slot_rows['e1rm'])
-                  set_range.append((f"{VOLUME_HEADERS['Load']['ColumnLetter']}{slot_rows['volume_input']}", f"{VOLUME_HEADERS['Load']['ColumnLetter']}{slot_rows['volume_input']+sets-1}"))
-
-                  # TODO: We should not be be referencing numbers, it's barely readable
-                  self.generate_rir_to_rpe(slot_rows['volume_input'], slot_col+4, currentSheet, sets=sets)
-
-
-                  # Add maxes row
-                  # [ Maxes ] [ <formula> ], etc.
-                  # Add row for getting the Max (highest number) - for convenience.
-                  self.generate_maxes_row(slot_rows['maxes'], slot_col, currentSheet, sets=sets)
-                  slot_rows['maxes'] += next_slot
-
-                  # Add averages row
-                  # [ Avgs ] [ <formula> ], etc.
-                  self.generate_averages_row(slot_rows['averages'], slot_col, currentSheet, sets=sets)
-                  slot_rows['averages'] += next_slot
-
-                  # Add averages row
-                  # [ Sums ] [ <formula> ], etc.
-                  self.generate_sums_row(slot_rows['sums'], slot_col, currentSheet, sets=sets)
-                  # Add row for Volume (sets x reps) that reads the Reps sum - for convenience.
-                  # Depends on value of slot_rows['sums'] before we increment it
-                  Utils.set_formula(
-                      currentCell=Style.generate_divide(slot_rows['volume'], slot_col, COLUMN_LENGTH, currentSheet, heading='Volume', style='formula'),
-                      formula=f"={VOLUME_HEADERS['Reps']['ColumnLetter']}{slot_rows['sums']}"
-                  )
-                  slot_rows['sums'] += next_slot
-
-                  Utils.set_formula(
-                      currentCell=Style.generate_divide(slot_rows['tonnage'], slot_col, COLUMN_LENGTH, currentSheet, heading='Tonnage', style='formula'),
-                      formula=self.generate_tonnage_formula(slot_rows['volume_input'], sets)
-                  )
-                  slot_rows['tonnage'] += next_slot
+      return slots
 
-                  Utils.set_formula(
-                      currentCell=Style.generate_divide(slot_rows['e1rm'], slot_col, COLUMN_LENGTH, currentSheet, heading='E1RM', style='formula'),
-                      formula=self.generate_e1rm_formula(slot_rows['volume_input'], sets)
-                  )
 
-                  slot_rows['e1rm'] += next_slot
-                  slot_rows['volume_input'] += next_slot
-                  slot_rows['volume'] += next_slot
-
-              avg_row = slot_rows['averages'] - next_slot
-              if not daily_rpe_row:
-                  daily_rpe_row = currentSheet.max_row + 1
-              if not session_rpe_row:
-                  session_rpe_row = currentSheet.max_row + 2
-              if not internal_load_row:
-                  internal_load_row = currentSheet.max_row + 3
+  def generate_sheet_slots(self, currentSheet: object, slots: int, sets: int, frequency: int) -> object:
+      # Add the exercise slots of every day to a single week sheet
+      # Every address comes from the layout plan, which is shared by all weeks of the same shape
+      plan = Layout.plan(frequency=frequency, slots=slots, sets=sets, records=self.records)
+      Style.set_widths(currentSheet, plan.widths)
+      # Week before the sheet, whose best so far the records read, the first week doesn't have one
+      match = re.fullmatch(r"Week (\d+)", currentSheet.title)
+      last_week = int(match.group(1)) - 1 if match else 0
+      if self.formatting == 'range':
+          # Blank inputs take the style of their column and are not written
+          for day in plan.days:
+              for letter in day.letter[LOAD:]:
+                  Style.set_column_style(currentSheet, letter, Style.Settings.INPUT)
+
+      for day in plan.days:
+
+          # Get beginning column of the day
+          slot_col = day.number[SETS]
+
+          for slot, rows in enumerate(plan.rows, 1):
+
+              # Add exercise slot header
+              # [    Day 1   ]
+              # [ Exercise 1 ]
+              # [ Exercise 2 ]
+              # [ Exercise 3 ]
+              currentCell = Style.generate_header(
+                  rows.slot, slot_col, COLUMN_LENGTH, currentSheet, heading='Exercise', value=slot
+              )
+              currentCell.style = 'Train Slot'
+
+              # Add exercise header
+              # [    Day 1   ]
+              # [ Exercise 1 ]
+              # [  Exercise  ]
+              # [ Exercise 2 ]
+              # [  Exercise  ]
+              currentCell = Style.generate_header(
+                  rows.exercise, slot_col, COLUMN_LENGTH, currentSheet, heading='Exercise', value=''
+              )
+              currentCell.style = 'Train Exercise'
+
+              # [       Program      ]
+              # [        Notes       ]
+              # [        Target       ]
+              Style.generate_divide(rows.programming, slot_col, COLUMN_LENGTH, currentSheet, heading='Program')
+              Style.generate_divide(rows.target, slot_col, COLUMN_LENGTH, currentSheet, heading='Target')
+              Style.generate_divide(rows.notes, slot_col, COLUMN_LENGTH, currentSheet, heading='Notes')
+              # TODO: Row height can be set in a better place
+              currentSheet.row_dimensions[rows.programming].height = 40
+              currentSheet.row_dimensions[rows.target].height = 40
+              currentSheet.row_dimensions[rows.notes].height = 40
+
+              # Add set header inputs
+              # [ Sets ] [ Load ] [ Reps ] [ RIR ] [ RPE ] [ Avg Vel ] [ Intensity ]
+              self.generate_volume_header(rows.volume_header, slot_col, currentSheet)
+
+              # Add set inputs
+              # [ Set 1 ] [ <input> ]
+              # [ Set 2 ] [ <input> ]
+              self.generate_volume_input(rows.volume_input, slot_col, currentSheet, sets=sets, columns=day, e1rm_row=rows.e1rm)
+
+              self.generate_rir_to_rpe(rows.volume_input, day.number[RPE], currentSheet, sets=sets)
+
+              # Add maxes row
+              # [ Maxes ] [ <formula> ], etc.
+              # Add row for getting the Max (highest number) - for convenience.
+              self.generate_maxes_row(rows.maxes, slot_col, currentSheet, sets=sets, columns=day)
+
+              # Add averages row
+              # [ Avgs ] [ <formula> ], etc.
+              self.generate_averages_row(rows.averages, slot_col, currentSheet, sets=sets, columns=day)
+
+              # Add averages row
+              # [ Sums ] [ <formula> ], etc.
+              self.generate_sums_row(rows.sums, slot_col, currentSheet, sets=sets, columns=day)
+              # Add row for Volume (sets x reps) that reads the Reps sum - for convenience.
               Utils.set_formula(
-                  currentCell=Style.generate_divide(daily_rpe_row, slot_col, COLUMN_LENGTH, currentSheet, heading='Average RPE', style='formula'),
-                  formula=f"=IFERROR(AVERAGEIF({VOLUME_HEADERS['RPE']['ColumnLetter']}{avg_row}:{VOLUME_HEADERS['RPE']['ColumnLetter']}{avg_row}, \"<>0\"), \"...\")"
+                  currentCell=Style.generate_divide(rows.volume, slot_col, COLUMN_LENGTH, currentSheet, heading='Volume', style='formula'),
+                  formula=f"={day.letter[REPS]}{rows.sums}"
               )
+
               Utils.set_formula(
-                  currentCell=Style.generate_divide(session_rpe_row, slot_col, COLUMN_LENGTH, currentSheet, heading='Session RPE', style='manual'),
-                  formula=f""
+                  currentCell=Style.generate_divide(rows.tonnage, slot_col, COLUMN_LENGTH, currentSheet, heading='Tonnage', style='formula'),
+                  formula=self.generate_tonnage_formula(rows.volume_input, sets, columns=day)
               )
+
               Utils.set_formula(
-                  currentCell=Style.generate_divide(internal_load_row, slot_col, COLUMN_LENGTH, currentSheet, heading='Internal Load (AU)', style='formula'),
-                  formula=self.generate_internal_load_formula(f"{VOLUME_HEADERS['Load']['ColumnLetter']}{session_rpe_row}", set_range)
+                  currentCell=Style.generate_divide(rows.e1rm, slot_col, COLUMN_LENGTH, currentSheet, heading='E1RM', style='formula'),
+                  formula=self.generate_e1rm_formula(rows.volume_input, sets, columns=day)
               )
 
-              # Update starting columns and start writing in column for next day
-              self.update_volume_headers()
-              slot_col += NEXT_COLUMN
+              if plan.records:
+                  # [ Best Load ] [ <formula> ]
+                  # [ Best E1RM ] [ <formula> ]
+                  for row, heading, formula in self.generate_record_formulas(rows, last_week, columns=day):
+                      Utils.set_formula(
+                          currentCell=Style.generate_divide(row, slot_col, COLUMN_LENGTH, currentSheet, heading=heading, style='formula'),
+                          formula=formula
+                      )
 
-          # Reset volume header back to default position for next week
-          self.reset_volume_headers()
+          # Average RPE reads the averages of the last slot of the day
+          avg_row = plan.rows[-1].averages
+          # Set range [("C12", "C21"), ..] of every slot for Internal Load formula
+          set_range = tuple((f"{day.letter[LOAD]}{rows.volume_input}", f"{day.letter[LOAD]}{rows.last_input}") for rows in plan.rows)
 
-      return slots
+          Utils.set_formula(
+              currentCell=Style.generate_divide(plan.daily_rpe, slot_col, COLUMN_LENGTH, currentSheet, heading='Average RPE', style='formula'),
+              formula=f"=IFERROR(AVERAGEIF({day.letter[RPE]}{avg_row}:{day.letter[RPE]}{avg_row}, \"<>0\"), \"...\")"
+          )
+          Utils.set_formula(
+              currentCell=Style.generate_divide(plan.session_rpe, slot_col, COLUMN_LENGTH, currentSheet, heading='Session RPE', style='manual'),
+              formula=f""
+          )
+          Utils.set_formula(
+              currentCell=Style.generate_divide(plan.internal_load, slot_col, COLUMN_LENGTH, currentSheet, heading='Internal Load (AU)', style='formula'),
+              formula=self.generate_internal_load_formula(f"{day.letter[LOAD]}{plan.session_rpe}", set_range)
+          )
+
+      if self.library:
+          self.prescribe(currentSheet, plan=plan)
+
+      return currentSheet
 
 
   def generate_volume_header(self, row: int, col: int, currentSheet: object) -> object:
@@ -271,18 +637,29 @@ class Workout:
                       row=row, column=col, value=f"{header}"
                   )
 
-                  Style.set_style(
-                      currentSheet, currentCell, col,
-                      fgColor=Style.Settings.WHITE, bgColor=Style.Settings.DARKRED,
-                      size=12, width=15, font='Helvetica', bold=True
-                  )
+                  currentCell.style = 'Train Heading'
                   # Set next column
                   col += 1
 
               return currentCell
 
 
-  def generate_volume_input(self, row: int, col: int, currentSheet: object, sets: int, **kwargs: dict) -> object:
+  def generate_volume_input(self, row: int, col: int, currentSheet: object, sets: int, columns: object, e1rm_row: int) -> object:
+
+              # Get last sheet to reference last load, the first week doesn't have one
+              try:
+                  last_week = int(currentSheet.title.split(' ')[1])-1
+              except IndexError:
+                  last_week = 0
+
+              if self.lean:
+                  # The first set holds the formula of the whole block, the others show its results
+                  intensity = (self.formula.lean_intensity(columns.letter[LOAD], row, sets, e1rm_row),)
+                  lwl = (self.formula.lean_lwl(columns.letter[LOAD], row, sets),)
+              else:
+                  intensity = self.formula.intensity(columns.letter[LOAD], row, sets, e1rm_row)
+                  lwl = self.formula.lwl(columns.letter[LOAD], row, sets)
+              first_row = row
 
               for number in range(1, sets + 1):
 
@@ -290,46 +667,50 @@ class Workout:
                       row=row, column=col, value=f"Set {number}"
                   )
 
-                  Style.set_style(
-                      currentSheet, currentCell, col,
-                      fgColor=Style.Settings.WHITE, bgColor=Style.Settings.DARKGREY,
-                      size=12, width=8, font='Helvetica', bold=False
-                  )
+                  currentCell.style = 'Train Label'
 
                   for item in range(1, VOLUME_LENGTH):
 
+                      if self.formatting == 'range' and item not in (RPE, INT) and not (item == LWL and last_week > 0):
+                          # Left to the input style of the column
+                          continue
+
                       currentCell = currentSheet.cell(
                           row=row, column=col+item, value=""
                       )
+                      currentCell.style = Style.Settings.INPUT
 
                       # Add intensity calculation based off E1RM
-                      if col+item == VOLUME_HEADERS['Int %']['ColumnNumber']:
-                          Utils.set_formula(
-                              currentCell=currentCell,
-                              #=IFERROR(C12/C27, "...")
-                              formula=f"=IFERROR({VOLUME_HEADERS['Load']['ColumnLetter']}{row}/{VOLUME_HEADERS['Load']['ColumnLetter']}{kwargs['e1rm_row']}, \"...\")"
-                          )
+                      if item == INT:
+                          if not self.lean:
+                              Utils.set_formula(
+                                  currentCell=currentCell,
+                                  #=IFERROR(C12/C27, "...")
+                                  formula=intensity[number-1]
+                              )
+                          elif number == 1:
+                              Utils.set_array_formula(
+                                  currentCell=currentCell,
+                                  ref=self.block(col+item, first_row, sets),
+                                  #=IFERROR(C12:C21/C27, "...")
+                                  formula=intensity[0]
+                              )
                           currentCell.number_format = '0%'
 
                       # Add Last Week's Load value
-                      if col+item == VOLUME_HEADERS['LWL']['ColumnNumber']:
-                          try:
-                              self.wb.active = currentSheet
-                              # Get last sheet to reference last load
-                              last_week = int(self.wb.active.title.split(' ')[1])-1
-                              formula=f"=IF(ISBLANK('Week {last_week}'!{VOLUME_HEADERS['Load']['ColumnLetter']}{row}), \"...\", 'Week {last_week}'!{VOLUME_HEADERS['Load']['ColumnLetter']}{row})"
-                              # E.g. =IF(ISBLANK('Week 1'!C12), "...", 'Week 1'!C12)
-                          except IndexError:
-                              formula = "N/A"
-
-                          # The first week which is 0 doesn't have a previous week..skip
-                          if last_week > 0:
+                      # E.g. =IF(ISBLANK('Week 1'!C12), "...", 'Week 1'!C12)
+                      if item == LWL and last_week > 0:
+                          if not self.lean:
                               Utils.set_formula(
                                   currentCell=currentCell,
-                                  formula=formula
+                                  formula=lwl[number-1].format(last_week)
+                              )
+                          elif number == 1:
+                              Utils.set_array_formula(
+                                  currentCell=currentCell,
+                                  ref=self.block(col+item, first_row, sets),
+                                  formula=lwl[0].format(last_week)
                               )
-
-                      currentCell.alignment = Style.Settings.ALIGNMENT
 
                   # Set next column
                   row += 1
@@ -343,37 +724,40 @@ class Workout:
               # e.g. #IF(E12="", "...", ABS(IFERROR(E12−10,"")))
 
               # The column before contains RPE
-              col_rpe_letter = get_column_letter(col-1)
+              col_rpe_letter = column_letter(col-1)
+
+              if self.lean:
+                  # One formula over the sets, the cells below the first show its results
+                  for number in range(sets):
+                      currentCell = currentSheet.cell(row=row+number, column=col)
+                      currentCell.style = Style.Settings.INPUT
+                  Utils.set_array_formula(
+                      currentCell=currentSheet.cell(row=row, column=col),
+                      ref=self.block(col, row, sets),
+                      formula=self.formula.lean_rir_to_rpe(col_rpe_letter, row, sets)
+                  )
+                  return currentCell
 
-              for input_row in range(row, row + sets):
+              for formula in self.formula.rir_to_rpe(col_rpe_letter, row, sets):
 
                   currentCell = currentSheet.cell(
-                      row=row, column=col,
-                      # Google Sheets: e.g. =IF(ISBLANK(E12),"...", IFERROR(ABS(MINUS(E12, 10)), "N/A"))
-                      value=f"=IF(ISBLANK({col_rpe_letter}{input_row}), \"...\", IFERROR(ABS(MINUS({col_rpe_letter}{input_row}, 10)), \"N/A\"))"
-                      # Excel: e.g. =IF(ISBLANK(L15), "...", IFERROR(ABS(SUM(L15, -10)), "..."))
+                      row=row, column=col, value=formula
                   )
 
-                  currentCell.alignment = Style.Settings.ALIGNMENT
+                  currentCell.style = Style.Settings.INPUT
 
                   row += 1
 
               return currentCell
 
 
-  def generate_averages_row(self, row: int, col: int, currentSheet: object, sets: int) -> object:
+  def generate_averages_row(self, row: int, col: int, currentSheet: object, sets: int, columns: object) -> object:
 
               currentCell = currentSheet.cell(
                   row=row, column=col, value=f"Averages"
               )
 
-              Style.set_style(
-                  currentSheet, currentCell, col,
-                  fgColor=Style.Settings.WHITE, bgColor=Style.Settings.DARKRED,
-                  size=12, width=15, font='Helvetica', bold=True
-              )
-
-              col += 1
+              currentCell.style = 'Train Heading'
 
               # TODO: The hardcoding of position makes it unreadable
               # Get first row of user inputs [ Load ] [ Reps ], etc.
@@ -381,48 +765,26 @@ class Workout:
               # Get last input row [ Load ] [ Reps ], etc.
               end_input_row = row - 2
 
-              for input_row in range(begin_input_row, begin_input_row + COLUMN_LENGTH):
+              formulas = self.formula.averages(columns.letter[LOAD:], begin_input_row, end_input_row, AVERAGE_PRECISION)
 
-                  col_letter = get_column_letter(col)
-                  #print(f"{begin_input_row} + {sets}: {col_letter}")
+              for item, formula in zip(range(LOAD, VOLUME_LENGTH), formulas):
 
                   currentCell = currentSheet.cell(
-                      row=row, column=col,
-                      value=f"=IFERROR(ROUND(AVERAGEIF({col_letter}{begin_input_row}:{col_letter}{end_input_row}, \"<>0\"), 0), \"...\")"
+                      row=row, column=columns.number[item], value=formula
                   )
 
-                  if col == VOLUME_HEADERS['Avg Vel']['ColumnNumber']:
-                      currentCell.value = f"=IFERROR(AVERAGEIF({col_letter}{begin_input_row}:{col_letter}{end_input_row}, \"<>0\"), \"...\")"
-                  if col == VOLUME_HEADERS['Int %']['ColumnNumber']:
-                      currentCell.value = f"=IFERROR(ROUND(AVERAGEIF({col_letter}{begin_input_row}:{col_letter}{end_input_row}, \"<>0\"), 3), \"...\")"
-
-                  Style.set_style(
-                      currentSheet, currentCell, col,
-                      fgColor=Style.Settings.WHITE, bgColor=Style.Settings.DARKRED,
-                      size=12, width=8, font='Helvetica', bold=False
-                  )
+                  currentCell.style = 'Train Formula'
 
-                  currentCell.alignment = Style.Settings.ALIGNMENT
-
-                  if col == VOLUME_HEADERS['Int %']['ColumnNumber']:
+                  if item == INT:
                       currentCell.number_format = '0%'
 
-                  # Set next column
-                  col += 1
-
-  def generate_sums_row(self, row: int, col: int, currentSheet: object, sets: int) -> object:
+  def generate_sums_row(self, row: int, col: int, currentSheet: object, sets: int, columns: object) -> object:
 
               currentCell = currentSheet.cell(
                   row=row, column=col, value=f"Sums"
               )
 
-              Style.set_style(
-                  currentSheet, currentCell, col,
-                  fgColor=Style.Settings.WHITE, bgColor=Style.Settings.DARKRED,
-                  size=12, width=15, font='Helvetica', bold=True
-              )
-
-              col += 1
+              currentCell.style = 'Train Heading'
 
               # Get first row of user inputs [ Load ] [ Reps ], etc.
               # TODO: The hardcoding of position makes it unreadable
@@ -430,129 +792,83 @@ class Workout:
               # Get last input row [ Load ] [ Reps ], etc.
               end_input_row = row - 3
 
-              for input_row in range(begin_input_row, begin_input_row + COLUMN_LENGTH):
+              formulas = self.formula.sums(columns.letter[LOAD:], begin_input_row, end_input_row)
 
-                  col_letter = get_column_letter(col)
+              for item, formula in zip(range(LOAD, VOLUME_LENGTH), formulas):
 
                   currentCell = currentSheet.cell(
-                      row=row, column=col,
-                      value=f"=IFERROR(IF(SUM({col_letter}{begin_input_row}:{col_letter}{end_input_row})>0, SUM({col_letter}{begin_input_row}:{col_letter}{end_input_row}), \"...\"), \"N/A\")"
+                      row=row, column=columns.number[item], value=formula
                   )
 
-                  Style.set_style(
-                      currentSheet, currentCell, col,
-                      fgColor=Style.Settings.WHITE, bgColor=Style.Settings.DARKRED,
-                      size=12, width=8, font='Helvetica', bold=False
-                  )
-
-                  currentCell.alignment = Style.Settings.ALIGNMENT
+                  currentCell.style = 'Train Formula'
 
-                  if col == VOLUME_HEADERS['Int %']['ColumnNumber']:
+                  if item == INT:
                       currentCell.number_format = '0%'
 
-                  # Set next column
-                  col += 1
-
 
-  def generate_maxes_row(self, row: int, col: int, currentSheet: object, sets: int) -> object:
+  def generate_maxes_row(self, row: int, col: int, currentSheet: object, sets: int, columns: object) -> object:
 
               currentCell = currentSheet.cell(
                   row=row, column=col, value=f"Maxes"
               )
 
-              Style.set_style(
-                  currentSheet, currentCell, col,
-                  fgColor=Style.Settings.WHITE, bgColor=Style.Settings.DARKRED,
-                  size=12, width=15, font='Helvetica', bold=True
-              )
-
-              col += 1
+              currentCell.style = 'Train Heading'
 
               # Get first row of user inputs [ Load ] [ Reps ], etc.
               begin_input_row = row - sets
               # Get last input row [ Load ] [ Reps ], etc.
               end_input_row = row - 1
 
-              for input_row in range(begin_input_row, begin_input_row + COLUMN_LENGTH):
+              #E.g. IFERROR(MAX(C12:C16), "...")
+              formulas = self.formula.maxes(columns.letter[LOAD:], begin_input_row, end_input_row)
 
-                  col_letter = get_column_letter(col)
+              for item, formula in zip(range(LOAD, VOLUME_LENGTH), formulas):
 
                   currentCell = currentSheet.cell(
-                      row=row, column=col,
-                      value=f"=IFERROR(MAX({col_letter}{begin_input_row}:{col_letter}{end_input_row}), \"...\")"
-                      #E.g. IFERROR(MAX(C12:C16), "...")
-                  )
-
-                  Style.set_style(
-                      currentSheet, currentCell, col,
-                      fgColor=Style.Settings.WHITE, bgColor=Style.Settings.DARKRED,
-                      size=12, width=8, font='Helvetica', bold=False
+                      row=row, column=columns.number[item], value=formula
                   )
 
-                  currentCell.alignment = Style.Settings.ALIGNMENT
+                  currentCell.style = 'Train Formula'
 
-                  if col == VOLUME_HEADERS['Int %']['ColumnNumber']:
+                  if item == INT:
                       currentCell.number_format = '0%'
 
-                  # Set next column
-                  col += 1
-
-  def generate_tonnage_formula(self, row, sets) -> str:
+  def generate_tonnage_formula(self, row, sets, columns=None) -> str:
       #=SUM(PRODUCT(C34:C34),PRODUCT(C35:C35),PRODUCT(C36:C36)...)
-      l = []
-
-      first_row = row
-      last_row = row + sets - 1
-      for r in range(row, row + sets):
-          l.append(f"{VOLUME_HEADERS['Load']['ColumnLetter']}{r}:{VOLUME_HEADERS['Reps']['ColumnLetter']}{r}")
-
-      formula = '{}, {}{}), {})'.format(
-          f"=IF(COUNT({VOLUME_HEADERS['Load']['ColumnLetter']}{first_row}:{VOLUME_HEADERS['Load']['ColumnLetter']}{last_row})>0",
-          f"SUM(", "".join('PRODUCT({}), '.format(i) for i in l).rstrip(','),
-          f"\"...\""
-      )
-      return formula
-
-  def generate_e1rm_formula(self, row, sets) -> str:
+      columns = columns or Layout.columns(1)
+      if self.lean:
+          # =IF(COUNT(C12:C21)>0, SUM(SUMPRODUCT(C12:C21, D12:D21), SUMIF(D12:D21, "", C12:C21), ...), "...")
+          return self.formula.lean_tonnage(columns.letter[LOAD], columns.letter[REPS], row, sets)
+      return self.formula.tonnage(columns.letter[LOAD], columns.letter[REPS], row, sets)
+
+  @staticmethod
+  def block(col, row, sets) -> str:
+      # Address of the sets of a column e.g. H12:H21
+      letter = column_letter(col)
+      return f"{letter}{row}:{letter}{row + sets - 1}"
+
+  def generate_e1rm_formula(self, row, sets, columns=None) -> str:
       # Epley equation W * (1 + r/30)
       # $ echo "315 * (1 + 5/30)" | bc -l
       # 367.49999999999999999790
       # E.g. =MAX(C12:C21)*(1+VLOOKUP(MAX(C12:C21),C:D,2, FALSE)/30)
-
-      first_row = row
-      last_row = row + sets - 1
-
-      # =IFERROR(PRODUCT(MAX(C12:C21), SUM(1, DIVIDE(VLOOKUP(MAX(C12:C21), C12:D21, 2,FALSE), 30))), "...")
-      formula = '{}{}{}'.format(
-          f"=IFERROR(PRODUCT(MAX({VOLUME_HEADERS['Load']['ColumnLetter']}{first_row}:{VOLUME_HEADERS['Load']['ColumnLetter']}{last_row}), ",
-          f"SUM(1, DIVIDE(VLOOKUP(MAX({VOLUME_HEADERS['Load']['ColumnLetter']}{first_row}:{VOLUME_HEADERS['Load']['ColumnLetter']}{last_row}), ",
-          f"{VOLUME_HEADERS['Load']['ColumnLetter']}{first_row}:{VOLUME_HEADERS['Reps']['ColumnLetter']}{last_row}, 2, FALSE), 30))), \"...\")"
-      )
-
-      return formula
+      columns = columns or Layout.columns(1)
+      return self.formula.e1rm(columns.letter[LOAD], columns.letter[REPS], row, sets)
+
+  def generate_record_formulas(self, rows, last_week, columns=None) -> tuple:
+      # (row, heading, formula) of the best Load of the Maxes row and the best E1RM so far
+      # E.g. =IF(MAX(C27, 'Week 1'!C29)>0, MAX(C27, 'Week 1'!C29), "..."), the first week has none before it
+      columns = columns or Layout.columns(1)
+      load = columns.letter[LOAD]
+      records = []
+      for row, heading, cell in ((rows.best_load, 'Best Load', rows.maxes), (rows.best_e1rm, 'Best E1RM', rows.e1rm)):
+          first, later = self.formula.best(f"{load}{cell}", f"{load}{row}")
+          records.append((row, heading, later.format(last_week) if last_week > 0 else first))
+      return tuple(records)
 
   def generate_internal_load_formula(self, session_cell, set_range) -> str:
       # =IF(ISBLANK(C52), "...", PRODUCT(C52, SUM(COUNTIF(C12:C21, ">0"), COUNTIF(C35:C44, ">0"))))
-
-      formula = '=IF(ISBLANK({}), {}, PRODUCT({}, SUM({})))'.format(
-          f"{session_cell}",
-          f"\"...\"",
-          f"{session_cell}",
-          f"".join('COUNTIF({}:{}, ">0"), '.format(j,k) for j,k in set_range).rstrip(", '"),
-      )
-      return formula
-
-  def update_volume_headers(self) -> None:
-      for k in VOLUME_HEADERS.keys():
-          VOLUME_HEADERS[k]['ColumnNumber'] += 9
-          VOLUME_HEADERS[k]['ColumnLetter'] = get_column_letter(VOLUME_HEADERS[k]['ColumnNumber'])
-      return None
-
-
-  def reset_volume_headers(self) -> None:
-      for k, n in  zip(VOLUME_HEADERS.keys(), range(0, VOLUME_LENGTH)):
-          VOLUME_HEADERS[k]['ColumnNumber'] = BEGIN_COLUMN + n
-          VOLUME_HEADERS[k]['ColumnLetter'] = get_column_letter(BEGIN_COLUMN + n)
+      return self.formula.internal_load(session_cell, tuple(set_range))
 
 
   def test(self, msg: str) -> str:
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# Benchmark program generation over a grid of program shapes
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+import zipfile
+import openpyxl
+from Profile import Profile
+from Workout import Workout
+from Utils import Utils
+
+
+# Shapes as (weeks, frequency, slots, sets), from the default program up to a large year-long one
+SHAPES = [
+    (8, 3, 3, 10),
+    (12, 4, 4, 10),
+    (26, 5, 6, 12),
+    (52, 6, 8, 12),
+    (52, 7, 10, 20),
+]
+
+
+def arguments():
+  parser = argparse.ArgumentParser(description='Benchmark generation time, peak memory and output size across program shapes.')
+  parser.add_argument("--shapes",   type=str, nargs="+", help="Shapes as WEEKSxFREQUENCYxSLOTSxSETS e.g. 8x3x3x10 (def: a grid up to 52x7x10x20)")
+  parser.add_argument("-e", "--engine",   type=str, choices=['memory', 'stream', 'native'], default='memory', help="Generation engine (def: memory)")
+  parser.add_argument("-d", "--dialect",  type=str, choices=['sheets', 'excel', 'calc'], default='sheets', help="Formula dialect (def: sheets)")
+  parser.add_argument("-t", "--template", action="store_true", help="Build Week 1 once and copy it for the remaining weeks")
+  parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass that measures peak memory")
+  parser.add_argument("-o", "--output",   type=str, help="Write the results as JSON to this file (def: stdout)")
+  parser.add_argument("-c", "--compare",  type=str, help="JSON results of an earlier run to compare against")
+  return parser.parse_args()
+
+
+def version() -> str:
+  # Commit of the benchmarked tree, if it is a git checkout
+  try:
+      return subprocess.run(
+          ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+          capture_output=True, text=True, check=True
+      ).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+      return None
+
+
+def build(shape: tuple, filename: str, engine: str, dialect: str, template: bool) -> dict:
+  # Build and save one program, returns the wall time of each phase in seconds
+  weeks, frequency, slots, sets = shape
+
+  Program = Workout(engine=engine, dialect=dialect, profile=Profile(), log=None)
+  Program.generate(weeks=weeks, frequency=frequency, slots=slots, sets=sets, template=template)
+  with Program.profile.phase("save"):
+      Utils.save(workbook=Program.wb, filename=filename, log=None)
+
+  phases = dict(Program.profile.phases)
+  phases["total"] = Program.profile.total()
+  return phases
+
+
+def measure(shape: tuple, engine: str, dialect: str, template: bool, memory: bool) -> dict:
+  with tempfile.TemporaryDirectory() as tmp:
+      filename = os.path.join(tmp, "benchmark.xlsx")
+      phases = build(shape, filename, engine, dialect, template)
+
+      # Count what was actually written, independent of the engine
+      cells = formulas = 0
+      with zipfile.ZipFile(filename) as archive:
+          for name in archive.namelist():
+              if name.startswith("xl/worksheets/sheet"):
+                  data = archive.read(name)
+                  cells += data.count(b"<c ")
+                  # Array and shared formulas carry attributes e.g. <f t="array" ref="I12:I14">
+                  formulas += len(re.findall(rb"<f[ >]", data))
+      size = os.path.getsize(filename)
+
+      peak = None
+      if memory:
+          # Separate pass, tracing slows allocation down and would skew the timings
+          tracemalloc.start()
+          build(shape, filename, engine, dialect, template)
+          peak = tracemalloc.get_traced_memory()[1]
+          tracemalloc.stop()
+
+  weeks, frequency, slots, sets = shape
+  return {
+      "shape": {"weeks": weeks, "frequency": frequency, "slots": slots, "sets": sets},
+      "phases": phases,
+      "peak_bytes": peak,
+      "cells": cells,
+      "formulas": formulas,
+      "bytes": size,
+  }
+
+
+def compare(results: list, baseline: dict) -> None:
+  # Print the ratio of each measurement to the same shape of an earlier run, above 1.00 is worse
+  old = {tuple(r["shape"].values()): r for r in baseline["results"]}
+  print(f"Compared to {baseline.get('version') or 'baseline'}:")
+  for result in results:
+      shape = tuple(result["shape"].values())
+      if shape not in old:
+          continue
+      before = old[shape]
+      ratios = [f"time {result['phases']['total'] / before['phases']['total']:.2f}x"]
+      if result["peak_bytes"] and before.get("peak_bytes"):
+          ratios.append(f"peak {result['peak_bytes'] / before['peak_bytes']:.2f}x")
+      ratios.append(f"size {result['bytes'] / before['bytes']:.2f}x")
+      print(f"  {'x'.join(map(str, shape))}: {', '.join(ratios)}")
+
+
+def main():
+  args = arguments()
+  shapes = SHAPES
+  if args.shapes:
+      shapes = [tuple(int(n) for n in shape.lower().split("x")) for shape in args.shapes]
+
+  results = []
+  for shape in shapes:
+      result = measure(shape, args.engine, args.dialect, args.template, memory=not args.no_memory)
+      peak = f"{result['peak_bytes'] / 2**20:.1f}MB peak, " if result["peak_bytes"] else ""
+      print(
+          f"{'x'.join(map(str, shape))}: {result['phases']['total']:.2f}s, {peak}"
+          f"{result['cells']} cells, {result['formulas']} formulas, {result['bytes']} bytes",
+          file=sys.stderr
+      )
+      results.append(result)
+
+  report = {
+      "version": version(),
+      "python": platform.python_version(),
+      "openpyxl": openpyxl.__version__,
+      "engine": args.engine,
+      "dialect": args.dialect,
+      "template": args.template,
+      "results": results,
+  }
+
+  if args.output:
+      with open(args.output, "w") as f:
+          json.dump(report, f, indent=2)
+  else:
+      print(json.dumps(report, indent=2))
+
+  if args.compare:
+      with open(args.compare) as f:
+          compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,77 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Analytics import Analytics
+from Evaluator import Graph
+from Layout import Layout, LOAD, REPS
+from Workout import Workout
+
+
+def logged(filename: str, weeks: int, frequency: int, slots: int, sets: int, seed: int = 1, **options) -> None:
+  # A program with Load and Reps logged in every set, some sets with only one of them or neither
+  # options are those of the Workout e.g. dialect
+  rng = random.Random(seed)
+  Program = Workout(engine='memory', log=None, **options)
+  Program.generate(weeks=weeks, frequency=frequency, slots=slots, sets=sets)
+  plan = Layout.plan(frequency=frequency, slots=slots, sets=sets, records=options.get("records", False))
+  for sheet in Program.wb.worksheets:
+      for day in plan.days:
+          for rows in plan.rows:
+              for row in range(rows.volume_input, rows.volume_input + sets):
+                  kind = rng.choice(('both', 'both', 'load', 'reps', 'none'))
+                  if kind in ('both', 'load'):
+                      sheet.cell(row=row, column=day.number[LOAD], value=rng.choice((60, 80, 100, 102.5)))
+                  if kind in ('both', 'reps'):
+                      sheet.cell(row=row, column=day.number[REPS], value=rng.randint(1, 12))
+  Program.wb.save(filename)
+
+
+class TestAnalytics(unittest.TestCase):
+
+  def test_tonnage_of_sheet(self):
+      # The tonnage of every slot is the value of its Tonnage formula, sets with only a Load or only Reps included
+      shape = {"weeks": 2, "frequency": 2, "slots": 3, "sets": 5}
+      with tempfile.TemporaryDirectory() as directory:
+          filename = os.path.join(directory, 'logged.xlsx')
+          logged(filename, **shape)
+          values = Graph.read(filename).calculate()
+          load, reps, rir, velocity, session, weeks, _ = Analytics.read(filename)
+
+      tonnage = Analytics.metrics(load, reps, rir, velocity, session)["tonnage"]
+      plan = Layout.plan(frequency=shape["frequency"], slots=shape["slots"], sets=shape["sets"])
+      for week in range(shape["weeks"]):
+          for day, columns in enumerate(plan.days):
+              for slot, rows in enumerate(plan.rows):
+                  value = values[(f"Week {weeks[week]}", rows.tonnage, columns.number[0] + 1)]
+                  with self.subTest(week=week + 1, day=day + 1, slot=slot + 1):
+                      self.assertAlmostEqual(tonnage[week, day, slot], 0 if value == "..." else value)
+
+
+  def test_extended_shape(self):
+      # Weeks added by --extend with more slots and sets are read with their own layout
+      with tempfile.TemporaryDirectory() as directory:
+          filename = os.path.join(directory, 'logged.xlsx')
+          logged(filename, weeks=1, frequency=2, slots=1, sets=3)
+          Program = Workout(log=None)
+          Program.extend(filename, weeks=1, frequency=3, slots=2, sets=4)
+          Program.wb.save(filename)
+          load, reps, rir, velocity, session, weeks, shapes = Analytics.read(filename)
+          rows = Analytics.analyze(filename)
+
+      self.assertEqual(weeks, [1, 2])
+      self.assertEqual(shapes, [(2, 1), (3, 2)])
+      self.assertEqual(load.shape, (2, 3, 2, 4))
+      # Only the first week was logged, into its own rows
+      self.assertTrue((load[0, :2, :1, :3] > 0).any())
+      self.assertTrue(all(value != value for value in load[1].flat))
+      slots = [(row["week"], row["day"], row["slot"]) for row in rows if row["level"] == "slot"]
+      self.assertEqual(slots, [(1, 1, 1), (1, 2, 1)] + [(2, day, slot) for day in (1, 2, 3) for slot in (1, 2)])
+
+
+if __name__ == '__main__':
+  unittest.main()
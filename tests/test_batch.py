@@ -0,0 +1,94 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Batch import Batch
+
+
+DEFAULTS = {"weeks": 2, "frequency": 1, "slots": 1, "sets": 2}
+
+
+class TestBatch(unittest.TestCase):
+
+  def setUp(self):
+      self.directory = tempfile.TemporaryDirectory()
+
+
+  def tearDown(self):
+      self.directory.cleanup()
+
+
+  def path(self, name: str) -> str:
+      return os.path.join(self.directory.name, name)
+
+
+  def roster(self, *rows: str, header: str = "filename,weeks,frequency,slots,sets") -> str:
+      filename = self.path('roster.csv')
+      with open(filename, 'w') as f:
+          f.write("\n".join((header, *rows)) + "\n")
+      return filename
+
+
+  def run_batch(self, roster: str, **options) -> tuple:
+      output = io.StringIO()
+      with contextlib.redirect_stdout(output):
+          failed = Batch.run(roster=roster, jobs=2, defaults=DEFAULTS, **options)
+      return failed, output.getvalue().splitlines()
+
+
+  def test_errors(self):
+      # A program that fails is reported on its own line and the others are still built
+      roster = self.roster(
+          f"{self.path('good.xlsx')},,,,",
+          ",2,1,1,2",
+          f"{self.path('weeks.xlsx')},two,,,",
+          f"{self.path(os.path.join('missing', 'dir.xlsx'))},,,,",
+      )
+      failed, lines = self.run_batch(roster)
+      self.assertEqual(failed, 3)
+      self.assertTrue(os.path.exists(self.path('good.xlsx')))
+      self.assertIn("FAILED <no filename>: ValueError: No filename", lines)
+      self.assertTrue(any(line.startswith(f"FAILED {self.path('weeks.xlsx')}: ValueError") for line in lines))
+      self.assertTrue(any(line.startswith(f"FAILED {self.path(os.path.join('missing', 'dir.xlsx'))}:") for line in lines))
+      self.assertTrue(any(line.startswith(f"OK     {self.path('good.xlsx')} (2 sheets") for line in lines))
+      self.assertTrue(lines[-1].startswith("Wrote 1 of 4 programs"))
+
+
+  def test_missing_columns(self):
+      with self.assertRaisesRegex(ValueError, "missing columns: slots, sets"):
+          Batch.read(self.roster(header="filename,weeks,frequency"))
+
+
+  def test_cached(self):
+      # The second program of the same shape is copied from the cache
+      os.environ["TIMETOTRAIN_CACHE"] = self.path('cache')
+      self.addCleanup(os.environ.pop, "TIMETOTRAIN_CACHE")
+      failed, _ = self.run_batch(self.roster(f"{self.path('first.xlsx')},,,,"), engine='native', cache=10)
+      self.assertEqual(failed, 0)
+      failed, lines = self.run_batch(self.roster(f"{self.path('second.xlsx')},,,,"), engine='native', cache=10)
+      self.assertEqual(failed, 0)
+      self.assertTrue(lines[0].startswith(f"CACHED {self.path('second.xlsx')}"))
+      with open(self.path('first.xlsx'), 'rb') as first, open(self.path('second.xlsx'), 'rb') as second:
+          self.assertEqual(first.read(), second.read())
+
+
+  def test_exit_code(self):
+      # The command fails when any program of the roster does
+      for rows, code in (((f"{self.path('good.xlsx')},2,1,1,2",), 0), ((f"{self.path('good.xlsx')},2,1,1,2", ",2,1,1,2"), 1)):
+          with self.subTest(code=code):
+              result = subprocess.run(
+                  [sys.executable, os.path.join(ROOT, 'timetotrain.py'), '--batch', self.roster(*rows), '--jobs', '1'],
+                  capture_output=True, text=True
+              )
+              self.assertEqual(result.returncode, code, result.stdout + result.stderr)
+
+
+if __name__ == '__main__':
+  unittest.main()
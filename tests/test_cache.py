@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Cache import Cache
+
+
+class TestCache(unittest.TestCase):
+  # A cache of 250 bytes holds two programs of 100
+
+  def setUp(self):
+      self.directory = tempfile.TemporaryDirectory()
+      self.cache = Cache(size=250, directory=os.path.join(self.directory.name, 'programs'))
+      self.program = self.file('program.xlsx', b"x" * 100)
+
+
+  def tearDown(self):
+      self.directory.cleanup()
+
+
+  def file(self, name: str, content: bytes) -> str:
+      filename = os.path.join(self.directory.name, name)
+      with open(filename, 'wb') as f:
+          f.write(content)
+      return filename
+
+
+  def used(self, key: str, seconds: int) -> None:
+      # Last use of a cached program, the clock of a test is too coarse to order them
+      os.utime(self.cache.path(key), ns=(seconds * 10 ** 9, seconds * 10 ** 9))
+
+
+  def cached(self) -> set:
+      return {os.path.splitext(name)[0] for name in os.listdir(self.cache.directory) if name.endswith('.xlsx')}
+
+
+  def test_key(self):
+      options = {"weeks": 8, "engine": 'native', "date": None}
+      self.assertEqual(Cache.key(options), Cache.key(dict(reversed(list(options.items())))))
+      self.assertNotEqual(Cache.key(options), Cache.key({**options, "weeks": 9}))
+      self.assertEqual(len(Cache.key(options)), 64)
+
+
+  def test_fetch(self):
+      copy = os.path.join(self.directory.name, 'copy.xlsx')
+      self.assertFalse(self.cache.fetch('a', copy))
+      self.assertFalse(os.path.exists(copy))
+      self.cache.store('a', self.program)
+      self.assertTrue(self.cache.fetch('a', copy))
+      with open(copy, 'rb') as f:
+          self.assertEqual(f.read(), b"x" * 100)
+
+
+  def test_least_recently_used(self):
+      self.cache.store('a', self.program)
+      self.used('a', 1000)
+      self.cache.store('b', self.program)
+      self.used('b', 2000)
+      # Fetching a makes b the least recently used
+      self.cache.fetch('a', os.path.join(self.directory.name, 'copy.xlsx'))
+      self.cache.store('c', self.program)
+      self.assertEqual(self.cached(), {'a', 'c'})
+
+
+  def test_evict(self):
+      for number, key in enumerate('abcd'):
+          self.cache.store(key, self.program)
+          self.used(key, 1000 + number)
+      self.assertEqual(self.cached(), {'c', 'd'})
+      self.cache.size = 100
+      self.assertEqual(self.cache.evict(), ['c'])
+      self.assertEqual(self.cached(), {'d'})
+      # Nothing but the programs is taken into account or removed
+      self.file(os.path.join('programs', 'left.tmp'), b"x" * 1000)
+      self.assertEqual(self.cache.evict(), [])
+
+
+if __name__ == '__main__':
+  unittest.main()
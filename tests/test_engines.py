@@ -0,0 +1,112 @@
+import datetime
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Layout import Layout
+from Style import Style
+from Utils import Utils
+from Workout import Workout
+
+
+SHAPE = {"weeks": 3, "frequency": 2, "slots": 2, "sets": 3}
+DATE = datetime.date(2024, 1, 1)
+
+
+def build(engine: str, formatting: str = 'cell', template: bool = False, jobs: int = None) -> bytes:
+  Program = Workout(engine=engine, formatting=formatting, date=DATE, log=None)
+  Program.generate(template=template, jobs=jobs, **SHAPE)
+  return Utils.to_bytes(Program.wb)
+
+
+def style(cell: object) -> tuple:
+  # What a cell looks like, whatever stylesheet the engine wrote
+  font, fill, alignment = cell.font, cell.fill, cell.alignment
+  return (
+      font.name, font.sz, font.b, font.color.rgb if font.color else None,
+      fill.fill_type, fill.fgColor.rgb if fill.fill_type else None,
+      alignment.horizontal, alignment.vertical, alignment.wrap_text, cell.number_format
+  )
+
+
+def contents(data: bytes) -> dict:
+  # Values, formulas, styles and merges of every sheet of a file
+  # The cells covered by a merge are left out, the engines differ only in whether they write them
+  from openpyxl import load_workbook
+  from openpyxl.worksheet.formula import ArrayFormula
+  workbook = load_workbook(io.BytesIO(data))
+  sheets = {}
+  for sheet in workbook.worksheets:
+      merges = {str(merge) for merge in sheet.merged_cells.ranges}
+      covered = {
+          (row, col)
+          for merge in sheet.merged_cells.ranges
+          for row in range(merge.min_row, merge.max_row + 1)
+          for col in range(merge.min_col, merge.max_col + 1)
+          if (row, col) != (merge.min_row, merge.min_col)
+      }
+      cells = {}
+      for (row, col), cell in sheet._cells.items():
+          if (row, col) in covered:
+              continue
+          value = cell.value.text if isinstance(cell.value, ArrayFormula) else cell.value
+          cells[cell.coordinate] = (value, style(cell))
+      sheets[sheet.title] = {"cells": cells, "merges": merges}
+  return sheets
+
+
+class TestEngines(unittest.TestCase):
+  # Every engine and way of building a program writes the same sheets as the memory engine
+
+  def assertSameSheets(self, expected: bytes, actual: bytes) -> None:
+      expected, actual = contents(expected), contents(actual)
+      self.assertEqual(list(expected), list(actual))
+      for title in expected:
+          self.assertEqual(expected[title]["merges"], actual[title]["merges"], f"Merges of {title}")
+          cells, found = expected[title]["cells"], actual[title]["cells"]
+          differ = sorted(set(cells) ^ set(found)) + sorted(key for key in set(cells) & set(found) if cells[key] != found[key])
+          if differ:
+              self.fail(f"{len(differ)} cells of {title} differ, e.g. " + ", ".join(
+                  f"{key} {cells.get(key)} != {found.get(key)}" for key in differ[:3]
+              ))
+
+
+  def test_engines(self):
+      for formatting in ('cell', 'range'):
+          expected = build('memory', formatting=formatting)
+          for engine in ('stream', 'native'):
+              with self.subTest(engine=engine, formatting=formatting):
+                  self.assertSameSheets(expected, build(engine, formatting=formatting))
+
+
+  def test_template(self):
+      expected = build('memory')
+      for engine in ('memory', 'stream', 'native'):
+          with self.subTest(engine=engine):
+              self.assertSameSheets(expected, build(engine, template=True))
+
+
+  def test_widths(self):
+      # The layout plan sets every column width and only the styles the sheets use are registered
+      from openpyxl import load_workbook
+      widths = dict(Layout.plan(**{key: SHAPE[key] for key in ("frequency", "slots", "sets")}).widths)
+      for engine in ('memory', 'stream', 'native'):
+          with self.subTest(engine=engine):
+              workbook = load_workbook(io.BytesIO(build(engine)))
+              for sheet in workbook.worksheets:
+                  found = {letter: dimension.width for letter, dimension in sheet.column_dimensions.items() if dimension.customWidth}
+                  self.assertEqual(found, widths, sheet.title)
+              self.assertNotIn('Train Block', workbook.style_names)
+              self.assertLessEqual(set(Style.Settings.STYLES), set(workbook.style_names))
+
+
+  def test_parallel(self):
+      self.assertSameSheets(build('memory'), build('native', jobs=2))
+      self.assertSameSheets(build('memory', formatting='range'), build('native', formatting='range', jobs=2))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,175 @@
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Evaluator import Evaluator, Error, Graph, FUNCTIONS, CIRCULAR, DIV0, NA, NAME, VALUE, expand_array
+from Workout import Workout
+
+
+def calc(formula: str, cells: dict = None, other: object = None) -> object:
+  # Value of a formula in Z100 of a sheet with the given cells by (row, col)
+  return Evaluator({**(cells or {}), (100, 26): formula}, other).value(100, 26)
+
+
+# C1:C5 and D1:D5 of a slot, a blank Load in row 3 and blank Reps in row 4
+SETS = {
+    (1, 3): 100.0, (2, 3): 80.0, (4, 3): 60.0, (5, 3): "text",
+    (1, 4): 5.0, (2, 4): 8.0, (3, 4): 10.0, (5, 4): 2.0,
+}
+
+
+class TestParser(unittest.TestCase):
+
+  def test_operators(self):
+      for formula, expected in (
+          ("=1+2*3^2", 19.0), ("=10-4-3", 3.0), ("=2^3^2", 64.0), ("=-2^2", 4.0), ("=(1+2)*3", 9.0),
+          ("=50%", 0.5), ("=1/0", DIV0), ("=\"a\"&\"b\"", "ab"), ("=\"A\"=\"a\"", True), ("=1<\"a\"", True),
+          ("=C9+1", 1.0), ("=C9=0", True), ("=\"x\"+1", VALUE), ("=TRUE+1", 2.0),
+      ):
+          with self.subTest(formula=formula):
+              self.assertEqual(calc(formula), expected)
+
+
+  def test_references(self):
+      other = lambda sheet, row, col: {("Week 1", 12, 3): 7.0}.get((sheet, row, col))
+      self.assertEqual(calc("='Week 1'!C12*2", other=other), 14.0)
+      self.assertEqual(calc("=$C$1+C$2", SETS), 180.0)
+      self.assertEqual(calc("=SUM(C1:D2)", SETS), 193.0)
+      # A range where one value is expected
+      self.assertEqual(calc("=C1:C2+1", SETS), VALUE)
+
+
+  def test_unreadable(self):
+      self.assertEqual(calc("=SUM(C1"), NAME)
+      self.assertEqual(calc("=1 2"), NAME)
+      self.assertEqual(calc("=NOSUCH(1)"), NAME)
+
+
+class TestFunctions(unittest.TestCase):
+
+  CASES = {
+      "ISBLANK": (("=ISBLANK(C3)", True), ("=ISBLANK(C1)", False), ("=ISBLANK(C9)", True)),
+      "SUM": (("=SUM(C1:C5)", 240.0), ("=SUM(C5, 1)", 1.0), ("=SUM(C9:C10)", 0.0), ("=SUM(1, 1/0)", DIV0)),
+      "MAX": (("=MAX(C1:C5)", 100.0), ("=MAX(C9:C10)", 0.0)),
+      "MIN": (("=MIN(C1:C5)", 60.0), ("=MIN(C1:C5, 20)", 20.0)),
+      "PRODUCT": (("=PRODUCT(C1:D1)", 500.0), ("=PRODUCT(C3:D3)", 10.0), ("=PRODUCT(C4:D4)", 60.0), ("=PRODUCT(C9:D9)", 0.0)),
+      "AVERAGEIF": (("=AVERAGEIF(C1:C5, \">0\")", 80.0), ("=AVERAGEIF(D1:D5, \">5\", C1:C5)", 80.0), ("=AVERAGEIF(C9:C10, \"<>0\")", DIV0)),
+      "COUNTIF": (("=COUNTIF(C1:C5, \">0\")", 3.0), ("=COUNTIF(C1:C5, \"\")", 1.0), ("=COUNTIF(C1:C5, \"TEXT\")", 1.0)),
+      "SUMIF": (("=SUMIF(D1:D5, \"\", C1:C5)", 60.0), ("=SUMIF(C1:C5, \"\", D1:D5)", 10.0), ("=SUMIF(C1:C5, \">=80\")", 180.0)),
+      "COUNT": (("=COUNT(C1:C5)", 3.0), ("=COUNT(C1:C5, 1, \"a\")", 4.0)),
+      "VLOOKUP": (("=VLOOKUP(80, C1:D5, 2, FALSE)", 8.0), ("=VLOOKUP(\"TEXT\", C1:D5, 2, FALSE)", 2.0), ("=VLOOKUP(70, C1:D5, 2, FALSE)", NA)),
+      "SUMPRODUCT": (("=SUMPRODUCT(C1:C5, D1:D5)", 1140.0), ("=SUMPRODUCT(C1:C5, D1:D4)", VALUE)),
+      "ROUND": (("=ROUND(2.5, 0)", 3.0), ("=ROUND(-2.5)", -3.0), ("=ROUND(1.2345, 2)", 1.23), ("=ROUND(C5, 1)", VALUE)),
+      "ABS": (("=ABS(-3)", 3.0), ("=ABS(C9)", 0.0)),
+      "MINUS": (("=MINUS(C1, D1)", 95.0),),
+      "DIVIDE": (("=DIVIDE(C1, D1)", 20.0), ("=DIVIDE(C1, C9)", DIV0)),
+  }
+
+  def test_every_function(self):
+      self.assertEqual(set(self.CASES), set(FUNCTIONS))
+      for name, cases in self.CASES.items():
+          for formula, expected in cases:
+              with self.subTest(function=name, formula=formula):
+                  value = calc(formula, SETS)
+                  if isinstance(expected, float) and isinstance(value, float):
+                      self.assertAlmostEqual(value, expected)
+                  else:
+                      self.assertEqual(value, expected)
+
+
+  def test_if(self):
+      self.assertEqual(calc("=IF(C1>90, \"heavy\", \"light\")", SETS), "heavy")
+      self.assertEqual(calc("=IF(C2>90, \"heavy\")", SETS), False)
+      self.assertEqual(calc("=IF(1/0, 1, 2)"), DIV0)
+      self.assertEqual(calc("=IF(\"yes\", 1, 2)"), VALUE)
+
+
+  def test_short_circuit(self):
+      # The branch not taken is never read, A1 would be a cycle of its own
+      for formula, expected in (
+          ("=IF(TRUE, 1, A1)", 1.0), ("=IF(FALSE, A1, 2)", 2.0),
+          ("=IFERROR(5, A1)", 5.0), ("=IFERROR(1/0, \"...\")", "..."),
+      ):
+          with self.subTest(formula=formula):
+              evaluator = Evaluator({(1, 1): "=A1", (100, 26): formula})
+              self.assertEqual(evaluator.value(100, 26), expected)
+              self.assertNotIn((1, 1), evaluator.results)
+      self.assertEqual(calc("=IFERROR(A1, 0)", {(1, 1): "=A1"}), 0.0)
+
+
+class TestCycles(unittest.TestCase):
+
+  def test_evaluator(self):
+      evaluator = Evaluator({(1, 1): "=B1+1", (1, 2): "=A1", (1, 3): "=A1*2", (1, 4): "=5"})
+      self.assertEqual(evaluator.value(1, 1), CIRCULAR)
+      self.assertEqual(evaluator.value(1, 3), CIRCULAR)
+      self.assertEqual(evaluator.value(1, 4), 5.0)
+
+
+  def test_graph(self):
+      graph = Graph({
+          "Week 1": {(1, 1): "=B1+1", (1, 2): "=A1", (1, 3): "=A1*2", (1, 4): 4.0, (1, 5): "=D1*2"},
+          "Week 2": {(1, 5): "='Week 1'!E1+1", (1, 6): "=E1*2"},
+      })
+      order, cycle = graph.order()
+      self.assertEqual(set(cycle), {("Week 1", 1, 1), ("Week 1", 1, 2), ("Week 1", 1, 3)})
+      self.assertLess(order.index(("Week 1", 1, 5)), order.index(("Week 2", 1, 5)))
+      results = graph.calculate()
+      self.assertEqual(results[("Week 1", 1, 3)], CIRCULAR)
+      self.assertEqual(results[("Week 2", 1, 6)], 18.0)
+
+
+class TestArrays(unittest.TestCase):
+
+  def test_expand(self):
+      cells = expand_array("=IFERROR(C12:C14/C27, \"...\")", "H12:H14")
+      self.assertEqual(cells, (
+          ((12, 8), "=IFERROR(C12/C27, \"...\")"),
+          ((13, 8), "=IFERROR(C13/C27, \"...\")"),
+          ((14, 8), "=IFERROR(C14/C27, \"...\")"),
+      ))
+
+
+  def test_expand_sheets(self):
+      # Sheet names and $ are kept, ranges of another height are left as they are
+      cells = dict(expand_array("=IF(ISBLANK('Week 1'!$C12:$C13), SUM(D1:D5), 'Week 1'!C12:C13)", "E12:E13"))
+      self.assertEqual(cells[(13, 5)], "=IF(ISBLANK('Week 1'!C13), SUM(D1:D5), 'Week 1'!C13)")
+
+
+  def test_read(self):
+      # Graph.read calculates every cell of an array formula from its own row
+      Program = Workout(engine='native', calculate=True, lean=True, date=datetime.date(2024, 1, 1), log=None)
+      Program.generate(weeks=2, frequency=1, slots=1, sets=3)
+      with tempfile.TemporaryDirectory() as directory:
+          filename = os.path.join(directory, 'lean.xlsx')
+          Program.wb.save(filename)
+          graph = Graph.read(filename)
+      # The LWL of the sets of Week 2 is one array formula over I12:I14
+      self.assertEqual(graph.sheets["Week 2"][(14, 9)], "=IF(ISBLANK('Week 1'!C14), \"...\", 'Week 1'!C14)")
+      self.assertEqual(graph.cached[("Week 2", 14, 9)], "...")
+      self.assertEqual(graph.differences(), [])
+
+
+class TestCalculate(unittest.TestCase):
+  # Everything a --calculate build stores is what --evaluate calculates
+
+  def test_no_differences(self):
+      for options in ({}, {"dialect": 'excel'}, {"lean": True}, {"records": True}, {"formatting": 'range', "names": True}):
+          with self.subTest(**options):
+              Program = Workout(engine='native', calculate=True, date=datetime.date(2024, 1, 1), log=None, **options)
+              Program.generate(weeks=3, frequency=2, slots=2, sets=4)
+              with tempfile.TemporaryDirectory() as directory:
+                  filename = os.path.join(directory, 'calculated.xlsx')
+                  Program.wb.save(filename)
+                  graph = Graph.read(filename)
+              self.assertTrue(graph.cached)
+              self.assertEqual(graph.differences(), [])
+              self.assertFalse(any(isinstance(value, Error) and value.code == '#NAME?' for value in graph.results.values()))
+
+
+if __name__ == '__main__':
+  unittest.main()
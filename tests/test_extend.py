@@ -0,0 +1,103 @@
+import datetime
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Evaluator import Graph
+from Layout import Layout, LOAD, LWL
+from Native import NativeWorkbook
+from Utils import Utils
+from Workout import Workout
+from test_engines import contents
+
+
+DATE = datetime.date(2024, 1, 1)
+
+
+class TestExtend(unittest.TestCase):
+
+  def setUp(self):
+      self.directory = tempfile.TemporaryDirectory()
+      self.filename = os.path.join(self.directory.name, 'program.xlsx')
+
+
+  def tearDown(self):
+      self.directory.cleanup()
+
+
+  def build(self, weeks: int, **shape) -> None:
+      Program = Workout(engine='native', date=DATE, log=None, records=shape.pop("records", False))
+      Program.generate(weeks=weeks, **shape)
+      Program.wb.save(self.filename)
+
+
+  def test_infer(self):
+      # The shape of a week is read back from its merges
+      for frequency, slots, sets, records in ((1, 1, 1, False), (3, 1, 4, True), (2, 4, 10, False), (7, 8, 12, True)):
+          with self.subTest(frequency=frequency, slots=slots, sets=sets, records=records):
+              self.build(1, frequency=frequency, slots=slots, sets=sets, records=records)
+              merges = NativeWorkbook(base=self.filename).merges("Week 1")
+              self.assertEqual(Layout.infer(merges), (frequency, slots, sets, records))
+
+
+  def test_infer_other_sheet(self):
+      with self.assertRaises(ValueError):
+          Layout.infer([(1, 1, 1, 4)])
+
+
+  def test_new_weeks(self):
+      # The weeks added are those of a program built with all of them at once
+      shape = {"frequency": 2, "slots": 2, "sets": 3}
+      self.build(4, **shape)
+      expected = contents(open(self.filename, 'rb').read())
+      self.build(2, **shape)
+      Program = Workout(date=DATE, log=None)
+      sheets = Program.extend(self.filename, weeks=2)
+      self.assertEqual(sheets, ["Week 1", "Week 2", "Week 3", "Week 4"])
+      self.assertEqual(contents(Utils.to_bytes(Program.wb)), expected)
+
+
+  def test_logged_weeks(self):
+      # The weeks of the file keep what was logged in them and the first new week reads its LWL from them
+      self.build(1, frequency=1, slots=1, sets=2)
+      from openpyxl import load_workbook
+      workbook = load_workbook(self.filename)
+      plan = Layout.plan(frequency=1, slots=1, sets=2)
+      row, day = plan.rows[0].volume_input, plan.days[0]
+      workbook["Week 1"].cell(row=row, column=day.number[LOAD], value=140)
+      workbook.save(self.filename)
+
+      Program = Workout(engine='native', calculate=True, date=DATE, log=None)
+      Program.extend(self.filename, weeks=1)
+      Program.wb.save(self.filename)
+      graph = Graph.read(self.filename)
+      results = graph.calculate()
+      self.assertEqual(graph.sheets["Week 1"][(row, day.number[LOAD])], 140.0)
+      self.assertEqual(graph.cached[("Week 2", row, day.number[LWL])], 140.0)
+      self.assertEqual(results[("Week 2", row, day.number[LWL])], 140.0)
+      self.assertEqual(graph.cached[("Week 2", row + 1, day.number[LWL])], "...")
+
+      # Weeks of another shape when it is given
+      Program = Workout(log=None)
+      Program.extend(self.filename, weeks=1, frequency=2, slots=2, sets=3)
+      Program.wb.save(self.filename)
+      self.assertEqual(Layout.infer(NativeWorkbook(base=self.filename).merges("Week 3")), (2, 2, 3, False))
+
+
+  def test_requires_weeks(self):
+      self.build(1, frequency=1, slots=1, sets=1)
+      result = subprocess.run(
+          [sys.executable, os.path.join(ROOT, 'timetotrain.py'), '--extend', self.filename],
+          capture_output=True, text=True
+      )
+      self.assertEqual(result.returncode, 2)
+      self.assertIn("--extend requires --weeks", result.stderr)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,67 @@
+import io
+import math
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Evaluator import Graph
+from Utils import Utils
+from Workout import Workout
+from test_analytics import logged
+
+
+SHAPE = {"weeks": 3, "frequency": 2, "slots": 2, "sets": 5}
+
+
+def evaluated(**options) -> dict:
+  # Value of every formula of a logged program by (sheet, row, col)
+  with tempfile.TemporaryDirectory() as directory:
+      filename = os.path.join(directory, 'logged.xlsx')
+      logged(filename, **SHAPE, **options)
+      return Graph.read(filename).calculate()
+
+
+class TestFormula(unittest.TestCase):
+
+  def assertSameValues(self, expected: dict, actual: dict) -> None:
+      self.assertEqual(set(expected), set(actual))
+      differ = [
+          key for key, value in expected.items()
+          if not (value == actual[key] or (
+              isinstance(value, float) and isinstance(actual[key], float) and math.isclose(value, actual[key])
+          ))
+      ]
+      if differ:
+          self.fail(f"{len(differ)} formulas differ, e.g. " + ", ".join(
+              f"{key} {expected[key]!r} != {actual[key]!r}" for key in differ[:3]
+          ))
+
+
+  def test_lean(self):
+      # One array formula per block of sets gives the values of a formula per set
+      for dialect in ('sheets', 'excel'):
+          with self.subTest(dialect=dialect):
+              self.assertSameValues(evaluated(dialect=dialect), evaluated(dialect=dialect, lean=True))
+
+
+  def test_excel(self):
+      # The excel and calc dialects give the values of the Sheets formulas with none of its own functions
+      expected = evaluated()
+      for dialect in ('excel', 'calc'):
+          with self.subTest(dialect=dialect):
+              self.assertSameValues(expected, evaluated(dialect=dialect))
+              for lean in (False, True):
+                  Program = Workout(engine='native', dialect=dialect, lean=lean, records=True, log=None)
+                  Program.generate(**SHAPE)
+                  with zipfile.ZipFile(io.BytesIO(Utils.to_bytes(Program.wb))) as archive:
+                      sheets = b"".join(archive.read(name) for name in archive.namelist() if name.startswith("xl/worksheets/"))
+                  self.assertNotIn(b"MINUS(", sheets)
+                  self.assertNotIn(b"DIVIDE(", sheets)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,127 @@
+import os
+import pickle
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Library as module
+from Library import Library, Prescription
+
+
+CSV = """week,day,slot,exercise,program,target,notes
+,,1,Back Squat,5x5,,
+,1,1,,,RPE 8,
+2,1,1,,3x3,,Belt on the top sets
+"""
+
+
+class TestLibrary(unittest.TestCase):
+
+  def setUp(self):
+      self.directory = tempfile.TemporaryDirectory()
+      self.cache = os.path.join(self.directory.name, 'cache')
+      self.filename = self.write(CSV)
+      module._compiled.clear()
+
+
+  def tearDown(self):
+      module._compiled.clear()
+      self.directory.cleanup()
+
+
+  def write(self, content: str, name: str = 'library.csv') -> str:
+      filename = os.path.join(self.directory.name, name)
+      with open(filename, 'w') as f:
+          f.write(content)
+      return filename
+
+
+  def load(self) -> object:
+      return Library.load([self.filename], cache=self.cache)
+
+
+  def test_lookup(self):
+      # The most specific line wins field by field
+      library = self.load()
+      self.assertEqual(library.lookup(1, 1, 1), Prescription("Back Squat", "5x5", "RPE 8", ""))
+      self.assertEqual(library.lookup(2, 1, 1), Prescription("Back Squat", "3x3", "RPE 8", "Belt on the top sets"))
+      self.assertEqual(library.lookup(1, 2, 1), Prescription("Back Squat", "5x5", "", ""))
+      self.assertIsNone(library.lookup(1, 1, 2))
+
+
+  def test_later_files(self):
+      other = self.write("day,slot,exercise\n1,1,Front Squat\n", 'client.csv')
+      library = Library.load([self.filename, other], cache=self.cache)
+      self.assertEqual(library.lookup(1, 1, 1).exercise, "Front Squat")
+      self.assertEqual(library.lookup(1, 2, 1).exercise, "Back Squat")
+
+
+  def test_cache_on_disk(self):
+      # Another process reads the compiled file instead of parsing it
+      digest = self.load().digest
+      self.assertEqual(len(os.listdir(self.cache)), 1)
+      module._compiled.clear()
+      with mock.patch.object(Library, 'parse', side_effect=AssertionError("parsed again")):
+          library = self.load()
+      self.assertEqual(library.digest, digest)
+      self.assertEqual(library.lookup(1, 1, 1).exercise, "Back Squat")
+
+
+  def test_touched(self):
+      # A new modification time with the same content only checks the hash
+      digest = self.load().digest
+      later = time.time() + 10
+      os.utime(self.filename, (later, later))
+      module._compiled.clear()
+      with mock.patch.object(Library, 'parse', side_effect=AssertionError("parsed again")):
+          self.assertEqual(self.load().digest, digest)
+
+
+  def test_changed(self):
+      digest = self.load().digest
+      self.write(CSV.replace("Back Squat", "Box Squat"))
+      later = time.time() + 10
+      os.utime(self.filename, (later, later))
+      library = self.load()
+      self.assertNotEqual(library.digest, digest)
+      self.assertEqual(library.lookup(1, 1, 1).exercise, "Box Squat")
+
+
+  def test_stale_cache(self):
+      # A cache of another version or one that can't be read is parsed again
+      self.load()
+      cached = os.path.join(self.cache, os.listdir(self.cache)[0])
+      for content in (pickle.dumps({"version": module.CACHE_VERSION - 1}), b"not a pickle"):
+          with self.subTest(content=content[:12]):
+              with open(cached, 'wb') as f:
+                  f.write(content)
+              module._compiled.clear()
+              with mock.patch.object(Library, 'parse', wraps=Library.parse) as parse:
+                  self.assertEqual(self.load().lookup(1, 1, 1).exercise, "Back Squat")
+              self.assertEqual(parse.call_count, 1)
+
+
+  def test_unwritable_cache(self):
+      # Only costs parsing the file again next time
+      self.cache = self.write("", 'cache')
+      self.assertEqual(self.load().lookup(1, 1, 1).exercise, "Back Squat")
+
+
+  def test_errors(self):
+      for content, message in (
+          ("week,day,slot,sets\n", "unknown columns: sets"),
+          ("week,day,slot,exercise\nfirst,1,1,Squat\n", "week should be a number from 1"),
+      ):
+          with self.subTest(message=message):
+              self.write(content)
+              module._compiled.clear()
+              with self.assertRaisesRegex(ValueError, message):
+                  Library.load([self.filename], cache=self.cache)
+
+
+if __name__ == '__main__':
+  unittest.main()
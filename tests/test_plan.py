@@ -0,0 +1,47 @@
+import datetime
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Profile import Profile
+from Utils import Utils
+from Workout import Workout
+
+
+SHAPE = {"weeks": 5, "frequency": 2, "slots": 2, "sets": 4}
+DATE = datetime.date(2024, 1, 1)
+
+
+class TestPlan(unittest.TestCase):
+
+  def test_estimate(self):
+      # The counts are those of the whole program built with the same engine and options, the size is close to it
+      for options in ({"engine": 'memory'}, {"engine": 'stream', "lean": True}, {"engine": 'native', "calculate": True, "names": True, "records": True}):
+          with self.subTest(**options):
+              estimate = Workout(date=DATE, log=None, **options).estimate(**SHAPE)
+              Program = Workout(date=DATE, log=None, profile=Profile(), **options)
+              Program.generate(**SHAPE)
+              size = len(Utils.to_bytes(Program.wb))
+              self.assertEqual(estimate["engine"], options["engine"])
+              self.assertEqual({name: estimate[name] for name in Program.profile.counters}, Program.profile.counters)
+              self.assertLess(abs(estimate["bytes"] - size) / size, 0.05)
+
+
+  def test_without_openpyxl(self):
+      # A plan of the native engine never loads openpyxl, nor writes a file
+      code = (
+          "import sys; sys.argv = ['timetotrain.py', '--plan', '--engine', 'native', '--calculate', '--weeks', '3']; "
+          "import timetotrain; timetotrain.main(); print('openpyxl' in sys.modules)"
+      )
+      result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+      self.assertEqual(result.returncode, 0, result.stderr)
+      self.assertIn("with the native engine", result.stdout)
+      self.assertEqual(result.stdout.splitlines()[-1], "False")
+
+
+if __name__ == '__main__':
+  unittest.main()
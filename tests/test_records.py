@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Evaluator import Graph
+from Layout import Layout, LOAD
+from Workout import Workout
+from test_analytics import logged
+
+
+SHAPE = {"frequency": 2, "slots": 2, "sets": 4}
+
+
+class TestRecords(unittest.TestCase):
+
+  def test_layout(self):
+      # The record rows follow E1RM and push the next slot down by as many rows
+      plain, records = Layout.plan(**SHAPE), Layout.plan(**SHAPE, records=True)
+      rows = records.rows[0]
+      self.assertIsNone(plain.rows[0].best_load)
+      self.assertEqual((rows.best_load, rows.best_e1rm), (rows.e1rm + 1, rows.e1rm + 2))
+      self.assertEqual(records.rows[1].slot - plain.rows[1].slot, 2)
+
+
+  def test_best_so_far(self):
+      # Best Load and Best E1RM of a week are the best Maxes and E1RM of the slot up to that week
+      for dialect in ('sheets', 'excel'):
+          with self.subTest(dialect=dialect), tempfile.TemporaryDirectory() as directory:
+              filename = os.path.join(directory, 'logged.xlsx')
+              logged(filename, weeks=4, **SHAPE, dialect=dialect, records=True)
+              values = Graph.read(filename).calculate()
+
+              plan = Layout.plan(**SHAPE, records=True)
+              for day in plan.days:
+                  col = day.number[LOAD]
+                  for rows in plan.rows:
+                      for row, best_row in ((rows.maxes, rows.best_load), (rows.e1rm, rows.best_e1rm)):
+                          found = []
+                          for week in range(1, 5):
+                              value = values[(f"Week {week}", row, col)]
+                              if isinstance(value, float) and value > 0:
+                                  found.append(value)
+                              expected = max(found) if found else "..."
+                              self.assertEqual(values[(f"Week {week}", best_row, col)], expected, (week, best_row, col))
+
+
+  def test_engines(self):
+      # Every engine writes the same record formulas
+      formulas = []
+      for engine in ('memory', 'stream', 'native'):
+          Program = Workout(engine=engine, records=True, log=None)
+          Program.generate(weeks=2, **SHAPE)
+          with tempfile.TemporaryDirectory() as directory:
+              filename = os.path.join(directory, 'records.xlsx')
+              Program.wb.save(filename)
+              formulas.append(Graph.read(filename).formulas())
+      self.assertEqual(formulas[0], formulas[1])
+      self.assertEqual(formulas[0], formulas[2])
+      rows = Layout.plan(**SHAPE, records=True).rows[0]
+      self.assertIn("'Week 1'!", formulas[0][("Week 2", rows.best_load, Layout.plan(**SHAPE).days[0].number[LOAD])])
+
+
+if __name__ == '__main__':
+  unittest.main()
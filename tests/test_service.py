@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Service import Service
+
+
+TIMEOUT = 60
+
+
+class TestService(unittest.IsolatedAsyncioTestCase):
+  # A service with one worker and no queue on a free port, each request on its own connection
+
+  async def asyncSetUp(self):
+      self.service = Service(workers=1, queue=0)
+      self.host, self.port = await self.service.start('127.0.0.1', 0)
+
+
+  async def asyncTearDown(self):
+      await self.service.close()
+
+
+  async def request(self, method: str, path: str, body: bytes = b'') -> tuple:
+      # Status, headers and body of a response, read until the service closes the connection
+      reader, writer = await asyncio.open_connection(self.host, self.port)
+      writer.write(
+          f"{method} {path} HTTP/1.1\r\nHost: test\r\nConnection: close\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+      )
+      await writer.drain()
+      data = await asyncio.wait_for(reader.read(), TIMEOUT)
+      writer.close()
+      head, _, content = data.partition(b"\r\n\r\n")
+      lines = head.decode('latin-1').split("\r\n")
+      headers = {name.lower(): value.strip() for name, _, value in (line.partition(":") for line in lines[1:])}
+      return int(lines[0].split(" ")[1]), headers, content
+
+
+  async def test_program(self):
+      # The connection is closed once the program is sent, the read above would time out otherwise
+      status, headers, content = await self.request("POST", "/programs", b'{"weeks": 2, "frequency": 2}')
+      self.assertEqual(status, 200)
+      self.assertEqual(int(headers["content-length"]), len(content))
+      self.assertEqual(headers["connection"], "close")
+      self.assertTrue(content.startswith(b"PK"))
+
+
+  async def test_metrics(self):
+      await self.request("POST", "/programs", b'{"weeks": 1}')
+      status, _, content = await self.request("GET", "/metrics")
+      self.assertEqual(status, 200)
+      metrics = json.loads(content)
+      self.assertEqual((metrics["requests"], metrics["built"], metrics["failed"], metrics["rejected"]), (1, 1, 0, 0))
+      self.assertIn("p99", metrics["latency_ms"]["total"])
+
+
+  async def test_queue_full(self):
+      # The only slot is taken as if a program was being built
+      async with self.service.slots:
+          status, headers, content = await self.request("POST", "/programs", b'{"weeks": 1}')
+      self.assertEqual(status, 503)
+      self.assertEqual(headers["retry-after"], "1")
+      self.assertEqual(json.loads(content)["status"], 503)
+      self.assertEqual(self.service.metrics()["rejected"], 1)
+
+
+  async def test_bad_options(self):
+      for body in (b'not json', b'[1]', b'{"colour": "red"}', b'{"weeks": 0}', b'{"weeks": "2"}', b'{"sets": true}',
+                   b'{"engine": "paper"}', b'{"date": "yesterday"}', b'{"library": "/etc/passwd"}'):
+          with self.subTest(body=body):
+              status, _, content = await self.request("POST", "/programs", body)
+              self.assertEqual(status, 400)
+              self.assertEqual(json.loads(content)["status"], 400)
+      self.assertEqual(self.service.metrics()["built"], 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
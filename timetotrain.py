@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 # Author: Jon Schipp <jonschipp@gmail.com, jschipp@illinois.edu>
 import argparse
-from Workout import Workout
-from Utils import Utils
+import cProfile
+import datetime
+import os
+import sys
+from Layout import SETS, LWL
+from Profile import Profile
+# Batch, Workout and Utils are imported once a program is actually built, openpyxl comes with them
 
 
 def usage():
@@ -27,26 +32,182 @@ def arguments():
   parser.add_argument("-S", "--slots",     type=int, help="Number of exercises slots per workout (def: 3)")
   parser.add_argument("-s", "--sets",     type=int, help="Number of sets per slot (def: 10)")
   parser.add_argument("-f", "--filename", type=str, help="Spreadsheet output filename, (def: workout.xlsx)")
+  parser.add_argument("-e", "--engine",   type=str, choices=['memory', 'stream', 'native'], default='memory', help="Generation engine, stream and native write one week at a time (def: memory)")
+  parser.add_argument("-d", "--dialect",  type=str, choices=['sheets', 'excel', 'calc'], default='sheets', help="Write formulas for Google Sheets, Excel or LibreOffice Calc (def: sheets)")
+  parser.add_argument("-m", "--formatting", type=str, choices=['cell', 'range'], default='cell', help="Style every cell, or leave blank inputs and gaps to column styles and conditional formatting (def: cell)")
+  parser.add_argument("-t", "--template", action="store_true", help="Build Week 1 once and copy it for the remaining weeks")
+  parser.add_argument("-b", "--batch",    type=str, help="CSV roster with filename,weeks,frequency,slots,sets per program, blank fields use the options above")
+  parser.add_argument("-j", "--jobs",     type=int, default=os.cpu_count(), help="Number of processes of --batch, --parallel, --report and --listen (def: number of CPUs)")
+  parser.add_argument("-c", "--calculate", action="store_true", help="Store the result of every formula so the file opens without calculating it (native engine and --extend)")
+  parser.add_argument("-a", "--parallel", action="store_true", help="Build the weeks of the program across --jobs processes (native engine)")
+  parser.add_argument("-z", "--lean",     action="store_true", help="Write one array formula per block of sets and SUMPRODUCT for tonnage instead of a formula per set")
+  parser.add_argument("-R", "--records",  action="store_true", help="Add Best Load and Best E1RM rows to every slot, the best so far of the program")
+  parser.add_argument("-n", "--names",    action="store_true", help="Define a name for every block e.g. W3_D2_S1_Load and W3_D2_S1_E1RM")
+  parser.add_argument("-i", "--index",    type=str, help="Write the defined names and their addresses to this JSON file, implies --names")
+  parser.add_argument("-l", "--library",  type=str, nargs="+", help="Fill the Exercise, Program, Target and Notes rows from these CSV or YAML prescription files")
+  parser.add_argument("-D", "--date",     type=datetime.date.fromisoformat, help="Date on the banner of every week as YYYY-MM-DD, the same options and date build the same file (def: today)")
+  parser.add_argument("-k", "--cache",    type=int, nargs="?", const=512, help="Copy programs built before out of a cache of this many MB, the least recently used are removed (def: 512)")
+  parser.add_argument("-x", "--extend",   type=str, help="Add --weeks new weeks, required, to this program, written back to it unless --filename is given")
+  parser.add_argument("-E", "--evaluate", type=str, nargs="+", help="Calculate every formula of these programs and write the values as CSV, to --filename if given, fails if they differ from the values stored in the files")
+  parser.add_argument("-r", "--report",   type=str, nargs="+", help="Write training metrics of filled in programs as CSV, to --filename if given (requires numpy)")
+  parser.add_argument("-L", "--listen",   type=str, metavar="[HOST:]PORT", help="Serve programs over HTTP on this address, built across --jobs processes (def host: 127.0.0.1)")
+  parser.add_argument("-q", "--queue",    type=int, help="Programs of --listen that wait for a process before more are turned away (def: 4 per job)")
+  parser.add_argument("-P", "--plan",     action="store_true", help="Print the layout, counts and estimated file size without writing anything")
+  parser.add_argument("-p", "--profile",  type=str, nargs="?", const="-", help="Print a breakdown of time per phase and week, or dump it to a .json file or cProfile stats to a .prof file")
   args = parser.parse_args()
+  if args.calculate and args.engine != 'native' and not args.extend:
+      parser.error("--calculate requires --engine native")
+  if args.parallel and args.engine != 'native':
+      parser.error("--parallel requires --engine native")
+  if args.parallel and args.template:
+      parser.error("--parallel builds every week, it can't be combined with --template")
+  if args.extend and not args.weeks:
+      parser.error("--extend requires --weeks, the number of weeks to add")
 
   weeks = args.weeks
   frequency = args.frequency
   slots = args.slots
   sets = args.sets
   filename = args.filename
+  engine = args.engine
+  dialect = args.dialect
+  template = args.template
+  batch = args.batch
+  jobs = args.jobs
+  profile = args.profile
+  plan = args.plan
+  extend = args.extend
+  report = args.report
+  calculate = args.calculate
+  formatting = args.formatting
+  parallel = args.parallel
+  index = args.index
+  names = args.names or bool(index)
+  library = args.library
+  date = args.date or datetime.date.today()
+  cache = args.cache
+  listen = args.listen
+  queue = args.queue
+  evaluate = args.evaluate
+  lean = args.lean
+  records = args.records
 
-  return(weeks, frequency, slots, sets, filename)
+  return(weeks, frequency, slots, sets, filename, engine, dialect, template, batch, jobs, profile, plan, extend, report, calculate, formatting, parallel, names, index, library, date, cache, listen, queue, evaluate, lean, records)
+
+
+def print_plan(estimate: dict) -> None:
+  # e.g. Sheet: 76 rows x 27 columns (A1:AA76)
+  plan = estimate["plan"]
+  last = plan.days[-1].letter[LWL] if plan.days else 'A'
+  print(f"Program: {estimate['weeks']} weeks, {plan.frequency} days, {plan.slots} slots, {plan.sets} sets")
+  print(f"Sheet: {plan.max_row} rows x {plan.max_column} columns (A1:{last}{plan.max_row})")
+  for day in plan.days:
+      print(f"  Day {day.day}: columns {day.letter[SETS]}:{day.letter[LWL]}")
+  for slot, rows in enumerate(plan.rows, 1):
+      records = f", best Load {rows.best_load}, best E1RM {rows.best_e1rm}" if plan.records else ""
+      print(f"  Exercise {slot}: rows {rows.slot}-{rows.last}, sets {rows.volume_input}-{rows.last_input}, E1RM {rows.e1rm}{records}")
+  print(f"  Average RPE {plan.daily_rpe}, Session RPE {plan.session_rpe}, Internal Load {plan.internal_load}")
+  print(f"Sheets: {estimate['sheets']}")
+  print(f"Cells: {estimate['cells']}, merges: {estimate['merges']}, formulas: {estimate['formulas']}")
+  print(f"Estimated size: {estimate['bytes'] / 1024:.0f} KB with the {estimate['engine']} engine")
 
 
 def main():
-  weeks, frequency, slots, sets, filename = arguments()
-
-  Program = Workout()
-  Program.generate_weeks(weeks=weeks)
-  Program.generate_frequency(frequency=frequency)
-  Program.generate_slots(slots=slots, sets=sets, frequency=frequency)
-  Utils.clear(workbook=Program.wb)
-  Utils.save(workbook=Program.wb, filename=filename)
+  weeks, frequency, slots, sets, filename, engine, dialect, template, batch, jobs, profile, plan, extend, report, calculate, formatting, parallel, names, index, library, date, cache, listen, queue, evaluate, lean, records = arguments()
+
+  if report:
+      from Analytics import Analytics
+      Analytics.report(report, jobs=jobs, output=filename)
+      return
+
+  if evaluate:
+      from Evaluator import Graph
+      if Graph.report(evaluate, output=filename):
+          sys.exit(1)
+      return
+
+  if listen:
+      import asyncio
+      from Service import Service
+      host, _, port = listen.rpartition(':')
+      try:
+          asyncio.run(Service(workers=jobs, queue=queue, libraries=library).serve(host=host or '127.0.0.1', port=int(port)))
+      except KeyboardInterrupt:
+          pass
+      return
+
+  if plan:
+      # Dry run with the options of the build, only the native engine needs no openpyxl
+      from Workout import Workout
+      from Library import Library
+      Program = Workout(engine=engine, dialect=dialect, calculate=calculate, formatting=formatting, names=names, library=Library.load(library), date=date, lean=lean, records=records)
+      print_plan(Program.estimate(weeks=weeks, frequency=frequency, slots=slots, sets=sets))
+      return
+
+  if batch:
+      from Batch import Batch
+      defaults = {"weeks": weeks, "frequency": frequency, "slots": slots, "sets": sets}
+      failed = Batch.run(roster=batch, jobs=jobs, defaults=defaults, engine=engine, dialect=dialect, template=template, library=library, date=date, cache=cache, lean=lean, records=records, calculate=calculate, formatting=formatting, names=names)
+      if failed:
+          sys.exit(1)
+      return
+
+  # Function level stats of the whole build with cProfile, otherwise our own phase timings
+  profiler = cProfile.Profile() if profile and profile.endswith(('.prof', '.pstats')) else None
+  if profiler:
+      profiler.enable()
+
+  from Utils import Utils
+  from Library import Library
+  timings = Profile(enabled=bool(profile))
+  with timings.phase('library'):
+      # Compiled once and read from the cache by later builds
+      library = Library.load(library)
+
+  # An extended file and the index come from the build itself, they are never cached
+  store = None
+  cached = False
+  if cache and not extend and not index:
+      from Cache import Cache
+      store = Cache(size=cache * 1024 * 1024)
+      filename = filename or 'workout.xlsx'
+      key = Cache.key({
+          "weeks": weeks, "frequency": frequency, "slots": slots, "sets": sets, "engine": engine, "dialect": dialect,
+          "template": template, "calculate": calculate, "formatting": formatting, "names": names, "date": date,
+          "library": library.digest, "lean": lean, "records": records
+      })
+      with timings.phase('cache'):
+          cached = store.fetch(key, filename)
+
+  if cached:
+      print(f"Writing program to {filename} from the cache")
+  else:
+      from Workout import Workout
+      if extend:
+          # Appending to the file is done by the native writer
+          Program = Workout(engine='native', dialect=dialect, profile=timings, calculate=calculate, formatting=formatting, names=names, library=library, date=date, lean=lean, records=records)
+          Program.extend(extend, weeks=weeks, frequency=frequency, slots=slots, sets=sets)
+          filename = filename or extend
+      else:
+          Program = Workout(engine=engine, dialect=dialect, profile=timings, calculate=calculate, formatting=formatting, names=names, library=library, date=date, lean=lean, records=records)
+          Program.generate(weeks=weeks, frequency=frequency, slots=slots, sets=sets, template=template, jobs=jobs if parallel else None)
+      with timings.phase('save'):
+          Utils.save(workbook=Program.wb, filename=filename)
+      if store:
+          with timings.phase('cache'):
+              store.store(key, filename)
+      if index:
+          Program.write_index(index)
+
+  if profiler:
+      profiler.disable()
+      profiler.dump_stats(profile)
+      print(f"Writing cProfile stats to {profile}")
+  elif profile == '-':
+      print(timings.report())
+  elif profile:
+      timings.dump(profile)
+      print(f"Writing profile to {profile}")
 
 
 if __name__ == "__main__":